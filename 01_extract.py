@@ -1,6 +1,21 @@
+import argparse
+import csv
+import logging
+import mmap
+import sys
 import zipfile
 import os
-import pandas as pd # Included for consistency, though not strictly used in extraction/verification itself
+import shutil
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import libarchive # Optional: faster streaming extraction (pip install libarchive-c)
+except ImportError:
+    libarchive = None
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 # Define the path to your Zoho backup ZIP file
@@ -25,79 +40,405 @@ ZOHO_CSVS = [
     'Purchase_Order.csv',
     'Item.csv' # Including Item as it was found in your backup, though financial focus initially
 ]
+# Same names as a frozenset, for O(1) membership tests when filtering ZIP members
+ZOHO_CSVS_SET = frozenset(ZOHO_CSVS)
+
+# Buffer size used when copying decompressed CSV data to disk (64 KiB)
+COPY_BUFFER_SIZE = 1 << 16
+# Members at least this big (typically Invoice.csv, Journal.csv) are copied with a 1 MiB buffer instead
+LARGE_MEMBER_SIZE = 1 << 16
+LARGE_COPY_BUFFER_SIZE = 1 << 20
+
+# Sentinel file written to EXTRACT_TO_DIR once every CSV has been fully extracted.
+# It records the ZIP's fingerprint (size and modification time), so a missing or stale sentinel
+# means the extraction was interrupted or came from a different ZIP and has to be redone.
+SENTINEL_FILE_NAME = ".extracted.ok"
+
+# Written to EXTRACT_TO_DIR once --verify-crc has checked every member of the ZIP, keyed on the ZIP's
+# fingerprint like the extraction sentinel. Extraction itself checks the CRC of every CSV it writes;
+# --verify-crc additionally covers the members that are not extracted.
+CRC_SENTINEL_FILE_NAME = ".crc.ok"
+
+# Layout of a ZIP local file header: the fixed part is 30 bytes, followed by the file name and extra field
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# --- Exceptions ---
+
+class ExtractionError(RuntimeError):
+    """Raised when the Zoho backup ZIP cannot be extracted."""
 
 # --- Helper Functions ---
 
+def member_target_path(member_name, extract_path):
+    """
+    Returns the path a ZIP member is written to inside extract_path.
+    Mirrors ZipFile.extract(): drive letters, absolute paths and '..' components are stripped.
+    """
+    arcname = member_name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [p for p in arcname.split(os.path.sep) if p not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(extract_path, *parts)
+
+def index_zip_members(zip_ref, wanted=ZOHO_CSVS_SET):
+    """
+    Maps the base name of each wanted file in the ZIP to its ZipInfo, in a single pass over the
+    central directory. If a name occurs in several folders of the archive, the first entry wins.
+    """
+    index = {}
+    for zi in zip_ref.infolist():
+        file_name = os.path.basename(zi.filename)
+        if not zi.is_dir() and file_name in wanted:
+            index.setdefault(file_name, zi)
+    return index
+
+def zip_fingerprint(zip_path):
+    """
+    Returns the ZIP file's fingerprint as stored in the sentinel files: its size and modification time.
+    A replaced or re-downloaded ZIP gets a new fingerprint, which invalidates earlier extractions.
+    """
+    st = os.stat(zip_path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def read_sentinel(extract_path, sentinel_name=SENTINEL_FILE_NAME):
+    """Returns the ZIP fingerprint recorded in the sentinel file, or None if there is no sentinel."""
+    try:
+        with open(os.path.join(extract_path, sentinel_name), 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def write_sentinel(extract_path, fingerprint, sentinel_name=SENTINEL_FILE_NAME):
+    """
+    Writes the sentinel file atomically: the content goes to a temporary file that is then renamed
+    into place, so an interrupted run never leaves a half-written sentinel behind.
+    """
+    sentinel_path = os.path.join(extract_path, sentinel_name)
+    tmp_path = sentinel_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(fingerprint)
+    os.replace(tmp_path, sentinel_path)
+
+def preallocate(file_obj, size):
+    """
+    Reserves disk space for an output file before it is written (Linux/Unix only).
+    The filesystem can then allocate the blocks in one go instead of growing the file on every write.
+    Silently does nothing where posix_fallocate is unavailable or unsupported by the filesystem.
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(file_obj.fileno(), 0, size)
+    except OSError:
+        pass
+
+def copy_stored_member(zip_path, zip_info, target_path):
+    """
+    Copies a stored (uncompressed) ZIP member straight from the ZIP file to target_path with
+    os.copy_file_range, so the bytes never pass through Python. Linux only.
+    Like ZipFile.open(), it checks the member's CRC: the copy is read back through mmap and
+    zipfile.BadZipFile is raised if it does not match.
+    Returns False if the member cannot be copied this way, in which case nothing has been written.
+    """
+    if (not sys.platform.startswith('linux') or not hasattr(os, 'copy_file_range')
+            or zip_info.compress_type != zipfile.ZIP_STORED or zip_info.flag_bits & 0x1): # 0x1 = encrypted
+        return False
+    with open(zip_path, 'rb') as src:
+        src.seek(zip_info.header_offset)
+        header = ZIP_LOCAL_HEADER.unpack(src.read(ZIP_LOCAL_HEADER.size))
+        if header[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+            return False
+        # The member data follows the fixed header, the file name and the extra field
+        offset = zip_info.header_offset + ZIP_LOCAL_HEADER.size + header[9] + header[10]
+        remaining = zip_info.file_size
+        with open(target_path, 'wb') as dst:
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset_src=offset)
+                    if copied == 0:
+                        raise OSError(f"Unexpected end of data in '{zip_info.filename}'")
+                    offset += copied
+                    remaining -= copied
+            except OSError:
+                # e.g. EXDEV/ENOSYS on older kernels or across filesystems; fall back to a normal copy
+                dst.truncate(0)
+                return False
+    crc = 0
+    if zip_info.file_size:
+        with open(target_path, 'rb') as copied, mmap.mmap(copied.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            crc = zlib.crc32(data)
+    if crc != zip_info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file '{zip_info.filename}'")
+    return True
+
+def extract_member(zip_path, zip_info, extract_path):
+    """
+    Extracts a single ZIP member using its own ZipFile handle.
+    ZipFile objects are not safe for concurrent reads, so each worker thread opens the archive itself.
+    The member's parent directory must already exist (see extract_zoho_zip).
+    """
+    target_path = member_target_path(zip_info.filename, extract_path)
+    if copy_stored_member(zip_path, zip_info, target_path):
+        return
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # Large buffers on both sides keep the number of read()/write() calls low for the bigger CSVs
+        buffer_size = LARGE_COPY_BUFFER_SIZE if zip_info.file_size >= LARGE_MEMBER_SIZE else COPY_BUFFER_SIZE
+        with zip_ref.open(zip_info) as src, open(target_path, 'wb', buffering=buffer_size) as dst:
+            preallocate(dst, zip_info.file_size)
+            shutil.copyfileobj(src, dst, length=buffer_size)
+
+def warn_missing_members(found_files):
+    """Logs a warning for every expected CSV that is not in the ZIP."""
+    not_in_zip = [f for f in ZOHO_CSVS if f not in found_files]
+    if not_in_zip:
+        logger.warning(f"⚠️ Warning: {len(not_in_zip)} expected CSV(s) are not in the ZIP: {', '.join(not_in_zip)}")
+
+def extract_with_zipfile(zip_path, extract_path):
+    """Extracts the expected CSVs with the standard library's zipfile module, in parallel."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # Only decompress the CSVs needed downstream; skip folders and other backup files
+        members_by_name = index_zip_members(zip_ref)
+    members = [members_by_name[f] for f in ZOHO_CSVS if f in members_by_name]
+    # The member index comes from the central directory only, so this check costs no decompression
+    warn_missing_members(members_by_name)
+    # Create every output directory up front (once per directory, not once per file)
+    # so the extraction workers only have to open their output files
+    for directory in sorted({os.path.dirname(member_target_path(zi.filename, extract_path)) for zi in members}):
+        os.makedirs(directory, exist_ok=True)
+    # Decompress the members in parallel; each one is written to its own output file
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(extract_member, zip_path, zi, extract_path) for zi in members]
+        for future in futures:
+            future.result() # Re-raises any error from the worker thread
+
+def extract_with_libarchive(zip_path, extract_path):
+    """
+    Extracts the expected CSVs with libarchive, which streams all entries in one pass over the ZIP
+    with less per-entry overhead than zipfile. Used when the optional libarchive-c package is installed.
+    The members to extract and their CRCs come from zipfile's central directory index (no decompression),
+    because libarchive only logs CRC mismatches instead of raising an error.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members_by_name = index_zip_members(zip_ref)
+    warn_missing_members(members_by_name)
+    members_by_path = {zi.filename: zi for zi in members_by_name.values()}
+    extracted = set()
+    with libarchive.file_reader(zip_path) as archive:
+        for entry in archive:
+            zi = members_by_path.get(entry.pathname)
+            if zi is None or not entry.isfile or zi.filename in extracted:
+                continue
+            target_path = member_target_path(zi.filename, extract_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            buffer_size = LARGE_COPY_BUFFER_SIZE if zi.file_size >= LARGE_MEMBER_SIZE else COPY_BUFFER_SIZE
+            crc = 0
+            with open(target_path, 'wb', buffering=buffer_size) as dst:
+                preallocate(dst, zi.file_size)
+                for block in entry.get_blocks():
+                    crc = zlib.crc32(block, crc)
+                    dst.write(block)
+            if crc != zi.CRC:
+                raise zipfile.BadZipFile(f"Bad CRC-32 for file '{zi.filename}'")
+            extracted.add(zi.filename)
+    # Entries libarchive reports under a different name (e.g. non-UTF-8 file names) fall back to zipfile
+    for path, zi in members_by_path.items():
+        if path not in extracted:
+            os.makedirs(os.path.dirname(member_target_path(path, extract_path)), exist_ok=True)
+            extract_member(zip_path, zi, extract_path)
+
 def extract_zoho_zip(zip_path, extract_path):
     """
-    Extracts the Zoho backup ZIP file to the specified directory.
+    Extracts the Zoho CSVs listed in ZOHO_CSVS from the backup ZIP file to the specified directory.
+    Other members of the backup (attachments, PDFs, etc.) are not decompressed.
+    Uses libarchive when it is installed, otherwise the standard library's zipfile module.
     Creates the extraction directory if it doesn't exist.
-    Handles common errors like invalid ZIP file or file not found.
+    Raises ExtractionError for common errors like invalid ZIP file or file not found.
     """
     if not os.path.exists(extract_path):
         os.makedirs(extract_path)
-        print(f"Created extraction directory: '{extract_path}'")
+        logger.info(f"Created extraction directory: '{extract_path}'")
     else:
-        print(f"Extraction directory already exists: '{extract_path}'")
+        logger.info(f"Extraction directory already exists: '{extract_path}'")
 
     try:
-        print(f"Attempting to extract '{os.path.basename(zip_path)}'...")
+        logger.info(f"Attempting to extract '{os.path.basename(zip_path)}'...")
+        fingerprint = zip_fingerprint(zip_path)
+        # Invalidate any previous extraction before overwriting files, in case this run is interrupted
+        try:
+            os.remove(os.path.join(extract_path, SENTINEL_FILE_NAME))
+        except FileNotFoundError:
+            pass
+        if libarchive is not None:
+            extract_with_libarchive(zip_path, extract_path)
+        else:
+            extract_with_zipfile(zip_path, extract_path)
+        write_sentinel(extract_path, fingerprint)
+        logger.info(f"✅ Successfully extracted '{os.path.basename(zip_path)}' to '{extract_path}'")
+    except zipfile.BadZipFile as e:
+        raise ExtractionError(f"Error: '{zip_path}' is not a valid ZIP file. Please check the file integrity.") from e
+    except FileNotFoundError as e:
+        raise ExtractionError(f"Error: ZIP file not found at '{zip_path}'. Please ensure the path is correct.") from e
+    except Exception as e:
+        raise ExtractionError(f"An unexpected error occurred during extraction: {e}") from e
+
+def open_zoho_csvs(zip_path, expected_files=ZOHO_CSVS):
+    """
+    Yields (file_name, file_object) pairs for the expected Zoho CSVs, read straight from the ZIP file.
+    The file objects decompress on demand, so nothing is written to disk and no CSV is held fully in memory.
+    Each file object is only valid until the generator advances to the next CSV.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members_by_name = index_zip_members(zip_ref, frozenset(expected_files))
+        for file_name in expected_files:
+            zi = members_by_name.get(file_name)
+            if zi is None:
+                continue
+            with zip_ref.open(zi, 'r') as csv_file:
+                yield file_name, csv_file
+
+def verify_zip_crc(zip_path, extract_path):
+    """
+    Checks the CRC of every member of the ZIP file with ZipFile.testzip().
+    A passing result is cached in a sentinel file inside extract_path, keyed on the ZIP's fingerprint,
+    so reruns against the same ZIP skip the (full decompression) check.
+    Returns True if the ZIP is valid, False otherwise.
+    """
+    try:
+        fingerprint = zip_fingerprint(zip_path)
+        if read_sentinel(extract_path, CRC_SENTINEL_FILE_NAME) == fingerprint:
+            logger.info(f"ZIP integrity already verified for '{os.path.basename(zip_path)}'. Skipping CRC check.")
+            return True
+
+        logger.info(f"Checking CRCs of all members in '{os.path.basename(zip_path)}'...")
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
-        print(f"✅ Successfully extracted '{os.path.basename(zip_path)}' to '{extract_path}'")
+            bad_member = zip_ref.testzip()
+        if bad_member is not None:
+            logger.error(f"❌ Error: CRC check failed for '{bad_member}' in '{zip_path}'. The ZIP file is corrupt.")
+            return False
     except zipfile.BadZipFile:
-        print(f"❌ Error: '{zip_path}' is not a valid ZIP file. Please check the file integrity.")
-        exit(1) # Exit the script on critical error
+        logger.error(f"❌ Error: '{zip_path}' is not a valid ZIP file. Please check the file integrity.")
+        return False
     except FileNotFoundError:
-        print(f"❌ Error: ZIP file not found at '{zip_path}'. Please ensure the path is correct.")
-        exit(1) # Exit the script on critical error
-    except Exception as e:
-        print(f"❌ An unexpected error occurred during extraction: {e}")
-        exit(1) # Exit the script on critical error
+        logger.error(f"❌ Error: ZIP file not found at '{zip_path}'. Please ensure the path is correct.")
+        return False
 
-def verify_extracted_files(extract_path, expected_files):
+    os.makedirs(extract_path, exist_ok=True)
+    write_sentinel(extract_path, fingerprint, CRC_SENTINEL_FILE_NAME)
+    logger.info("✅ ZIP integrity check passed.")
+    return True
+
+def extraction_is_current(zip_path, extract_path, expected_files):
+    """
+    Checks whether a previous run already extracted this ZIP file.
+    Returns True if the sentinel file holds the ZIP's current fingerprint and every expected CSV the ZIP
+    contains exists where extraction writes it, in which case the extraction step can be skipped.
+    Expected CSVs missing from the ZIP itself don't count, since extracting again cannot produce them.
+    """
+    try:
+        if read_sentinel(extract_path) != zip_fingerprint(zip_path):
+            return False
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            members = index_zip_members(zip_ref, frozenset(expected_files)).values()
+    except (FileNotFoundError, zipfile.BadZipFile):
+        return False
+    return all(os.path.isfile(member_target_path(zi.filename, extract_path)) for zi in members)
+
+def verify_extracted_files(extract_path, expected_files, fail_fast=False):
     """
     Verifies if all the crucial CSV files listed in ZOHO_CSVS are present
-    in the extracted directory.
+    in the extracted directory, and that the extraction finished (sentinel file present).
     Prints a summary of found and missing files.
+    With fail_fast=True (CI mode) it stops at the first missing file instead of listing all of them.
     Returns True if all expected files are found, False otherwise.
     """
-    missing_files = []
-    found_files = []
-    print("\n--- Verifying Extracted Files ---")
-    for file_name in expected_files:
-        file_path = os.path.join(extract_path, file_name)
-        if not os.path.exists(file_path):
-            missing_files.append(file_name)
-        else:
-            found_files.append(file_name)
+    logger.info("\n--- Verifying Extracted Files ---")
+    # A single directory scan instead of one stat() call per expected file
+    try:
+        with os.scandir(extract_path) as entries:
+            present = {entry.name for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        present = set()
+    if SENTINEL_FILE_NAME not in present:
+        # Files may exist but be truncated by an interrupted extraction
+        logger.error(f"\n❌ Error: Extraction did not complete ('{SENTINEL_FILE_NAME}' not found). The next run will extract the ZIP again.")
+        return False
+    if fail_fast:
+        for file_name in expected_files:
+            if file_name not in present:
+                logger.error(f"\n❌ Error: Expected Zoho CSV file is MISSING: {file_name}")
+                return False
+    missing_files = [f for f in expected_files if f not in present]
+    found_files = [f for f in expected_files if f in present]
 
     if missing_files:
-        print("\n⚠️ Warning: The following expected Zoho CSV files are MISSING:")
+        logger.warning("\n⚠️ Warning: The following expected Zoho CSV files are MISSING:")
         for mf in missing_files:
-            print(f"- {mf}")
-        print("\nPlease ensure your Zoho backup ZIP contains these files or adjust the `ZOHO_CSVS` list if they are not relevant.")
-        print("Migration may not be complete without these files.")
+            logger.warning(f"- {mf}")
+        logger.warning("\nPlease ensure your Zoho backup ZIP contains these files or adjust the `ZOHO_CSVS` list if they are not relevant.")
+        logger.warning("Migration may not be complete without these files.")
         return False
     else:
-        print("\n✅ All expected Zoho CSV files are present and ready for processing.")
-        # Optional: Print all found files for confirmation
-        # print("Found files:")
-        # for ff in found_files:
-        #     print(f"- {ff}")
+        logger.info("\n✅ All expected Zoho CSV files are present and ready for processing.")
+        # Only shown with --verbose
+        logger.debug("Found files:")
+        for ff in found_files:
+            logger.debug(f"- {ff}")
         return True
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    print("--- Starting 01_extract.py: Zoho Data Extraction & Verification ---")
+    parser = argparse.ArgumentParser(description="Extract and verify the Zoho Books backup ZIP.")
+    parser.add_argument("--materialize", action=argparse.BooleanOptionalAction, default=True,
+                        help="Extract the CSVs to EXTRACT_TO_DIR (default). With --no-materialize the CSVs are only "
+                             "streamed from the ZIP to check they are readable; nothing is written to disk.")
+    parser.add_argument("--verify-crc", action="store_true",
+                        help="Check the CRC of every ZIP member before extracting. The result is cached, "
+                             "so the check is skipped on reruns against the same ZIP.")
+    parser.add_argument("--ci", action="store_true",
+                        help="CI mode: stop at the first missing CSV and exit with a non-zero status.")
+    parser.add_argument("--verbose", action="store_true", help="Also list every file that was found.")
+    args = parser.parse_args()
+
+    # All output goes through one logging handler on stdout
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    logger.info("--- Starting 01_extract.py: Zoho Data Extraction & Verification ---")
 
-    # Step 1: Extract the Zoho ZIP file
-    extract_zoho_zip(ZIP_FILE_PATH, EXTRACT_TO_DIR)
+    if not args.materialize:
+        logger.info(f"Streaming CSVs from '{os.path.basename(ZIP_FILE_PATH)}' without extracting them...")
+        streamed_files = set()
+        for file_name, csv_file in open_zoho_csvs(ZIP_FILE_PATH):
+            header = next(csv.reader([csv_file.readline().decode('utf-8-sig')]), [])
+            logger.info(f"- {file_name}: {len(header)} columns")
+            streamed_files.add(file_name)
+        missing_files = [f for f in ZOHO_CSVS if f not in streamed_files]
+        if missing_files:
+            logger.warning(f"\n⚠️ Warning: The following expected Zoho CSV files are MISSING from the ZIP: {', '.join(missing_files)}")
+        else:
+            logger.info("\n✅ All expected Zoho CSV files can be read directly from the ZIP.")
+        exit(0)
+
+    if args.verify_crc and not verify_zip_crc(ZIP_FILE_PATH, EXTRACT_TO_DIR):
+        exit(1)
+
+    # Step 1: Extract the Zoho ZIP file (skipped if a previous run already extracted it)
+    if extraction_is_current(ZIP_FILE_PATH, EXTRACT_TO_DIR, ZOHO_CSVS):
+        logger.info(f"Extracted CSVs in '{EXTRACT_TO_DIR}' are up to date with the ZIP file. Skipping extraction.")
+    else:
+        try:
+            extract_zoho_zip(ZIP_FILE_PATH, EXTRACT_TO_DIR)
+        except ExtractionError as e:
+            logger.error(f"❌ {e}")
+            exit(1) # Exit the script on critical error
 
     # Step 2: Verify that the crucial CSVs are present
-    if verify_extracted_files(EXTRACT_TO_DIR, ZOHO_CSVS):
-        print("\n--- 01_extract.py completed successfully. ---")
-        print("You can now proceed to data cleaning and mapping using '02_clean_map.py'.")
+    if verify_extracted_files(EXTRACT_TO_DIR, ZOHO_CSVS, fail_fast=args.ci):
+        logger.info("\n--- 01_extract.py completed successfully. ---")
+        logger.info("You can now proceed to data cleaning and mapping using '02_clean_map.py'.")
     else:
-        print("\n--- 01_extract.py finished with warnings/errors. ---")
-        print("Please review the output and address any missing files before proceeding.")
\ No newline at end of file
+        logger.info("\n--- 01_extract.py finished with warnings/errors. ---")
+        logger.info("Please review the output and address any missing files before proceeding.")
+        if args.ci:
+            exit(1)
\ No newline at end of file
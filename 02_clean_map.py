@@ -1,7 +1,46 @@
 import pandas as pd
+import csv
 import os
+import sys
+import hashlib
+import io
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
 import numpy as np # For numerical operations, e.g., isnan
 
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pac # Optional: multithreaded CSV reader/writer
+    import pyarrow.parquet as pq # Optional: Parquet cache of parsed CSVs
+except ImportError:
+    pa = None
+    pac = None
+    pq = None
+
+try:
+    import polars as pl # Optional: lazy CSV scanning with projection pushdown
+except ImportError:
+    pl = None
+
+try:
+    from numba import njit, prange # Optional: compiled date formatting kernel
+except ImportError:
+    njit = None
+
+# Processors clean their input in place and return column projections without copying.
+# Copy-on-Write (always on from pandas 3) keeps those projections lazy; opt in on pandas 2.
+PANDAS_VERSION = tuple(int(part) for part in pd.__version__.split('.')[:2])
+if PANDAS_VERSION[0] == 2:
+    pd.set_option('mode.copy_on_write', True)
+
+# Text columns are stored as Arrow-backed strings where the stack supports it (pandas >= 1.3 with
+# pyarrow), and as object arrays of Python strings otherwise
+ARROW_STRING_DTYPE = 'string[pyarrow]' if pa is not None and PANDAS_VERSION >= (1, 3) else None
+
 # --- Configuration ---
 # Directory where the Zoho backup ZIP contents were extracted
 EXTRACT_TO_DIR = "/mnt/data/zoho_extracted"
@@ -25,62 +64,908 @@ ZOHO_FILES = {
     'items': 'Item.csv', # Not processed in detail in initial financial focus
 }
 
+# Inputs larger than this are cleaned in row chunks so memory stays bounded.
+# Only datasets whose processors work row by row can be chunked.
+CHUNKED_FILE_BYTES = 256 << 20
+CHUNK_ROWS = 200_000
+CHUNKABLE_DATASETS = frozenset({'invoices', 'credit_notes'})
+
+# Candidate columns are only stored as Categoricals if fewer than this share of their values are distinct
+LOW_CARDINALITY_RATIO = 0.5
+
+# Parsed CSVs are cached as Parquet next to the source file (requires pyarrow)
+# and reused on later runs while the cache is newer than the CSV.
+# Bump the version when load-time parsing changes, so old caches are not reused.
+PARQUET_CACHE_SUFFIX = '.v3.parquet'
+
+# Each cleaned CSV also gets a Parquet copy (requires pyarrow) that 03_generate_tally_xml.py
+# loads instead, skipping a second CSV parse. The CSV stays for people and other tools.
+PROCESSED_PARQUET_COMPRESSION = 'snappy'
+
+# Each cleaned CSV gets a sentinel file next to it (".<output name>.ok") recording the SHA-256 of its
+# Zoho input and of this script. While both match, later runs reuse the CSV instead of cleaning
+# the input again; delete the sentinel (or the CSV) to force a dataset to be redone.
+PROCESSED_SENTINEL_SUFFIX = '.ok'
+
+# Source columns to parse per dataset (names missing from a file are ignored).
+# Datasets not listed here are passed through whole, so they load every column.
+LOAD_COLUMNS = {
+    'chart_of_accounts': [
+        'Account ID', 'Account Name', 'Account Code', 'Description', 'Account Type',
+        'Account Status', 'Currency', 'Parent Account'
+    ],
+    'contacts': [
+        'Contact ID', 'Display Name', 'Company Name', 'EmailID', 'Phone', 'MobilePhone',
+        'GST Identification Number (GSTIN)', 'Billing Address', 'Billing Street2',
+        'Billing City', 'Billing State', 'Billing Country', 'Billing Code',
+        'Shipping Address', 'Shipping Street2', 'Shipping City', 'Shipping State',
+        'Shipping Country', 'Shipping Code', 'Credit Limit', 'Opening Balance', 'Status',
+        'Place of Contact(With State Code)', 'GST Treatment'
+    ],
+    'vendors': [
+        'Contact ID', 'Display Name', 'Company Name', 'EmailID', 'Phone', 'MobilePhone',
+        'GST Identification Number (GSTIN)', 'Billing Address', 'Billing Street2',
+        'Billing City', 'Billing State', 'Billing Country', 'Billing Code',
+        'Shipping Address', 'Shipping Street2', 'Shipping City', 'Shipping State',
+        'Shipping Country', 'Shipping Code', 'Opening Balance', 'Status', 'GST Treatment',
+        'Vendor Bank Account Number', 'Vendor Bank Name', 'Vendor Bank Code'
+    ],
+}
+
+# Text columns per dataset. The processors fill these with '' and cast them to str,
+# and load_csv parses them as strings up front so IDs, phone numbers and PIN codes
+# keep their exact text (no 5001.0 or dropped leading zeros) and skip type inference.
+STRING_COLUMNS = {
+    'chart_of_accounts': [
+        'Account Name', 'Account Code', 'Description', 'Account Type', 'Account Status',
+        'Currency', 'Parent Account'
+    ],
+    'contacts': [
+        'Display Name', 'Company Name', 'Salutation', 'First Name', 'Last Name',
+        'Phone', 'EmailID', 'MobilePhone', 'Website', 'Notes', 'Status',
+        'Billing Attention', 'Billing Address', 'Billing Street2', 'Billing City',
+        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
+        'Shipping Attention', 'Shipping Address', 'Shipping Street2', 'Shipping City',
+        'Shipping State', 'Shipping Country', 'Shipping Code', 'Shipping Phone', 'Shipping Fax',
+        'Skype Identity', 'Facebook', 'Twitter', 'Department', 'Designation',
+        'Price List', 'Payment Terms', 'Payment Terms Label', 'GST Treatment',
+        'GST Identification Number (GSTIN)', 'Owner Name', 'Primary Contact ID',
+        'Contact Name', 'Contact Type', 'Place Of Contact', 'Place of Contact(With State Code)',
+        'Taxable', 'TaxID', 'Tax Name', 'Tax Type', 'Exemption Reason', 'Source'
+    ],
+    'vendors': [
+        'Contact Name', 'Company Name', 'Display Name', 'Salutation', 'First Name',
+        'Last Name', 'EmailID', 'Phone', 'MobilePhone', 'Payment Terms', 'Currency Code',
+        'Notes', 'Website', 'Status', 'Location Name', 'Payment Terms Label',
+        'Source of Supply', 'Skype Identity', 'Department', 'Designation', 'Facebook', 'Twitter',
+        'GST Treatment', 'GST Identification Number (GSTIN)', 'MSME/Udyam No', 'MSME/Udyam Type',
+        'TDS Name', 'TDS Section', 'Price List', 'Contact Address ID', 'Billing Attention',
+        'Billing Address', 'Billing Street2', 'Billing City', 'Billing State', 'Billing Country',
+        'Billing Code', 'Billing Phone', 'Billing Fax', 'Shipping Attention', 'Shipping Address',
+        'Shipping Street2', 'Shipping City', 'Shipping State', 'Shipping Country',
+        'Shipping Code', 'Shipping Phone', 'Shipping Fax', 'Source', 'Owner Name', 'Primary Contact ID',
+        'Beneficiary Name', 'Vendor Bank Account Number', 'Vendor Bank Name', 'Vendor Bank Code'
+    ],
+    'invoices': [
+        'Customer ID', 'Invoice Number', 'Invoice Status', 'Customer Name', 'Place of Supply',
+        'Place of Supply(With State Code)', 'GST Treatment', 'PurchaseOrder',
+        'Discount Type', 'Template Name', 'TCS Tax Name', 'TDS Calculation Type',
+        'TDS Name', 'TDS Section Code', 'TDS Section', 'Adjustment Description',
+        'Payment Terms', 'Payment Terms Label', 'Notes', 'Terms & Conditions',
+        'E-WayBill Number', 'E-WayBill Status', 'Transporter Name', 'Transporter ID',
+        'Invoice Type', 'Location Name', 'Shipping Charge Tax ID', 'Shipping Charge Tax Name',
+        'Shipping Charge Tax Type', 'Shipping Charge Tax Exemption Code', 'Shipping Charge SAC Code',
+        'Item Name', 'Item Desc', 'Usage unit', 'Product ID', 'Brand', 'Sales Order Number',
+        'subscription_id', 'Expense Reference ID', 'Recurrence Name',
+        'Billing Attention', 'Billing Address', 'Billing Street2', 'Billing City',
+        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
+        'Shipping Attention', 'Shipping Address', 'Shipping Street2', 'Shipping City',
+        'Shipping State', 'Shipping Country', 'Shipping Code', 'Shipping Fax',
+        'Shipping Phone Number', 'Supplier Org Name', 'Supplier GST Registration Number',
+        'Supplier Street Address', 'Supplier City', 'Supplier State', 'Supplier Country',
+        'Supplier ZipCode', 'Supplier Phone', 'Supplier E-Mail', 'Reverse Charge Tax Name',
+        'Reverse Charge Tax Type', 'Item TDS Name', 'Item TDS Section Code', 'Item TDS Section',
+        'Nature Of Collection', 'SKU', 'Project ID', 'Project Name', 'HSN/SAC',
+        'Sales person', 'Subject', 'Primary Contact EmailID', 'Primary Contact Mobile',
+        'Primary Contact Phone', 'Estimate Number', 'Item Type', 'Custom Charges',
+        'Shipping Bill#', 'PortCode', 'Reference Invoice#', 'Reference Invoice Type',
+        'GST Registration Number(Reference Invoice)', 'Reason for issuing Debit Note',
+        'E-Commerce Operator Name', 'E-Commerce Operator GSTIN', 'Account',
+        'Account Code', 'Line Item Location Name', 'Supply Type', 'Tax ID',
+        'Item Tax Type', 'Item Tax Exemption Reason', 'Kit Combo Item Name', 'CF.Brand Name'
+    ],
+    'customer_payments': [
+        'CustomerID', 'Payment Number', 'Mode', 'Description', 'Currency Code', 'Branch ID',
+        'Payment Number Prefix', 'Payment Number Suffix', 'Customer Name',
+        'Place of Supply', 'Place of Supply(With State Code)', 'GST Treatment',
+        'GST Identification Number (GSTIN)', 'Description of Supply', 'Tax Name',
+        'Tax Type', 'Payment Type', 'Location Name', 'Deposit To',
+        'Deposit To Account Code', 'Tax Account', 'Invoice Number'
+    ],
+    'vendor_payments': [
+        'Payment Number', 'Payment Number Prefix', 'Payment Number Suffix',
+        'Mode', 'Description', 'Reference Number', 'Currency Code', 'Branch ID',
+        'Payment Status', 'Payment Type', 'Location Name', 'Vendor Name',
+        'Debit A/c no', 'Vendor Bank Account Number', 'Vendor Bank Name',
+        'Vendor Bank Code', 'Source of Supply', 'Destination of Supply',
+        'GST Treatment', 'GST Identification Number (GSTIN)', 'EmailID',
+        'Description of Supply', 'Paid Through', 'Paid Through Account Code',
+        'Tax Account', 'ReverseCharge Tax Type', 'ReverseCharge Tax Name',
+        'TDS Name', 'TDS Section Code', 'TDS Section', 'TDS Account Name',
+        'Bank Reference Number', 'Bill Number'
+    ],
+    'credit_notes': [
+        'Customer ID', 'Product ID', 'Credit Note Number', 'Credit Note Status', 'Customer Name',
+        'Billing Attention', 'Billing Address', 'Billing Street 2', 'Billing City',
+        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
+        'Shipping Attention', 'Shipping Address', 'Shipping Street 2', 'Shipping City',
+        'Shipping State', 'Shipping Country', 'Shipping Phone', 'Shipping Code', 'Shipping Fax',
+        'Currency Code', 'Notes', 'Terms & Conditions', 'Reference#', 'Shipping Charge Tax ID',
+        'Shipping Charge Tax Name', 'Shipping Charge Tax Type', 'Shipping Charge Tax Exemption Code',
+        'Shipping Charge SAC Code', 'Branch ID', 'Associated Invoice Number', 'TDS Name',
+        'TDS Section Code', 'TDS Section', 'E-WayBill Number', 'E-WayBill Status',
+        'Transporter Name', 'Transporter ID', 'Item Name', 'Item Desc', 'Usage unit',
+        'Location Name', 'Reason', 'Project ID', 'Project Name', 'Supplier Org Name',
+        'Supplier GST Registration Number', 'Supplier Street Address', 'Supplier City',
+        'Supplier State', 'Supplier Country', 'Supplier ZipCode', 'Supplier Phone',
+        'Supplier E-Mail', 'Supply Type', 'Tax1 ID', 'Item Tax Type', 'Reverse Charge Tax Name',
+        'Reverse Charge Tax Type', 'Place of Supply(With State Code)', 'GST Treatment',
+        'GST Identification Number (GSTIN)', 'TCS Tax Name', 'Nature Of Collection',
+        'Sales person', 'Discount Type', 'Place of Supply', 'Adjustment Description',
+        'Subject', 'Reference Invoice Type', 'Item Type', 'Template Name', 'HSN/SAC',
+        'Account', 'Account Code', 'SKU', 'Item Tax Exemption Reason', 'Line Item Location Name',
+        'Kit Combo Item Name'
+    ],
+    'journals': [
+        'Journal Number', 'Journal Number Prefix', 'Journal Number Suffix',
+        'Journal Created By', 'Journal Type', 'Status', 'Journal Entity Type',
+        'Reference Number', 'Notes', 'Location ID', 'Location Name', 'Item Order',
+        'Tax Name', 'Tax Type', 'Project Name', 'Account', 'Account Code',
+        'Contact Name', 'Currency', 'Description'
+    ],
+    'bills': [
+        'Vendor Name', 'Payment Terms', 'Payment Terms Label', 'Bill Number',
+        'PurchaseOrder', 'Currency Code', 'Vendor Notes', 'Terms & Conditions',
+        'Adjustment Description', 'Branch ID', 'Branch Name', 'Location Name',
+        'Submitted By', 'Approved By', 'Bill Status', 'Created By', 'Product ID',
+        'Item Name', 'Account', 'Account Code', 'Description', 'Reference Invoice Type',
+        'Source of Supply', 'Destination of Supply', 'GST Treatment',
+        'GST Identification Number (GSTIN)', 'TDS Calculation Type', 'TDS TaxID',
+        'TDS Name', 'TDS Section Code', 'TDS Section', 'TCS Tax Name',
+        'Nature Of Collection', 'SKU', 'Line Item Location Name', 'Discount Type',
+        'HSN/SAC', 'Purchase Order Number', 'Tax ID', 'Tax Name', 'Tax Type',
+        'Item TDS Name', 'Item TDS Section Code', 'Item TDS Section',
+        'Item Exemption Code', 'Item Type', 'Reverse Charge Tax Name',
+        'Reverse Charge Tax Rate', 'Reverse Charge Tax Type', 'Supply Type',
+        'ITC Eligibility', 'Discount Account', 'Discount Account Code',
+        'Customer Name', 'Project Name'
+    ],
+}
+
+# Date columns per dataset, formatted as 'YYYY-MM-DD' text by the processors
+DATE_COLUMNS = {
+    'contacts': ['Created Time', 'Last Modified Time'],
+    'vendors': ['Created Time', 'Last Modified Time'],
+    'invoices': ['Invoice Date', 'Due Date', 'Expected Payment Date', 'Last Payment Date'],
+    'customer_payments': ['Date', 'Created Time', 'Invoice Date', 'Invoice Payment Applied Date'],
+    'vendor_payments': ['Date', 'Bill Date', 'Bill Payment Applied Date'],
+    'credit_notes': ['Credit Note Date', 'Associated Invoice Date'],
+    'journals': ['Journal Date'],
+    'bills': ['Bill Date', 'Due Date', 'Submitted Date', 'Approved Date'],
+}
+
+# Amount, quantity, rate and percentage columns per dataset, parsed to numbers with NaN as 0.0
+NUMERIC_COLUMNS = {
+    'contacts': ['Credit Limit', 'Opening Balance', 'Opening Balance Exchange Rate', 'Tax Percentage'],
+    'vendors': ['Opening Balance', 'TDS Percentage', 'Exchange Rate'],
+    'invoices': [
+        'Exchange Rate', 'Entity Discount Percent', 'TCS Percentage', 'TDS Percentage',
+        'TDS Amount', 'SubTotal', 'Total', 'Balance', 'Adjustment', 'Shipping Charge',
+        'Shipping Charge Tax Amount', 'Shipping Charge Tax %', 'Quantity', 'Discount',
+        'Discount Amount', 'Item Total', 'Item Price', 'CGST Rate %', 'SGST Rate %',
+        'IGST Rate %', 'CESS Rate %', 'CGST', 'SGST', 'IGST', 'CESS',
+        'Reverse Charge Tax Rate', 'Item TDS Percentage', 'Item TDS Amount',
+        'Round Off', 'Shipping Bill Total', 'Item Tax', 'Item Tax %', 'Item Tax Amount',
+    ],
+    'customer_payments': [
+        'Amount', 'Unused Amount', 'Bank Charges', 'Exchange Rate',
+        'Tax Percentage', 'Amount Applied to Invoice', 'Withholding Tax Amount'
+    ],
+    'vendor_payments': [
+        'Amount', 'Unused Amount', 'TDSAmount', 'Exchange Rate', 'ReverseCharge Tax Percentage',
+        'ReverseCharge Tax Amount', 'TDS Percentage', 'Bill Amount', 'Withholding Tax Amount',
+        'Withholding Tax Amount (BCY)'
+    ],
+    'credit_notes': [
+        'Exchange Rate', 'Total', 'Balance', 'Entity Discount Percent',
+        'Shipping Charge', 'Shipping Charge Tax Amount', 'Shipping Charge Tax %',
+        'Adjustment', 'TCS Amount', 'TDS Amount', 'TDS Percentage',
+        'Discount', 'Discount Amount', 'Quantity', 'Item Tax Amount', 'Item Total',
+        'CGST Rate %', 'SGST Rate %', 'IGST Rate %', 'CESS Rate %',
+        'CGST(FCY)', 'SGST(FCY)', 'IGST(FCY)', 'CESS(FCY)', 'CGST', 'SGST', 'IGST', 'CESS',
+        'Reverse Charge Tax Rate', 'Item Tax %', 'TCS Percentage', 'Round Off',
+        'Entity Discount Amount', 'Item Price'
+    ],
+    'journals': [
+        'Exchange Rate', 'Tax Percentage', 'Tax Amount', 'Debit', 'Credit', 'Total'
+    ],
+    'bills': [
+        'Entity Discount Percent', 'Exchange Rate', 'SubTotal', 'Total', 'Balance',
+        'TCS Amount', 'Adjustment', 'Quantity', 'Usage unit', 'Tax Amount',
+        'Item Total', 'TDS Percentage', 'TCS Percentage', 'Rate', 'Discount',
+        'Discount Amount', 'CGST Rate %', 'SGST Rate %', 'IGST Rate %', 'CESS Rate %',
+        'CGST(FCY)', 'SGST(FCY)', 'IGST(FCY)', 'CESS(FCY)', 'CGST', 'SGST', 'IGST', 'CESS'
+    ],
+}
+
+# Bills only keep the columns process_bills cleans, plus the 'Bill ID' that
+# 03_generate_tally_xml.py groups line items by; other Zoho fields are never parsed.
+LOAD_COLUMNS['bills'] = ['Bill ID', *DATE_COLUMNS['bills'], *NUMERIC_COLUMNS['bills'], *STRING_COLUMNS['bills']]
+
 # --- Helper Functions ---
 
-def load_csv(file_name):
+def read_csv_header(file_path):
+    """Returns the column names from a CSV's header row."""
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+def read_csv_with_pyarrow(file_path, usecols=None, text_cols=()):
+    """
+    Parses a CSV with PyArrow's multithreaded reader and converts it to pandas.
+    Malformed rows are skipped and empty cells become NaN, as with pd.read_csv.
+    Only the `usecols` columns are converted when given; `text_cols` are read as strings.
+    The file is memory-mapped, so the parser reads the page cache directly instead of a copy.
+    """
+    convert_options = pac.ConvertOptions(strings_can_be_null=True,
+                                         column_types=dict.fromkeys(text_cols, pa.string()))
+    if usecols is not None:
+        convert_options.include_columns = usecols
+    with pa.memory_map(file_path, 'r') as source:
+        table = pac.read_csv(
+            source,
+            read_options=pac.ReadOptions(use_threads=True, block_size=64 << 20, encoding='utf-8'),
+            parse_options=pac.ParseOptions(invalid_row_handler=lambda row: 'skip'),
+            convert_options=convert_options,
+        )
+    return table.to_pandas(self_destruct=True)
+
+def read_csv_with_polars(file_path, usecols=None, text_cols=()):
+    """
+    Scans a CSV lazily with Polars, so only the `usecols` columns are parsed, and hands
+    the result to the pandas processors. `text_cols` are read as strings; other types are
+    inferred from the whole file, as with pd.read_csv(low_memory=False), and empty cells
+    become NaN.
+    """
+    lazy_df = pl.scan_csv(file_path, infer_schema_length=None, ignore_errors=True,
+                          truncate_ragged_lines=True, encoding='utf8-lossy',
+                          schema_overrides=dict.fromkeys(text_cols, pl.String))
+    if usecols is not None:
+        lazy_df = lazy_df.select(usecols)
+    return lazy_df.collect().to_pandas()
+
+def read_parquet_cache(file_path, cache_path, required_columns, columns=None):
+    """
+    Returns the cached DataFrame for a CSV, or None if there is no usable cache.
+    The cache is only used while it is newer than the CSV it was parsed from and
+    holds every column in `required_columns` (it may have been parsed with a
+    narrower column selection).
+    """
+    if pq is None or not os.path.exists(cache_path):
+        return None
+    if os.path.getmtime(cache_path) <= os.path.getmtime(file_path):
+        return None
+    try:
+        if not set(required_columns) <= set(pq.read_schema(cache_path).names):
+            return None
+        return pd.read_parquet(cache_path, engine='pyarrow', columns=columns, memory_map=True)
+    except Exception as e:
+        logger.warning(f"⚠️ Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+def write_parquet_cache(df, cache_path):
+    """
+    Writes a parsed CSV to its Parquet cache.
+    Written to a temporary file first so a partial cache is never picked up.
+    """
+    if pq is None:
+        return
+    tmp_path = cache_path + '.tmp'
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not write cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_csv(file_name, columns=None, string_columns=()):
     """
     Loads a CSV file into a pandas DataFrame.
     Includes robust error handling for file not found and parsing issues.
+    If `columns` is given, only those columns are parsed (names not in the file are ignored).
+    `string_columns` are parsed as text instead of having their type inferred.
     """
     file_path = os.path.join(EXTRACT_TO_DIR, file_name)
     if not os.path.exists(file_path):
-        print(f"❌ Error: Input file not found: {file_path}")
+        logger.error(f"❌ Error: Input file not found: {file_path}")
         return None
+    cache_path = file_path + PARQUET_CACHE_SUFFIX
     try:
-        # Use low_memory=False to avoid DtypeWarning for mixed types in columns
-        # on_bad_lines='skip' to gracefully handle malformed rows
-        df = pd.read_csv(file_path, encoding='utf-8', on_bad_lines='skip', low_memory=False)
-        print(f"Loaded {file_name} with {len(df)} rows and {len(df.columns)} columns.")
+        header = read_csv_header(file_path)
+        usecols = None
+        if columns is not None:
+            wanted = set(columns)
+            usecols = [col for col in header if col in wanted]
+        text = set(string_columns)
+        text_cols = [col for col in (header if usecols is None else usecols) if col in text]
+        df = read_parquet_cache(file_path, cache_path, header if usecols is None else usecols, usecols)
+        if df is None:
+            if pl is not None and pa is not None:
+                df = read_csv_with_polars(file_path, usecols, text_cols)
+            elif pac is not None:
+                df = read_csv_with_pyarrow(file_path, usecols, text_cols)
+            else:
+                # Use low_memory=False to avoid DtypeWarning for mixed types in columns
+                # on_bad_lines='skip' to gracefully handle malformed rows
+                df = pd.read_csv(file_path, encoding='utf-8', on_bad_lines='skip', low_memory=False,
+                                 usecols=usecols, dtype=dict.fromkeys(text_cols, str), memory_map=True)
+            write_parquet_cache(df, cache_path)
+        logger.info(f"Loaded {file_name} with {len(df)} rows and {len(df.columns)} columns.")
         return df
     except Exception as e:
-        print(f"❌ Error loading {file_name}: {e}")
+        logger.error(f"❌ Error loading {file_name}: {e}")
         return None
 
+def write_csv(df, f, include_header=True):
+    """
+    Writes a DataFrame as CSV to the binary file object f.
+    Uses PyArrow's writer when available, which serializes straight from Arrow buffers and is
+    much faster than to_csv on string-heavy frames; otherwise (or if a column can't be
+    converted to Arrow) falls back to to_csv with Unix line endings.
+    """
+    if pac is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except pa.ArrowException:
+            table = None
+        if table is not None:
+            pac.write_csv(table, f, write_options=pac.WriteOptions(include_header=include_header))
+            return
+    df.to_csv(f, index=False, header=include_header, encoding='utf-8', lineterminator='\n')
+
+def processed_parquet_path(output_path):
+    """Returns the path of the Parquet copy of a processed CSV."""
+    return os.path.splitext(output_path)[0] + '.parquet'
+
+def remove_processed_parquet(output_path):
+    """Deletes a processed CSV's Parquet copy, so a stale one is never read in place of the CSV."""
+    parquet_path = processed_parquet_path(output_path)
+    if os.path.exists(parquet_path):
+        os.remove(parquet_path)
+
+def save_processed_parquet(df, output_path):
+    """
+    Writes the Parquet copy of a processed CSV, keeping the cleaned dtypes.
+    Written after the CSV and via a temporary file, so it is only ever newer than a complete CSV.
+    """
+    if pq is None:
+        return
+    parquet_path = processed_parquet_path(output_path)
+    tmp_path = parquet_path + '.tmp'
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression=PROCESSED_PARQUET_COMPRESSION, index=False)
+        os.replace(tmp_path, parquet_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not write {parquet_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 def save_processed_csv(df, output_name):
     """
-    Saves a processed DataFrame to the PROCESSED_DATA_DIR.
-    Creates the directory if it doesn't exist.
+    Saves a processed DataFrame to the PROCESSED_DATA_DIR, plus its Parquet copy.
+    The directory is created once at startup by the main block. Returns True if the CSV was written.
     """
     if df is None:
-        print(f"⚠️ Cannot save {output_name}: DataFrame is None.")
-        return
-    if not os.path.exists(PROCESSED_DATA_DIR):
-        os.makedirs(PROCESSED_DATA_DIR)
-        print(f"Created processed data directory: '{PROCESSED_DATA_DIR}'")
+        logger.warning(f"⚠️ Cannot save {output_name}: DataFrame is None.")
+        return False
+    output_path = os.path.join(PROCESSED_DATA_DIR, output_name)
+    try:
+        remove_processed_parquet(output_path)
+        # Large write buffer keeps syscalls down on big outputs
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            write_csv(df, f)
+        save_processed_parquet(df, output_path)
+        logger.info(f"✅ Saved processed data to: {output_path}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error saving {output_name} to {output_path}: {e}")
+        return False
+
+def input_size(file_name):
+    """Returns the size in bytes of an extracted input CSV, or 0 if it is missing."""
+    file_path = os.path.join(EXTRACT_TO_DIR, file_name)
+    return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+def process_csv_in_chunks(file_name, process, output_name):
+    """
+    Cleans a large CSV CHUNK_ROWS rows at a time, appending each processed chunk to the
+    output file, so only one chunk is held in memory. The processor must be row-local.
+    No Parquet copy is written; 03_generate_tally_xml.py reads the CSV instead.
+    Returns True if the whole file was processed and saved.
+    """
+    file_path = os.path.join(EXTRACT_TO_DIR, file_name)
     output_path = os.path.join(PROCESSED_DATA_DIR, output_name)
+    rows = 0
     try:
-        df.to_csv(output_path, index=False, encoding='utf-8')
-        print(f"✅ Saved processed data to: {output_path}")
+        remove_processed_parquet(output_path)
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            # Read as text so a column's type can't change from one chunk to the next
+            # (e.g. IDs written as 5001 in one chunk and 5001.0 in another)
+            chunks = pd.read_csv(file_path, encoding='utf-8', on_bad_lines='skip', dtype=str,
+                                 chunksize=CHUNK_ROWS, memory_map=True)
+            for i, chunk in enumerate(chunks):
+                processed_chunk = process(chunk)
+                write_csv(processed_chunk, f, include_header=(i == 0))
+                rows += len(processed_chunk)
+        logger.info(f"✅ Saved {rows} processed rows to: {output_path}")
+        return True
     except Exception as e:
-        print(f"❌ Error saving {output_name} to {output_path}: {e}")
+        logger.error(f"❌ Error processing {file_name} in chunks: {e}")
+        return False
+
+def file_sha256(file_path):
+    """Returns the hex SHA-256 digest of a file's contents."""
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'): # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+def processed_fingerprint(file_name):
+    """
+    Returns the fingerprint stored in a cleaned CSV's sentinel: the SHA-256 of its Zoho input and
+    of this script, so a changed export or changed cleaning code both invalidate the CSV.
+    Returns None if the input is missing.
+    """
+    file_path = os.path.join(EXTRACT_TO_DIR, file_name)
+    if not os.path.exists(file_path):
+        return None
+    return f"{file_sha256(file_path)}:{file_sha256(os.path.abspath(__file__))}"
+
+def processed_sentinel_path(output_name):
+    """Returns the path of the sentinel file for a cleaned CSV."""
+    return os.path.join(PROCESSED_DATA_DIR, '.' + output_name + PROCESSED_SENTINEL_SUFFIX)
+
+def read_processed_sentinel(output_name):
+    """Returns the fingerprint recorded for a cleaned CSV, or None if there is no sentinel."""
+    try:
+        with open(processed_sentinel_path(output_name), 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def write_processed_sentinel(output_name, fingerprint):
+    """
+    Writes a cleaned CSV's sentinel atomically, via a temporary file renamed into place,
+    so an interrupted run never leaves a half-written sentinel behind.
+    """
+    sentinel_path = processed_sentinel_path(output_name)
+    tmp_path = sentinel_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(fingerprint)
+    os.replace(tmp_path, sentinel_path)
+
+def clean_dataset(key, process, output_name):
+    """
+    Loads, cleans and saves one dataset.
+    Skipped when the cleaned CSV's sentinel shows its input and this script are unchanged.
+    Large row-local inputs are streamed chunk by chunk instead of loaded whole.
+    """
+    file_name = ZOHO_FILES[key]
+    output_path = os.path.join(PROCESSED_DATA_DIR, output_name)
+    fingerprint = processed_fingerprint(file_name)
+    if (fingerprint is not None and os.path.exists(output_path)
+            and read_processed_sentinel(output_name) == fingerprint):
+        logger.info(f"\n✅ {output_path} is up to date ({file_name} unchanged), skipping.")
+        return
+
+    # Drop the old sentinel first, so a run that fails part-way can't vouch for a partial CSV
+    sentinel_path = processed_sentinel_path(output_name)
+    if os.path.exists(sentinel_path):
+        os.remove(sentinel_path)
+    if key in CHUNKABLE_DATASETS and input_size(file_name) > CHUNKED_FILE_BYTES:
+        saved = process_csv_in_chunks(file_name, process, output_name)
+    else:
+        df = load_csv(file_name, columns=LOAD_COLUMNS.get(key),
+                      string_columns=STRING_COLUMNS.get(key, ()))
+        saved = save_processed_csv(process(df), output_name)
+    if saved and fingerprint is not None:
+        write_processed_sentinel(output_name, fingerprint)
+
+def run_dataset(key, process, output_name):
+    """
+    Runs clean_dataset in a worker process with its log held in memory instead of written out.
+    Returns the log text, so the main process can write each dataset's log in one go, in order, and
+    whether the dataset was cleaned. An error is logged with its traceback instead of raised, so one
+    failing dataset does not lose the other datasets' logs.
+    """
+    log = io.StringIO()
+    handler = logging.StreamHandler(log)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    old_level, old_propagate = logger.level, logger.propagate
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    succeeded = True
+    try:
+        clean_dataset(key, process, output_name)
+    except Exception:
+        logger.exception(f"❌ Error cleaning {ZOHO_FILES[key]}:")
+        succeeded = False
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
+        logger.propagate = old_propagate
+    return log.getvalue(), succeeded
+
+def present_columns(df, column_names, exclude=()):
+    """
+    Returns the names in column_names that are columns of df (and not in `exclude`), in order.
+    df.columns is hashed once per call rather than probed once per name.
+    """
+    available = frozenset(df.columns).difference(exclude)
+    return [col for col in column_names if col in available]
+
+# Amount text is tidied in a single str.translate pass before parsing: currency symbols, thousands
+# separators and spaces are dropped, and accounting negatives like "(500.00)" become "-500.00"
+MONEY_NOISE_CHARACTERS = '₹$, \t\n\r\f\v\u00a0'
+MONEY_TRANSLATION = str.maketrans({**dict.fromkeys(MONEY_NOISE_CHARACTERS), '(': '-', ')': None})
+# The same tidy-up as regexes, for the Polars cleaning path, built from the same characters
+# (a regex \s would also drop other Unicode spaces that the translate table keeps)
+MONEY_NOISE_PATTERN = '[' + re.escape(MONEY_NOISE_CHARACTERS + ')') + ']'
+MONEY_NEGATIVE_PATTERN = r'\('
+
+# Day numbers (since 1970-01-01) of 0000-01-01 and 9999-12-31, the range format_iso_days can write
+MIN_ISO_DAY = -719528
+MAX_ISO_DAY = 2932896
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def format_iso_days(days, invalid, out):
+        """Writes each valid day number as 'YYYY-MM-DD' ASCII bytes into the rows of out."""
+        for i in prange(days.shape[0]):
+            if invalid[i]:
+                continue
+            # Civil date from days since the epoch (proleptic Gregorian calendar)
+            z = days[i] + 719468
+            era = z // 146097
+            doe = z - era * 146097
+            yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+            doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+            mp = (5 * doy + 2) // 153
+            day = doy - (153 * mp + 2) // 5 + 1
+            month = mp + 3 if mp < 10 else mp - 9
+            year = yoe + era * 400 + (1 if month <= 2 else 0)
+            out[i, 0] = 48 + year // 1000
+            out[i, 1] = 48 + year // 100 % 10
+            out[i, 2] = 48 + year // 10 % 10
+            out[i, 3] = 48 + year % 10
+            out[i, 4] = 45 # '-'
+            out[i, 5] = 48 + month // 10
+            out[i, 6] = 48 + month % 10
+            out[i, 7] = 45
+            out[i, 8] = 48 + day // 10
+            out[i, 9] = 48 + day % 10
+else:
+    format_iso_days = None
+
+def format_iso_dates(days):
+    """Formats a 1-D datetime64[D] array as 'YYYY-MM-DD' strings, with '' for NaT."""
+    invalid = np.isnat(days)
+    valid_days = days[~invalid].view('i8')
+    if format_iso_days is not None and (
+            valid_days.size == 0 or (valid_days.min() >= MIN_ISO_DAY and valid_days.max() <= MAX_ISO_DAY)):
+        # Compiled kernel writes the ASCII digits directly; invalid rows stay NUL, i.e. ''
+        out = np.zeros((len(days), 10), dtype=np.uint8)
+        format_iso_days(days.view('i8'), invalid, out)
+        return out.view('S10').ravel().astype('U10')
+    # Format valid dates via NumPy's day-unit ISO formatter (no per-row strftime),
+    # set invalid/NaT dates to empty string
+    formatted = days.astype('U10')
+    formatted[invalid] = ''
+    return formatted
+
+def format_date_columns(df, column_names):
+    """
+    Converts the listed columns present in df to datetime and formats them as 'YYYY-MM-DD' strings.
+    Each column is parsed on its own, so pandas infers each column's date format separately
+    (and parses each distinct string once), then all of them are formatted in a single pass.
+    """
+    present = present_columns(df, column_names)
+    if not present or df.empty:
+        return df
+    days = np.empty((len(present), len(df)), dtype='datetime64[D]')
+    for i, col in enumerate(present):
+        # Attempt to convert to datetime, coercing errors
+        dates = pd.to_datetime(df[col], errors='coerce', cache=True)
+        if dates.dt.tz is not None:
+            # Keep the local calendar date rather than the UTC one
+            dates = dates.dt.tz_localize(None)
+        days[i] = dates.values.astype('datetime64[D]')
+    formatted = format_iso_dates(days.ravel()).reshape(days.shape)
+    for i, col in enumerate(present):
+        df[col] = formatted[i]
+    return df
 
 def format_date_column(df, column_name):
     """Converts a column to datetime objects and then formats as 'YYYY-MM-DD' string."""
-    if column_name in df.columns and not df[column_name].empty:
-        # Attempt to convert to datetime, coercing errors
-        df[column_name] = pd.to_datetime(df[column_name], errors='coerce')
-        # Format valid dates, set invalid/NaT dates to empty string
-        df[column_name] = df[column_name].dt.strftime('%Y-%m-%d').fillna('')
+    return format_date_columns(df, [column_name])
+
+def clean_numeric_columns(df, column_names):
+    """
+    Converts the listed columns present in df to numeric in one block, filling NaNs with 0.0.
+    Text columns are tidied first: currency symbols, thousands separators and spaces are
+    stripped (e.g. "₹ 1,234.50") and accounting negatives like "(500.00)" become "-500.00".
+    Columns the reader already parsed as numbers only have their NaNs filled.
+    """
+    present = present_columns(df, column_names)
+    if present and not df.empty:
+        block = df[present]
+        text_cols = block.select_dtypes(include=['object', 'string']).columns
+        if len(text_cols):
+            for col in text_cols:
+                # Non-string cells (NaN, or numbers in a mixed column) come back as NaN; keep them as they were
+                tidied = block[col].str.translate(MONEY_TRANSLATION)
+                block[col] = tidied.where(tidied.notna(), block[col])
+        unparsed = [col for col, dtype in block.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)]
+        if unparsed:
+            block[unparsed] = block[unparsed].apply(pd.to_numeric, errors='coerce')
+        df[present] = block.fillna(0.0)
     return df
 
 def clean_numeric_column(df, column_name):
     """Converts a column to numeric, filling NaNs with 0.0."""
-    if column_name in df.columns and not df[column_name].empty:
-        df[column_name] = pd.to_numeric(df[column_name], errors='coerce').fillna(0.0)
+    return clean_numeric_columns(df, [column_name])
+
+def constant_column(df, value):
+    """Returns a single-category Categorical holding `value` on every row of df."""
+    return pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[value])
+
+def categorize_columns(df, column_names):
+    """
+    Stores the listed columns present in df as Categoricals, skipping any whose share of
+    distinct values is LOW_CARDINALITY_RATIO or more (categories would not save memory there).
+    """
+    present = present_columns(df, column_names)
+    if len(df):
+        present = [col for col in present if df[col].nunique() < LOW_CARDINALITY_RATIO * len(df)]
+    if present:
+        df[present] = df[present].astype('category')
+    return df
+
+def clean_string_columns(df, column_names):
+    """
+    Fills NaN/None with '' and casts to str for the listed columns present in df, in one block.
+    Where ARROW_STRING_DTYPE is available the columns become Arrow-backed strings (one contiguous
+    buffer per column) instead of object arrays of Python strings.
+    """
+    present = present_columns(df, column_names)
+    if present:
+        if ARROW_STRING_DTYPE is not None:
+            df[present] = df[present].astype(ARROW_STRING_DTYPE).fillna('')
+        else:
+            df[present] = df[present].astype(object).fillna('').astype(str)
+    return df
+
+def clean_columns_with_polars(df, numeric_columns, string_columns):
+    """
+    Same result as clean_numeric_columns followed by clean_string_columns, but run by Polars
+    over just those columns in one multithreaded pass (requires polars and pyarrow).
+    Falls back to the pandas versions if the columns can't be handed to Polars.
+    """
+    numeric = present_columns(df, numeric_columns)
+    text = present_columns(df, string_columns, exclude=numeric)
+    if pl is None or pa is None or df.empty or not (numeric or text):
+        return clean_string_columns(clean_numeric_columns(df, numeric), text)
+    try:
+        block = pl.from_pandas(df[numeric + text])
+    except Exception:
+        return clean_string_columns(clean_numeric_columns(df, numeric), text)
+
+    tidied = {
+        col: pl.col(col).str.replace_all(MONEY_NOISE_PATTERN, '')
+                        .str.replace_all(MONEY_NEGATIVE_PATTERN, '-')
+        for col in numeric if block.schema[col] == pl.String
+    }
+    int_cols = set()
+    if tidied:
+        # pd.to_numeric keeps a text column as integers when every value parses as one
+        int_nulls = block.select([expr.cast(pl.Int64, strict=False).null_count() for expr in tidied.values()])
+        int_cols = {col for col, nulls in zip(tidied, int_nulls.row(0)) if nulls == 0}
+
+    exprs = []
+    for col in numeric:
+        if col in int_cols:
+            exprs.append(tidied[col].cast(pl.Int64))
+        elif col in tidied:
+            exprs.append(tidied[col].cast(pl.Float64, strict=False).fill_nan(0.0).fill_null(0.0))
+        elif block.schema[col].is_float():
+            exprs.append(pl.col(col).fill_nan(0.0).fill_null(0.0))
+    exprs += [pl.col(col).cast(pl.String).fill_null('') for col in text]
+    cleaned = block.with_columns(exprs).to_pandas()
+    # Polars drops the pandas index; restore it so the columns line up with df on assignment
+    # (chunks read from large files are numbered from where the chunk starts, not from 0)
+    cleaned.index = df.index
+
+    if numeric:
+        df[numeric] = cleaned[numeric]
+    if text:
+        df[text] = cleaned[text].astype(ARROW_STRING_DTYPE) if ARROW_STRING_DTYPE is not None else cleaned[text]
     return df
 
+def add_ledger_columns(df, ledgers):
+    """
+    Adds the Tally ledger columns described by a LEDGER_COLUMNS entry in a single assign.
+    Fixed ledgers are stored as single-category Categoricals.
+    """
+    columns = {}
+    for col, ledger in ledgers.items():
+        if isinstance(ledger, tuple):
+            source, default = ledger
+            columns[col] = df[source].where(df[source] != '', default)
+        else:
+            columns[col] = constant_column(df, ledger)
+    return df.assign(**columns) if columns else df
+
+def clean_dataset_columns(df, key):
+    """
+    Runs the cleaning every processor shares, driven by the dataset's column tables:
+    formats DATE_COLUMNS, cleans NUMERIC_COLUMNS and STRING_COLUMNS together (one Polars
+    query when it is installed), then adds its LEDGER_COLUMNS.
+    """
+    return (
+        df.pipe(format_date_columns, DATE_COLUMNS.get(key, ()))
+          .pipe(clean_columns_with_polars, NUMERIC_COLUMNS.get(key, ()), STRING_COLUMNS.get(key, ()))
+          .pipe(add_ledger_columns, LEDGER_COLUMNS.get(key, {}))
+    )
+
 # --- Data Cleaning and Mapping Functions ---
 
+# Unified address block for contacts/vendors (consider multiline addresses).
+# Tally has separate fields for address lines, city, state, country, pincode.
+# The Zoho address columns are already ''-filled by the string cleaning, so these are plain renames.
+# Map Zoho State to Tally-compatible State Name (if different)
+# This might require a separate CSV mapping for state codes/names
+# For now, just use Zoho's state name
+ADDRESS_COLUMN_RENAMES = {
+    'Billing Address': 'Tally_Billing_Address_Line1',
+    'Billing Street2': 'Tally_Billing_Address_Line2',
+    'Shipping Address': 'Tally_Shipping_Address_Line1',
+    'Shipping Street2': 'Tally_Shipping_Address_Line2',
+    'Billing State': 'Tally_Billing_State',
+    'Shipping State': 'Tally_Shipping_State',
+}
+
+# Define a robust mapping for Zoho Account Type to Tally Parent Groups.
+# THIS IS CRITICAL AND MUST BE CUSTOMIZED TO YOUR TALLY'S CHART OF ACCOUNTS.
+# Default Tally groups you might use: Capital Account, Current Assets, Current Liabilities,
+# Direct Expenses, Direct Incomes, Indirect Expenses, Indirect Incomes, Bank Accounts, Cash-in-Hand,
+# Loans (Liability), Loans & Advances (Asset), Fixed Assets, Duties & Taxes, Sundry Debtors, Sundry Creditors etc.
+ACCOUNT_TYPE_MAP = MappingProxyType({
+    'Asset': 'Current Assets',
+    'Bank': 'Bank Accounts',
+    'Cash': 'Cash-in-Hand',
+    'Expense': 'Indirect Expenses', # Often, Zoho expenses map to indirect
+    'Cost of Goods Sold': 'Direct Expenses',
+    'Equity': 'Capital Account',
+    'Income': 'Indirect Incomes', # Often, Zoho incomes map to indirect
+    'Other Income': 'Indirect Incomes',
+    'Liability': 'Current Liabilities',
+    'Other Current Asset': 'Current Assets',
+    'Other Current Liability': 'Current Liabilities',
+    'Account Receivable': 'Sundry Debtors', # Special handling for default Zoho types
+    'Account Payable': 'Sundry Creditors',
+    # Add more mappings based on your specific Zoho types and desired Tally groups
+    'Fixed Asset': 'Fixed Assets',
+    'Loan (Liability)': 'Loans (Liability)',
+    'Other Asset': 'Current Assets',
+    'Stock': 'Stock-in-Hand', # If you treat inventory as a ledger
+    'Cess': 'Duties & Taxes',
+    'TDS Receivable': 'Duties & Taxes',
+    'TDS Payable': 'Duties & Taxes',
+    'CGST': 'Duties & Taxes',
+    'SGST': 'Duties & Taxes',
+    'IGST': 'Duties & Taxes',
+    'Service Tax': 'Duties & Taxes', # Old tax, but just in case
+    'Professional Tax': 'Duties & Taxes',
+    'TCS': 'Duties & Taxes',
+    'Advance Tax': 'Duties & Taxes',
+    'Secured Loan': 'Secured Loans',
+    'Unsecured Loan': 'Unsecured Loans',
+    'Provisions': 'Provisions',
+    'Branch / Division': 'Branch / Divisions',
+    # Fallback for types not explicitly mapped - adjust as needed
+    'Statutory': 'Duties & Taxes',
+    'Other Liability': 'Current Liabilities',
+    'Retained Earnings': 'Reserves & Surplus',
+    'Long Term Liability': 'Loans (Liability)',
+    'Long Term Asset': 'Fixed Assets',
+    'Loan & Advance (Asset)': 'Loans & Advances (Asset)',
+    'Stock Adjustment Account': 'Direct Expenses', # Or specific stock adjustment group
+    'Uncategorized': 'Suspense A/c'
+})
+
+# Tally ledger names used for the tax and round-off lines of vouchers.
+# Customize to your Tally ledger names; create them in Tally if they don't exist.
+OUTPUT_CGST_LEDGER = 'Output CGST'
+OUTPUT_SGST_LEDGER = 'Output SGST'
+OUTPUT_IGST_LEDGER = 'Output IGST'
+INPUT_CGST_LEDGER = 'Input CGST'
+INPUT_SGST_LEDGER = 'Input SGST'
+INPUT_IGST_LEDGER = 'Input IGST'
+ROUND_OFF_LEDGER = 'Round Off'
+
+# Tally ledger columns each dataset gets, in output order. A string is the same ledger on every row;
+# a (column, default) pair takes the ledger from that Zoho column, falling back to the default where
+# it is blank. The Zoho-to-Tally ledger mapping is critical and might need a separate configuration file.
+LEDGER_COLUMNS = {
+    'invoices': {
+        'Tally_Sales_Ledger_Name': ('Account', 'Sales Account'),
+        'Tally_Output_CGST_Ledger': OUTPUT_CGST_LEDGER,
+        'Tally_Output_SGST_Ledger': OUTPUT_SGST_LEDGER,
+        'Tally_Output_IGST_Ledger': OUTPUT_IGST_LEDGER,
+        'Tally_Round_Off_Ledger': ROUND_OFF_LEDGER,
+    },
+    # Zoho's 'Deposit To' / 'Paid Through' name the Tally Bank/Cash ledger
+    'customer_payments': {'Tally_Deposit_Ledger': ('Deposit To', 'Cash-in-Hand')},
+    'vendor_payments': {'Tally_Paid_Through_Ledger': ('Paid Through', 'Cash-in-Hand')},
+    'credit_notes': {
+        'Tally_Sales_Return_Ledger': ('Account', 'Sales Returns'),
+        'Tally_Output_CGST_Ledger': OUTPUT_CGST_LEDGER,
+        'Tally_Output_SGST_Ledger': OUTPUT_SGST_LEDGER,
+        'Tally_Output_IGST_Ledger': OUTPUT_IGST_LEDGER,
+    },
+    'bills': {
+        'Tally_Purchase_Ledger_Name': ('Account', 'Purchase Account'),
+        'Tally_Input_CGST_Ledger': INPUT_CGST_LEDGER,
+        'Tally_Input_SGST_Ledger': INPUT_SGST_LEDGER,
+        'Tally_Input_IGST_Ledger': INPUT_IGST_LEDGER,
+        'Tally_Round_Off_Ledger': ROUND_OFF_LEDGER,
+    },
+}
+
+# Columns each processor stores as Categoricals (subject to LOW_CARDINALITY_RATIO), by their output names
+CATEGORY_COLUMNS = {
+    'chart_of_accounts': ['Account Type', 'Tally_Parent_Group', 'Tally_Status', 'Currency'],
+    'contacts': ['Status', 'GST Treatment'],
+    'vendors': ['Status', 'GST Treatment'],
+    'invoices': [
+        'Invoice Status', 'GST Treatment', 'Invoice Type', 'Account', 'Account Code',
+        'Item Type', 'Supply Type', 'Tax ID', 'Item Tax Type'
+    ],
+    'customer_payments': ['Mode', 'Currency Code', 'Payment Type', 'GST Treatment'],
+    'vendor_payments': ['Mode', 'Currency Code', 'Payment Status', 'Payment Type', 'GST Treatment'],
+    'credit_notes': [
+        'Credit Note Status', 'Currency Code', 'GST Treatment', 'Account', 'Account Code',
+        'Item Type', 'Supply Type', 'Item Tax Type'
+    ],
+    'journals': [
+        'Journal Type', 'Journal Entity Type', 'Status', 'Currency', 'Tax Name', 'Tax Type',
+        'Account', 'Account Code'
+    ],
+    'bills': [
+        'Bill Status', 'Currency Code', 'GST Treatment', 'Vendor Name', 'Account', 'Account Code',
+        'Tax Name', 'Tax Type', 'Item Type', 'Supply Type', 'ITC Eligibility'
+    ],
+}
+
+# Account types as a categorical dtype, so the mapping is an integer take into
+# ACCOUNT_TYPE_GROUPS instead of a dict lookup per row
+ACCOUNT_TYPE_DTYPE = pd.CategoricalDtype(categories=list(ACCOUNT_TYPE_MAP))
+ACCOUNT_TYPE_GROUPS = np.array(list(ACCOUNT_TYPE_MAP.values()), dtype=object)
+
 def process_chart_of_accounts(df):
     """
     Cleans and maps Zoho Chart of Accounts to Tally Ledgers/Groups.
@@ -88,60 +973,12 @@ def process_chart_of_accounts(df):
     - Maps Zoho Account Types to common Tally Parent Groups.
     - Handles missing descriptions.
     """
-    print("\n--- Processing Chart of Accounts ---")
+    logger.info("\n--- Processing Chart of Accounts ---")
     if df is None: return None
 
-    # Define a robust mapping for Zoho Account Type to Tally Parent Groups.
-    # THIS IS CRITICAL AND MUST BE CUSTOMIZED TO YOUR TALLY'S CHART OF ACCOUNTS.
-    # Default Tally groups you might use: Capital Account, Current Assets, Current Liabilities,
-    # Direct Expenses, Direct Incomes, Indirect Expenses, Indirect Incomes, Bank Accounts, Cash-in-Hand,
-    # Loans (Liability), Loans & Advances (Asset), Fixed Assets, Duties & Taxes, Sundry Debtors, Sundry Creditors etc.
-    account_type_map = {
-        'Asset': 'Current Assets',
-        'Bank': 'Bank Accounts',
-        'Cash': 'Cash-in-Hand',
-        'Expense': 'Indirect Expenses', # Often, Zoho expenses map to indirect
-        'Cost of Goods Sold': 'Direct Expenses',
-        'Equity': 'Capital Account',
-        'Income': 'Indirect Incomes', # Often, Zoho incomes map to indirect
-        'Other Income': 'Indirect Incomes',
-        'Liability': 'Current Liabilities',
-        'Other Current Asset': 'Current Assets',
-        'Other Current Liability': 'Current Liabilities',
-        'Account Receivable': 'Sundry Debtors', # Special handling for default Zoho types
-        'Account Payable': 'Sundry Creditors',
-        # Add more mappings based on your specific Zoho types and desired Tally groups
-        'Fixed Asset': 'Fixed Assets',
-        'Loan (Liability)': 'Loans (Liability)',
-        'Other Asset': 'Current Assets',
-        'Stock': 'Stock-in-Hand', # If you treat inventory as a ledger
-        'Cess': 'Duties & Taxes',
-        'TDS Receivable': 'Duties & Taxes',
-        'TDS Payable': 'Duties & Taxes',
-        'CGST': 'Duties & Taxes',
-        'SGST': 'Duties & Taxes',
-        'IGST': 'Duties & Taxes',
-        'Service Tax': 'Duties & Taxes', # Old tax, but just in case
-        'Professional Tax': 'Duties & Taxes',
-        'TCS': 'Duties & Taxes',
-        'Advance Tax': 'Duties & Taxes',
-        'Secured Loan': 'Secured Loans',
-        'Unsecured Loan': 'Unsecured Loans',
-        'Provisions': 'Provisions',
-        'Branch / Division': 'Branch / Divisions',
-        # Fallback for types not explicitly mapped - adjust as needed
-        'Statutory': 'Duties & Taxes',
-        'Other Liability': 'Current Liabilities',
-        'Retained Earnings': 'Reserves & Surplus',
-        'Long Term Liability': 'Loans (Liability)',
-        'Long Term Asset': 'Fixed Assets',
-        'Loan & Advance (Asset)': 'Loans & Advances (Asset)',
-        'Stock Adjustment Account': 'Direct Expenses', # Or specific stock adjustment group
-        'Uncategorized': 'Suspense A/c'
-    }
-
     # Apply the mapping, defaulting to 'Primary' or a 'Suspense A/c' if not found
-    df['Tally_Parent_Group'] = df['Account Type'].astype(str).apply(lambda x: account_type_map.get(x, 'Suspense A/c'))
+    codes = ACCOUNT_TYPE_DTYPE.categories.get_indexer(df['Account Type'].astype('string'))
+    df['Tally_Parent_Group'] = np.where(codes >= 0, ACCOUNT_TYPE_GROUPS[codes], 'Suspense A/c')
 
     # Rename columns for easier Tally mapping later
     df_mapped = df.rename(columns={
@@ -151,10 +988,12 @@ def process_chart_of_accounts(df):
         'Account Status': 'Tally_Status', # Active/Inactive
     })
 
-    # Fill missing values for string columns
-    df_mapped['Tally_Description'] = df_mapped['Tally_Description'].fillna('')
-    df_mapped['Tally_Account_Code'] = df_mapped['Tally_Account_Code'].fillna('')
-    df_mapped['Parent Account'] = df_mapped['Parent Account'].fillna('') # Zoho's parent account, might not directly map to Tally parent groups
+    # Fill missing values for string columns in one block
+    # ('Parent Account' is Zoho's parent account, might not directly map to Tally parent groups)
+    fill_cols = ['Tally_Description', 'Tally_Account_Code', 'Parent Account']
+    df_mapped[fill_cols] = df_mapped[fill_cols].fillna('')
+
+    df_mapped = categorize_columns(df_mapped, CATEGORY_COLUMNS['chart_of_accounts'])
 
     # Select relevant columns for output
     df_processed = df_mapped[[
@@ -167,9 +1006,9 @@ def process_chart_of_accounts(df):
         'Tally_Status',
         'Currency',
         'Parent Account' # Original Zoho parent
-    ]].copy()
+    ]]
 
-    print(f"Processed {len(df_processed)} Chart of Accounts entries.")
+    logger.info(f"Processed {len(df_processed)} Chart of Accounts entries.")
     return df_processed
 
 def process_contacts(df):
@@ -179,54 +1018,14 @@ def process_contacts(df):
     - Cleans address, phone, email, GSTIN.
     - Formats date fields.
     """
-    print("\n--- Processing Contacts ---")
+    logger.info("\n--- Processing Contacts ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Created Time')
-    df_cleaned = format_date_column(df_cleaned, 'Last Modified Time')
-
-    # Fill NaN/None with empty strings for text fields that will go into XML
-    string_cols = [
-        'Display Name', 'Company Name', 'Salutation', 'First Name', 'Last Name',
-        'Phone', 'EmailID', 'MobilePhone', 'Website', 'Notes', 'Status',
-        'Billing Attention', 'Billing Address', 'Billing Street2', 'Billing City',
-        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
-        'Shipping Attention', 'Shipping Address', 'Shipping Street2', 'Shipping City',
-        'Shipping State', 'Shipping Country', 'Shipping Code', 'Shipping Phone', 'Shipping Fax',
-        'Skype Identity', 'Facebook', 'Twitter', 'Department', 'Designation',
-        'Price List', 'Payment Terms', 'Payment Terms Label', 'GST Treatment',
-        'GST Identification Number (GSTIN)', 'Owner Name', 'Primary Contact ID',
-        'Contact Name', 'Contact Type', 'Place Of Contact', 'Place of Contact(With State Code)',
-        'Taxable', 'TaxID', 'Tax Name', 'Tax Type', 'Exemption Reason', 'Source'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Clean numeric columns
-    numeric_cols = ['Credit Limit', 'Opening Balance', 'Opening Balance Exchange Rate', 'Tax Percentage']
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Create a unified address block for Tally (consider multiline addresses)
-    # Tally has separate fields for address lines, city, state, country, pincode.
-    df_cleaned['Tally_Billing_Address_Line1'] = df_cleaned['Billing Address'].fillna('')
-    df_cleaned['Tally_Billing_Address_Line2'] = df_cleaned['Billing Street2'].fillna('')
-    df_cleaned['Tally_Shipping_Address_Line1'] = df_cleaned['Shipping Address'].fillna('')
-    df_cleaned['Tally_Shipping_Address_Line2'] = df_cleaned['Shipping Street2'].fillna('')
-
-    # Map Zoho State to Tally-compatible State Name (if different)
-    # This might require a separate CSV mapping for state codes/names
-    # For now, just use Zoho's state name
-    df_cleaned['Tally_Billing_State'] = df_cleaned['Billing State']
-    df_cleaned['Tally_Shipping_State'] = df_cleaned['Shipping State']
+    df_cleaned = clean_dataset_columns(df, 'contacts')
 
     # Rename Display Name for clarity as it typically becomes the Ledger Name
     df_processed = df_cleaned.rename(columns={
+        **ADDRESS_COLUMN_RENAMES,
         'Display Name': 'Tally_Party_Name',
         'GST Identification Number (GSTIN)': 'Tally_GSTIN',
         'EmailID': 'Tally_Email',
@@ -236,6 +1035,8 @@ def process_contacts(df):
         'Place of Contact(With State Code)': 'Tally_Place_of_Supply_Code' # For GST implications
     })
 
+    df_processed = categorize_columns(df_processed, CATEGORY_COLUMNS['contacts'])
+
     # Filter out essential columns for the output
     df_final = df_processed[[
         'Contact ID',
@@ -262,9 +1063,9 @@ def process_contacts(df):
         'Status', # Active/Inactive
         'Tally_Place_of_Supply_Code',
         'GST Treatment'
-    ]].copy()
+    ]]
 
-    print(f"Processed {len(df_final)} Contacts entries.")
+    logger.info(f"Processed {len(df_final)} Contacts entries.")
     return df_final
 
 def process_vendors(df):
@@ -272,48 +1073,13 @@ def process_vendors(df):
     Cleans and maps Zoho Vendors to Tally Sundry Creditors.
     Similar logic to contacts.
     """
-    print("\n--- Processing Vendors ---")
+    logger.info("\n--- Processing Vendors ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Created Time')
-    df_cleaned = format_date_column(df_cleaned, 'Last Modified Time')
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Contact Name', 'Company Name', 'Display Name', 'Salutation', 'First Name',
-        'Last Name', 'EmailID', 'Phone', 'MobilePhone', 'Payment Terms', 'Currency Code',
-        'Notes', 'Website', 'Status', 'Location Name', 'Payment Terms Label',
-        'Source of Supply', 'Skype Identity', 'Department', 'Designation', 'Facebook', 'Twitter',
-        'GST Treatment', 'GST Identification Number (GSTIN)', 'MSME/Udyam No', 'MSME/Udyam Type',
-        'TDS Name', 'TDS Section', 'Price List', 'Contact Address ID', 'Billing Attention',
-        'Billing Address', 'Billing Street2', 'Billing City', 'Billing State', 'Billing Country',
-        'Billing Code', 'Billing Phone', 'Billing Fax', 'Shipping Attention', 'Shipping Address',
-        'Shipping Street2', 'Shipping City', 'Shipping State', 'Shipping Country',
-        'Shipping Code', 'Shipping Phone', 'Shipping Fax', 'Source', 'Owner Name', 'Primary Contact ID',
-        'Beneficiary Name', 'Vendor Bank Account Number', 'Vendor Bank Name', 'Vendor Bank Code'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Clean numeric columns
-    numeric_cols = ['Opening Balance', 'TDS Percentage', 'Exchange Rate']
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Create unified address blocks
-    df_cleaned['Tally_Billing_Address_Line1'] = df_cleaned['Billing Address'].fillna('')
-    df_cleaned['Tally_Billing_Address_Line2'] = df_cleaned['Billing Street2'].fillna('')
-    df_cleaned['Tally_Shipping_Address_Line1'] = df_cleaned['Shipping Address'].fillna('')
-    df_cleaned['Tally_Shipping_Address_Line2'] = df_cleaned['Shipping Street2'].fillna('')
-    df_cleaned['Tally_Billing_State'] = df_cleaned['Billing State']
-    df_cleaned['Tally_Shipping_State'] = df_cleaned['Shipping State']
+    df_cleaned = clean_dataset_columns(df, 'vendors')
 
     df_processed = df_cleaned.rename(columns={
+        **ADDRESS_COLUMN_RENAMES,
         'Display Name': 'Tally_Party_Name',
         'GST Identification Number (GSTIN)': 'Tally_GSTIN',
         'EmailID': 'Tally_Email',
@@ -324,6 +1090,8 @@ def process_vendors(df):
         'Vendor Bank Code': 'Tally_IFSC_Code' # Assuming Bank Code is IFSC for Tally
     })
 
+    df_processed = categorize_columns(df_processed, CATEGORY_COLUMNS['vendors'])
+
     df_final = df_processed[[
         'Contact ID',
         'Tally_Party_Name',
@@ -350,9 +1118,9 @@ def process_vendors(df):
         'Tally_Bank_Account_No',
         'Tally_Bank_Name',
         'Tally_IFSC_Code'
-    ]].copy()
+    ]]
 
-    print(f"Processed {len(df_final)} Vendors entries.")
+    logger.info(f"Processed {len(df_final)} Vendors entries.")
     return df_final
 
 
@@ -365,77 +1133,11 @@ def process_invoices(df):
     - Cleans numeric amounts.
     - Handles item-level details (assuming they are present per row for simplicity).
     """
-    print("\n--- Processing Invoices ---")
+    logger.info("\n--- Processing Invoices ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Invoice Date')
-    df_cleaned = format_date_column(df_cleaned, 'Due Date')
-    df_cleaned = format_date_column(df_cleaned, 'Expected Payment Date')
-    df_cleaned = format_date_column(df_cleaned, 'Last Payment Date')
-
-    # Clean numeric columns (amounts, quantities, rates, percentages)
-    numeric_cols = [
-        'Exchange Rate', 'Entity Discount Percent', 'TCS Percentage', 'TDS Percentage',
-        'TDS Amount', 'SubTotal', 'Total', 'Balance', 'Adjustment', 'Shipping Charge',
-        'Shipping Charge Tax Amount', 'Shipping Charge Tax %', 'Quantity', 'Discount',
-        'Discount Amount', 'Item Total', 'Item Price', 'CGST Rate %', 'SGST Rate %',
-        'IGST Rate %', 'CESS Rate %', 'CGST', 'SGST', 'IGST', 'CESS',
-        'Reverse Charge Tax Rate', 'Item TDS Percentage', 'Item TDS Amount',
-        'Round Off', 'Shipping Bill Total', 'Item Tax', 'Item Tax %', 'Item Tax Amount',
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Invoice Number', 'Invoice Status', 'Customer Name', 'Place of Supply',
-        'Place of Supply(With State Code)', 'GST Treatment', 'PurchaseOrder',
-        'Discount Type', 'Template Name', 'TCS Tax Name', 'TDS Calculation Type',
-        'TDS Name', 'TDS Section Code', 'TDS Section', 'Adjustment Description',
-        'Payment Terms', 'Payment Terms Label', 'Notes', 'Terms & Conditions',
-        'E-WayBill Number', 'E-WayBill Status', 'Transporter Name', 'Transporter ID',
-        'Invoice Type', 'Location Name', 'Shipping Charge Tax ID', 'Shipping Charge Tax Name',
-        'Shipping Charge Tax Type', 'Shipping Charge Tax Exemption Code', 'Shipping Charge SAC Code',
-        'Item Name', 'Item Desc', 'Usage unit', 'Product ID', 'Brand', 'Sales Order Number',
-        'subscription_id', 'Expense Reference ID', 'Recurrence Name',
-        'Billing Attention', 'Billing Address', 'Billing Street2', 'Billing City',
-        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
-        'Shipping Attention', 'Shipping Address', 'Shipping Street2', 'Shipping City',
-        'Shipping State', 'Shipping Country', 'Shipping Code', 'Shipping Fax',
-        'Shipping Phone Number', 'Supplier Org Name', 'Supplier GST Registration Number',
-        'Supplier Street Address', 'Supplier City', 'Supplier State', 'Supplier Country',
-        'Supplier ZipCode', 'Supplier Phone', 'Supplier E-Mail', 'Reverse Charge Tax Name',
-        'Reverse Charge Tax Type', 'Item TDS Name', 'Item TDS Section Code', 'Item TDS Section',
-        'Nature Of Collection', 'SKU', 'Project ID', 'Project Name', 'HSN/SAC',
-        'Sales person', 'Subject', 'Primary Contact EmailID', 'Primary Contact Mobile',
-        'Primary Contact Phone', 'Estimate Number', 'Item Type', 'Custom Charges',
-        'Shipping Bill#', 'PortCode', 'Reference Invoice#', 'Reference Invoice Type',
-        'GST Registration Number(Reference Invoice)', 'Reason for issuing Debit Note',
-        'E-Commerce Operator Name', 'E-Commerce Operator GSTIN', 'Account',
-        'Account Code', 'Line Item Location Name', 'Supply Type', 'Tax ID',
-        'Item Tax Type', 'Item Tax Exemption Reason', 'Kit Combo Item Name', 'CF.Brand Name'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Map Tally Ledger Names for sales/purchase/tax accounts
-    # This is a critical mapping that might need a separate configuration file
-    df_cleaned['Tally_Sales_Ledger_Name'] = df_cleaned['Account'].fillna('Sales Account') # Default Sales Ledger
-    df_cleaned['Tally_Output_CGST_Ledger'] = 'Output CGST' # Customize to your Tally ledger names
-    df_cleaned['Tally_Output_SGST_Ledger'] = 'Output SGST'
-    df_cleaned['Tally_Output_IGST_Ledger'] = 'Output IGST'
-    df_cleaned['Tally_Round_Off_Ledger'] = 'Round Off' # Create this if it doesn't exist
-
-    # Ensure Customer ID is consistent
-    df_cleaned['Customer ID'] = df_cleaned['Customer ID'].fillna('').astype(str)
-
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Invoices entries (including line items).")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'invoices'), CATEGORY_COLUMNS['invoices'])
+    logger.info(f"Processed {len(df_processed)} Invoices entries (including line items).")
     return df_processed
 
 def process_customer_payments(df):
@@ -446,48 +1148,11 @@ def process_customer_payments(df):
     - Identifies deposit account (Cash/Bank).
     - Links to invoices where possible.
     """
-    print("\n--- Processing Customer Payments ---")
+    logger.info("\n--- Processing Customer Payments ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Date')
-    df_cleaned = format_date_column(df_cleaned, 'Created Time')
-    df_cleaned = format_date_column(df_cleaned, 'Invoice Date')
-    df_cleaned = format_date_column(df_cleaned, 'Invoice Payment Applied Date')
-
-    # Clean numeric columns
-    numeric_cols = [
-        'Amount', 'Unused Amount', 'Bank Charges', 'Exchange Rate',
-        'Tax Percentage', 'Amount Applied to Invoice', 'Withholding Tax Amount'
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Payment Number', 'Mode', 'Description', 'Currency Code', 'Branch ID',
-        'Payment Number Prefix', 'Payment Number Suffix', 'Customer Name',
-        'Place of Supply', 'Place of Supply(With State Code)', 'GST Treatment',
-        'GST Identification Number (GSTIN)', 'Description of Supply', 'Tax Name',
-        'Tax Type', 'Payment Type', 'Location Name', 'Deposit To',
-        'Deposit To Account Code', 'Tax Account', 'Invoice Number'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Map Zoho's 'Deposit To' to actual Tally Bank/Cash Ledger Names
-    df_cleaned['Tally_Deposit_Ledger'] = df_cleaned['Deposit To'].apply(
-        lambda x: x if x else 'Cash-in-Hand' # Use Zoho's 'Deposit To' if available, else default
-    )
-    # Ensure CustomerID is consistent
-    df_cleaned['CustomerID'] = df_cleaned['CustomerID'].fillna('').astype(str)
-
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Customer Payments entries.")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'customer_payments'), CATEGORY_COLUMNS['customer_payments'])
+    logger.info(f"Processed {len(df_processed)} Customer Payments entries.")
     return df_processed
 
 def process_vendor_payments(df):
@@ -495,49 +1160,11 @@ def process_vendor_payments(df):
     Cleans and maps Zoho Vendor Payments to Tally Payment Vouchers.
     Similar logic to customer payments.
     """
-    print("\n--- Processing Vendor Payments ---")
+    logger.info("\n--- Processing Vendor Payments ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Date')
-    df_cleaned = format_date_column(df_cleaned, 'Bill Date')
-    df_cleaned = format_date_column(df_cleaned, 'Bill Payment Applied Date')
-
-    # Clean numeric columns
-    numeric_cols = [
-        'Amount', 'Unused Amount', 'TDSAmount', 'Exchange Rate', 'ReverseCharge Tax Percentage',
-        'ReverseCharge Tax Amount', 'TDS Percentage', 'Bill Amount', 'Withholding Tax Amount',
-        'Withholding Tax Amount (BCY)'
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Payment Number', 'Payment Number Prefix', 'Payment Number Suffix',
-        'Mode', 'Description', 'Reference Number', 'Currency Code', 'Branch ID',
-        'Payment Status', 'Payment Type', 'Location Name', 'Vendor Name',
-        'Debit A/c no', 'Vendor Bank Account Number', 'Vendor Bank Name',
-        'Vendor Bank Code', 'Source of Supply', 'Destination of Supply',
-        'GST Treatment', 'GST Identification Number (GSTIN)', 'EmailID',
-        'Description of Supply', 'Paid Through', 'Paid Through Account Code',
-        'Tax Account', 'ReverseCharge Tax Type', 'ReverseCharge Tax Name',
-        'TDS Name', 'TDS Section Code', 'TDS Section', 'TDS Account Name',
-        'Bank Reference Number', 'Bill Number'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Map Zoho's 'Paid Through' to actual Tally Bank/Cash Ledger Names
-    df_cleaned['Tally_Paid_Through_Ledger'] = df_cleaned['Paid Through'].apply(
-        lambda x: x if x else 'Cash-in-Hand'
-    )
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Vendor Payments entries.")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'vendor_payments'), CATEGORY_COLUMNS['vendor_payments'])
+    logger.info(f"Processed {len(df_processed)} Vendor Payments entries.")
     return df_processed
 
 def process_credit_notes(df):
@@ -545,68 +1172,11 @@ def process_credit_notes(df):
     Cleans and maps Zoho Credit Notes to Tally Credit Note Vouchers.
     Handles item-level details and linking to original invoices.
     """
-    print("\n--- Processing Credit Notes ---")
+    logger.info("\n--- Processing Credit Notes ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Credit Note Date')
-    df_cleaned = format_date_column(df_cleaned, 'Associated Invoice Date')
-
-    # Clean numeric columns
-    numeric_cols = [
-        'Exchange Rate', 'Total', 'Balance', 'Entity Discount Percent',
-        'Shipping Charge', 'Shipping Charge Tax Amount', 'Shipping Charge Tax %',
-        'Adjustment', 'TCS Amount', 'TDS Amount', 'TDS Percentage',
-        'Discount', 'Discount Amount', 'Quantity', 'Item Tax Amount', 'Item Total',
-        'CGST Rate %', 'SGST Rate %', 'IGST Rate %', 'CESS Rate %',
-        'CGST(FCY)', 'SGST(FCY)', 'IGST(FCY)', 'CESS(FCY)', 'CGST', 'SGST', 'IGST', 'CESS',
-        'Reverse Charge Tax Rate', 'Item Tax %', 'TCS Percentage', 'Round Off',
-        'Entity Discount Amount', 'Item Price'
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Product ID', 'Credit Note Number', 'Credit Note Status', 'Customer Name',
-        'Billing Attention', 'Billing Address', 'Billing Street 2', 'Billing City',
-        'Billing State', 'Billing Country', 'Billing Code', 'Billing Phone', 'Billing Fax',
-        'Shipping Attention', 'Shipping Address', 'Shipping Street 2', 'Shipping City',
-        'Shipping State', 'Shipping Country', 'Shipping Phone', 'Shipping Code', 'Shipping Fax',
-        'Currency Code', 'Notes', 'Terms & Conditions', 'Reference#', 'Shipping Charge Tax ID',
-        'Shipping Charge Tax Name', 'Shipping Charge Tax Type', 'Shipping Charge Tax Exemption Code',
-        'Shipping Charge SAC Code', 'Branch ID', 'Associated Invoice Number', 'TDS Name',
-        'TDS Section Code', 'TDS Section', 'E-WayBill Number', 'E-WayBill Status',
-        'Transporter Name', 'Transporter ID', 'Item Name', 'Item Desc', 'Usage unit',
-        'Location Name', 'Reason', 'Project ID', 'Project Name', 'Supplier Org Name',
-        'Supplier GST Registration Number', 'Supplier Street Address', 'Supplier City',
-        'Supplier State', 'Supplier Country', 'Supplier ZipCode', 'Supplier Phone',
-        'Supplier E-Mail', 'Supply Type', 'Tax1 ID', 'Item Tax Type', 'Reverse Charge Tax Name',
-        'Reverse Charge Tax Type', 'Place of Supply(With State Code)', 'GST Treatment',
-        'GST Identification Number (GSTIN)', 'TCS Tax Name', 'Nature Of Collection',
-        'Sales person', 'Discount Type', 'Place of Supply', 'Adjustment Description',
-        'Subject', 'Reference Invoice Type', 'Item Type', 'Template Name', 'HSN/SAC',
-        'Account', 'Account Code', 'SKU', 'Item Tax Exemption Reason', 'Line Item Location Name',
-        'Kit Combo Item Name'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Map Tally Ledger Names for sales returns/tax accounts
-    df_cleaned['Tally_Sales_Return_Ledger'] = df_cleaned['Account'].fillna('Sales Returns') # Default Sales Return Ledger
-    df_cleaned['Tally_Output_CGST_Ledger'] = 'Output CGST' # Customize to your Tally ledger names
-    df_cleaned['Tally_Output_SGST_Ledger'] = 'Output SGST'
-    df_cleaned['Tally_Output_IGST_Ledger'] = 'Output IGST'
-
-    # Ensure Customer ID is consistent
-    df_cleaned['Customer ID'] = df_cleaned['Customer ID'].fillna('').astype(str)
-
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Credit Notes entries.")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'credit_notes'), CATEGORY_COLUMNS['credit_notes'])
+    logger.info(f"Processed {len(df_processed)} Credit Notes entries.")
     return df_processed
 
 def process_journals(df):
@@ -616,38 +1186,13 @@ def process_journals(df):
     You might need to group them by 'Journal Number' to form a single Tally Journal Voucher.
     This function will primarily clean, and the grouping will be done in XML generation.
     """
-    print("\n--- Processing Journals ---")
+    logger.info("\n--- Processing Journals ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Journal Date')
-
-    # Clean numeric columns
-    numeric_cols = [
-        'Exchange Rate', 'Tax Percentage', 'Tax Amount', 'Debit', 'Credit', 'Total'
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Journal Number', 'Journal Number Prefix', 'Journal Number Suffix',
-        'Journal Created By', 'Journal Type', 'Status', 'Journal Entity Type',
-        'Reference Number', 'Notes', 'Location ID', 'Location Name', 'Item Order',
-        'Tax Name', 'Tax Type', 'Project Name', 'Account', 'Account Code',
-        'Contact Name', 'Currency', 'Description'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
     # The Zoho Journal CSV can sometimes list multiple debit/credit lines for one journal.
     # We'll rely on the 'Journal Number' to group them in the XML generation step.
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Journal entries.")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'journals'), CATEGORY_COLUMNS['journals'])
+    logger.info(f"Processed {len(df_processed)} Journal entries.")
     return df_processed
 
 def process_bills(df):
@@ -655,136 +1200,69 @@ def process_bills(df):
     Cleans and maps Zoho Bills to Tally Purchase Vouchers.
     Similar to invoices, prepares data for potential line item processing in XML generation.
     """
-    print("\n--- Processing Bills ---")
+    logger.info("\n--- Processing Bills ---")
     if df is None: return None
 
-    df_cleaned = df.copy()
-
-    # Format date columns
-    df_cleaned = format_date_column(df_cleaned, 'Bill Date')
-    df_cleaned = format_date_column(df_cleaned, 'Due Date')
-    df_cleaned = format_date_column(df_cleaned, 'Submitted Date')
-    df_cleaned = format_date_column(df_cleaned, 'Approved Date')
-
-    # Clean numeric columns
-    numeric_cols = [
-        'Entity Discount Percent', 'Exchange Rate', 'SubTotal', 'Total', 'Balance',
-        'TCS Amount', 'Adjustment', 'Quantity', 'Usage unit', 'Tax Amount',
-        'Item Total', 'TDS Percentage', 'TCS Percentage', 'Rate', 'Discount',
-        'Discount Amount', 'CGST Rate %', 'SGST Rate %', 'IGST Rate %', 'CESS Rate %',
-        'CGST(FCY)', 'SGST(FCY)', 'IGST(FCY)', 'CESS(FCY)', 'CGST', 'SGST', 'IGST', 'CESS'
-    ]
-    for col in numeric_cols:
-        if col in df_cleaned.columns:
-            df_cleaned = clean_numeric_column(df_cleaned, col)
-
-    # Fill NaN/None with empty strings for text fields
-    string_cols = [
-        'Vendor Name', 'Payment Terms', 'Payment Terms Label', 'Bill Number',
-        'PurchaseOrder', 'Currency Code', 'Vendor Notes', 'Terms & Conditions',
-        'Adjustment Description', 'Branch ID', 'Branch Name', 'Location Name',
-        'Submitted By', 'Approved By', 'Bill Status', 'Created By', 'Product ID',
-        'Item Name', 'Account', 'Account Code', 'Description', 'Reference Invoice Type',
-        'Source of Supply', 'Destination of Supply', 'GST Treatment',
-        'GST Identification Number (GSTIN)', 'TDS Calculation Type', 'TDS TaxID',
-        'TDS Name', 'TDS Section Code', 'TDS Section', 'TCS Tax Name',
-        'Nature Of Collection', 'SKU', 'Line Item Location Name', 'Discount Type',
-        'HSN/SAC', 'Purchase Order Number', 'Tax ID', 'Tax Name', 'Tax Type',
-        'Item TDS Name', 'Item TDS Section Code', 'Item TDS Section',
-        'Item Exemption Code', 'Item Type', 'Reverse Charge Tax Name',
-        'Reverse Charge Tax Rate', 'Reverse Charge Tax Type', 'Supply Type',
-        'ITC Eligibility', 'Discount Account', 'Discount Account Code',
-        'Customer Name', 'Project Name'
-    ]
-    for col in string_cols:
-        if col in df_cleaned.columns:
-            df_cleaned[col] = df_cleaned[col].fillna('').astype(str)
-
-    # Map Tally Ledger Names for purchase/tax accounts
-    df_cleaned['Tally_Purchase_Ledger_Name'] = df_cleaned['Account'].fillna('Purchase Account') # Default Purchase Ledger
-    df_cleaned['Tally_Input_CGST_Ledger'] = 'Input CGST' # Customize to your Tally ledger names
-    df_cleaned['Tally_Input_SGST_Ledger'] = 'Input SGST'
-    df_cleaned['Tally_Input_IGST_Ledger'] = 'Input IGST'
-    df_cleaned['Tally_Round_Off_Ledger'] = 'Round Off' # Create this if it doesn't exist
-
-    df_processed = df_cleaned.copy()
-    print(f"Processed {len(df_processed)} Bills entries.")
+    df_processed = categorize_columns(clean_dataset_columns(df, 'bills'), CATEGORY_COLUMNS['bills'])
+    logger.info(f"Processed {len(df_processed)} Bills entries.")
     return df_processed
 
 # --- Placeholder functions for modules not in initial financial focus ---
 def process_sales_orders(df):
-    print("\n--- Skipping Sales Orders processing for now (Financials priority) ---")
+    logger.info("\n--- Skipping Sales Orders processing for now (Financials priority) ---")
     return None
 
 def process_purchase_orders(df):
-    print("\n--- Skipping Purchase Orders processing for now (Financials priority) ---")
+    logger.info("\n--- Skipping Purchase Orders processing for now (Financials priority) ---")
     return None
 
 def process_items(df):
-    print("\n--- Skipping Items processing for now (Financials priority) ---")
+    logger.info("\n--- Skipping Items processing for now (Financials priority) ---")
     return None
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    print("--- Starting 02_clean_map.py: Data Cleaning and Mapping ---")
+    # All output goes through one logging handler on stdout
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    logger.info("--- Starting 02_clean_map.py: Data Cleaning and Mapping ---")
 
     # Ensure output directory exists
-    if not os.path.exists(PROCESSED_DATA_DIR):
-        os.makedirs(PROCESSED_DATA_DIR)
-
-    # --- Load and Process each file ---
-    # Chart of Accounts
-    coa_df = load_csv(ZOHO_FILES['chart_of_accounts'])
-    processed_coa_df = process_chart_of_accounts(coa_df)
-    save_processed_csv(processed_coa_df, 'cleaned_chart_of_accounts.csv')
-
-    # Contacts
-    contacts_df = load_csv(ZOHO_FILES['contacts'])
-    processed_contacts_df = process_contacts(contacts_df)
-    save_processed_csv(processed_contacts_df, 'cleaned_contacts.csv')
-
-    # Vendors
-    vendors_df = load_csv(ZOHO_FILES['vendors'])
-    processed_vendors_df = process_vendors(vendors_df)
-    save_processed_csv(processed_vendors_df, 'cleaned_vendors.csv')
-
-    # Invoices (complex - will likely need item-level processing in XML gen)
-    invoices_df = load_csv(ZOHO_FILES['invoices'])
-    processed_invoices_df = process_invoices(invoices_df)
-    save_processed_csv(processed_invoices_df, 'cleaned_invoices.csv')
-
-    # Customer Payments
-    customer_payments_df = load_csv(ZOHO_FILES['customer_payments'])
-    processed_customer_payments_df = process_customer_payments(customer_payments_df)
-    save_processed_csv(processed_customer_payments_df, 'cleaned_customer_payments.csv')
-
-    # Vendor Payments
-    vendor_payments_df = load_csv(ZOHO_FILES['vendor_payments'])
-    processed_vendor_payments_df = process_vendor_payments(vendor_payments_df)
-    save_processed_csv(processed_vendor_payments_df, 'cleaned_vendor_payments.csv')
-
-    # Credit Notes
-    credit_notes_df = load_csv(ZOHO_FILES['credit_notes'])
-    processed_credit_notes_df = process_credit_notes(credit_notes_df)
-    save_processed_csv(processed_credit_notes_df, 'cleaned_credit_notes.csv')
-
-    # Journals
-    journals_df = load_csv(ZOHO_FILES['journals'])
-    processed_journals_df = process_journals(journals_df)
-    save_processed_csv(processed_journals_df, 'cleaned_journals.csv')
-
-    # Bills
-    bills_df = load_csv(ZOHO_FILES['bills'])
-    processed_bills_df = process_bills(bills_df)
-    save_processed_csv(processed_bills_df, 'cleaned_bills.csv')
+    os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+
+    # Datasets to clean, in processing order: (ZOHO_FILES key, processor, output file)
+    pipeline = [
+        ('chart_of_accounts', process_chart_of_accounts, 'cleaned_chart_of_accounts.csv'),
+        ('contacts', process_contacts, 'cleaned_contacts.csv'),
+        ('vendors', process_vendors, 'cleaned_vendors.csv'),
+        # Invoices (complex - will likely need item-level processing in XML gen)
+        ('invoices', process_invoices, 'cleaned_invoices.csv'),
+        ('customer_payments', process_customer_payments, 'cleaned_customer_payments.csv'),
+        ('vendor_payments', process_vendor_payments, 'cleaned_vendor_payments.csv'),
+        ('credit_notes', process_credit_notes, 'cleaned_credit_notes.csv'),
+        ('journals', process_journals, 'cleaned_journals.csv'),
+        ('bills', process_bills, 'cleaned_bills.csv'),
+    ]
+
+    # --- Load, process and save each dataset in its own worker process ---
+    # The datasets share no state, so they run in parallel; each worker's buffered log is
+    # written here as one record, in pipeline order, so the output stays readable.
+    with ProcessPoolExecutor(max_workers=min(len(pipeline), os.cpu_count() or 1)) as executor:
+        failed = False
+        for log, succeeded in executor.map(run_dataset, *zip(*pipeline)):
+            logger.info(log.rstrip('\n'))
+            failed = failed or not succeeded
 
     # Placeholder calls for other modules (not generating processed CSVs for now)
     process_sales_orders(load_csv(ZOHO_FILES['sales_orders']))
     process_purchase_orders(load_csv(ZOHO_FILES['purchase_orders']))
     process_items(load_csv(ZOHO_FILES['items']))
 
+    if failed:
+        logger.error("\n--- 02_clean_map.py: Data cleaning failed for some datasets. See the errors above. ---")
+        exit(1)
 
-    print("\n--- 02_clean_map.py: Data cleaning and mapping complete. ---")
-    print(f"Check the '{PROCESSED_DATA_DIR}' directory for cleaned CSV files.")
-    print("Review these CSVs to ensure data accuracy and correct mappings.")
-    print("Next, proceed to generate Tally XML using '03_generate_tally_xml.py'.")
\ No newline at end of file
+    logger.info("\n--- 02_clean_map.py: Data cleaning and mapping complete. ---")
+    logger.info(f"Check the '{PROCESSED_DATA_DIR}' directory for cleaned CSV files.")
+    logger.info("Review these CSVs to ensure data accuracy and correct mappings.")
+    logger.info("Next, proceed to generate Tally XML using '03_generate_tally_xml.py'.")
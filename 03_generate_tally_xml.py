@@ -1,8 +1,22 @@
 import pandas as pd
-from lxml import etree
+import numpy as np
 import os
+import io
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
-import math # For math.isnan
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
+import math # For math.isfinite
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pac # Optional: multithreaded CSV reader
+    import pyarrow.parquet as pq # Optional: reads the Parquet copies written by 02_clean_map.py
+except ImportError:
+    pa = pac = pq = None
 
 # --- Configuration ---
 PROCESSED_DATA_DIR = "processed_data"
@@ -14,63 +28,226 @@ BASE_CURRENCY_SYMBOL = "₹"
 BASE_CURRENCY_NAME = "Rupees"
 DEFAULT_COUNTRY = "India" # Assuming default country for addresses
 
+# Tally's predefined groups; any other mapped parent group is created under Primary
+KNOWN_TALLY_PRIMARY_GROUPS = frozenset({
+    'Capital Account', 'Loans (Liability)', 'Fixed Assets', 'Investments',
+    'Current Assets', 'Current Liabilities', 'Suspense A/c',
+    'Sales Accounts', 'Purchase Accounts', 'Direct Incomes', 'Direct Expenses',
+    'Indirect Incomes', 'Indirect Expenses', 'Bank Accounts', 'Cash-in-Hand',
+    'Duties & Taxes', 'Stock-in-Hand', 'Branch / Divisions', 'Reserves & Surplus',
+    'Secured Loans', 'Unsecured Loans', 'Provisions', 'Loans & Advances (Asset)'
+})
+
+# Zoho GST treatments Tally accepts as a party's GST registration type; anything else is sent as 'Regular'
+TALLY_GST_REGISTRATION_TYPES = frozenset({'Regular', 'Consumer', 'Unregistered', 'Composition', 'SEZ'})
+
+# Tally amounts carry 2 decimal places
+TALLY_AMOUNT_QUANTUM = Decimal("0.01")
+
+# Party contact details written as-is when present: (Tally tag, processed column)
+PARTY_CONTACT_FIELDS = (('PHONENUMBER', 'Tally_Phone'), ('MOBILENUMBER', 'Tally_Mobile'), ('EMAIL', 'Tally_Email'))
+
+# Processed text columns, mostly ones the generators read. The CSV readers parse them as strings, as 02_clean_map.py does
+# with its STRING_COLUMNS, so numbers such as phones, bank accounts and PIN codes keep their exact text
+# (no '9800000001.0' or dropped leading zeros), as they do in the Parquet copies
+PROCESSED_STRING_COLUMNS = frozenset({
+    'Tally_Ledger_Name', 'Tally_Account_Code', 'Tally_Parent_Group', 'Tally_Description', 'Account', 'Account Type',
+    'Tally_Party_Name', 'Tally_Billing_Address_Line1', 'Tally_Billing_Address_Line2', 'Tally_Billing_State',
+    'Tally_Phone', 'Tally_Mobile', 'Tally_Email', 'Tally_GSTIN', 'Tally_Place_of_Supply_Code',
+    'Tally_Bank_Account_No', 'Tally_Bank_Name', 'Tally_IFSC_Code',
+    'Billing Address', 'Billing Street2', 'Billing Street 2', 'Billing City', 'Billing State',
+    'Billing Country', 'Billing Code', 'Shipping Address', 'Shipping Street2', 'Shipping Street 2',
+    'Shipping State', 'Shipping Country',
+    'Invoice Number', 'Credit Note Number', 'Associated Invoice Number', 'Bill Number', 'Payment Number',
+    'Journal Number', 'Customer Name', 'Vendor Name', 'GST Identification Number (GSTIN)', 'GST Treatment',
+    'Place of Supply(With State Code)', 'Item Name', 'Notes', 'Vendor Notes', 'Reason', 'Description',
+    'Tally_Deposit_Ledger', 'Tally_Paid_Through_Ledger', 'Tally_Round_Off_Ledger', 'Tally_Sales_Return_Ledger',
+    'Tally_Output_IGST_Ledger', 'Tally_Output_CGST_Ledger', 'Tally_Output_SGST_Ledger',
+    'Tally_Input_IGST_Ledger', 'Tally_Input_CGST_Ledger', 'Tally_Input_SGST_Ledger',
+})
+
+# Fixed XML the generators write around their records
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+ENVELOPE_TAIL = "</TALLYMESSAGE>\n</REQUESTDATA>\n</IMPORTDATA>\n</BODY>\n</ENVELOPE>\n"
+LANGUAGE_NAME_TEMPLATE = "<LANGUAGENAME.LIST><NAME.LIST><NAME>%s</NAME>\n</NAME.LIST>\n</LANGUAGENAME.LIST>\n"
+
 # --- Helper Functions ---
 
+def text_columns_to_objects(df):
+    """
+    Turns the text columns of a frame read through PyArrow back into plain objects with blanks as NaN,
+    as pd.read_csv gives them, so the generators below see the same values whichever reader was used.
+    """
+    text_cols = [col for col, dtype in df.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)]
+    if text_cols:
+        df[text_cols] = df[text_cols].astype(object).replace('', np.nan)
+    return df
+
+def load_processed_parquet(parquet_path):
+    """Loads the Parquet copy of a processed CSV."""
+    return text_columns_to_objects(pd.read_parquet(parquet_path, engine='pyarrow'))
+
+def read_processed_csv_with_pyarrow(file_path):
+    """
+    Parses a processed CSV with PyArrow's multithreaded reader.
+    PROCESSED_STRING_COLUMNS, and columns PyArrow would infer as dates or timestamps (from the first block's
+    schema), are read as strings, since the generators reformat the text 02_clean_map.py wrote; empty cells
+    become NaN, as with pd.read_csv.
+    """
+    read_options = pac.ReadOptions(use_threads=True, block_size=16 << 20, encoding='utf-8')
+    with pac.open_csv(file_path, read_options=read_options) as reader:
+        string_cols = [field.name for field in reader.schema
+                       if field.name in PROCESSED_STRING_COLUMNS or pa.types.is_temporal(field.type)]
+    with pa.memory_map(file_path, 'r') as source:
+        table = pac.read_csv(
+            source,
+            read_options=read_options,
+            convert_options=pac.ConvertOptions(strings_can_be_null=True,
+                                               column_types=dict.fromkeys(string_cols, pa.string())),
+        )
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type): # Dates that only appear after the first block
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+        elif pa.types.is_null(field.type): # All-empty columns are float NaN with pd.read_csv
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    return text_columns_to_objects(table.to_pandas(self_destruct=True))
+
 def load_processed_csv(file_name):
     """
     Loads a processed CSV file from the PROCESSED_DATA_DIR.
+    Its Parquet copy is read instead when pyarrow is installed and the copy is at least as new as the CSV.
     Returns None if the file is not found, with an informative message.
     """
     file_path = os.path.join(PROCESSED_DATA_DIR, file_name)
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if (pq is not None and os.path.exists(file_path) and os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= os.path.getmtime(file_path)):
+        try:
+            df = load_processed_parquet(parquet_path)
+            print(f"Loaded processed {file_name} with {len(df)} rows (from {os.path.basename(parquet_path)}).")
+            return df
+        except Exception as e:
+            print(f"⚠️ Could not read {parquet_path}, loading the CSV instead: {e}")
     if not os.path.exists(file_path):
         print(f"❌ Error: Processed file not found: {file_path}. Please ensure '02_clean_map.py' was run successfully.")
         return None
     try:
-        df = pd.read_csv(file_path, encoding='utf-8', low_memory=False)
+        if pac is not None:
+            df = read_processed_csv_with_pyarrow(file_path)
+        else:
+            df = pd.read_csv(file_path, encoding='utf-8', low_memory=False,
+                             dtype=dict.fromkeys(PROCESSED_STRING_COLUMNS, str))
         print(f"Loaded processed {file_name} with {len(df)} rows.")
         return df
     except Exception as e:
         print(f"❌ Error loading processed {file_name}: {e}")
         return None
 
-def create_tally_envelope(report_name="All Masters", request_xml_tags="ACCOUNTS"):
+def open_tag(out, name, **attrs):
+    """Writes an opening tag to out, with its attribute values escaped and quoted."""
+    out.write(f"<{name}{''.join(f' {key}={quoteattr(value)}' for key, value in attrs.items())}>")
+
+def close_tag(out, name):
+    """Writes a closing tag to out."""
+    out.write(f"</{name}>\n")
+
+def text_tag(out, name, text):
+    """Writes a complete element holding the escaped text to out."""
+    out.write(f"<{name}>{escape(text)}</{name}>\n")
+
+def escaped_tag(out, name, escaped_text):
+    """Writes a complete element holding text already escaped by escape_column to out."""
+    out.write(f"<{name}>{escaped_text}</{name}>\n")
+
+def add_language_name(out, name):
+    """Writes the LANGUAGENAME.LIST Tally needs on every master to display its name."""
+    out.write(LANGUAGE_NAME_TEMPLATE % escape(name))
+
+def create_tally_envelope(out, report_name="All Masters", request_xml_tags="ACCOUNTS"):
     """
-    Creates the basic Tally XML envelope structure.
+    Writes the basic Tally XML envelope structure to out, up to the opening TALLYMESSAGE tag.
     report_name: "All Masters" for ledgers/groups, "Vouchers" for transactions.
     request_xml_tags: "ACCOUNTS" for masters, "VOUCHERS" for transactions.
     """
-    envelope = etree.Element("ENVELOPE")
-    header = etree.SubElement(envelope, "HEADER")
-    etree.SubElement(header, "TALLYREQUEST").text = "Import"
-    etree.SubElement(header, "VERSION").text = "1" # Or higher based on Tally version
-    body = etree.SubElement(envelope, "BODY")
-    import_data = etree.SubElement(body, "IMPORTDATA")
-    request_desc = etree.SubElement(import_data, "REQUESTDESC")
-    etree.SubElement(request_desc, "REPORTNAME").text = report_name
-    etree.SubElement(request_desc, "STATICVARIABLES")
-    etree.SubElement(etree.SubElement(request_desc.find('STATICVARIABLES'), "SVEXPORTFORMAT"), "IMPORTDATA.ENDFORMTYPE").text = "XML Software"
-    etree.SubElement(etree.SubElement(request_desc.find('STATICVARIABLES'), "SVEXPORTFORMAT"), "IMPORTDATA.REQUEST.XMLTAGS").text = request_xml_tags
-
-    request_data = etree.SubElement(import_data, "REQUESTDATA")
-    tally_message = etree.SubElement(request_data, "TALLYMESSAGE")
-    return envelope, tally_message
-
-def append_to_tally_message(tally_message, element):
-    """Appends an element to the TallyMessage."""
-    tally_message.append(element)
-
-def write_xml_to_file(envelope, file_name):
-    """Writes the generated XML to a file."""
-    if not os.path.exists(OUTPUT_XML_DIR):
-        os.makedirs(OUTPUT_XML_DIR)
+    out.write(XML_DECLARATION)
+    open_tag(out, "ENVELOPE")
+    open_tag(out, "HEADER")
+    text_tag(out, "TALLYREQUEST", "Import")
+    text_tag(out, "VERSION", "1") # Or higher based on Tally version
+    close_tag(out, "HEADER")
+    open_tag(out, "BODY")
+    open_tag(out, "IMPORTDATA")
+    open_tag(out, "REQUESTDESC")
+    text_tag(out, "REPORTNAME", report_name)
+    open_tag(out, "STATICVARIABLES")
+    open_tag(out, "SVEXPORTFORMAT")
+    text_tag(out, "IMPORTDATA.ENDFORMTYPE", "XML Software")
+    close_tag(out, "SVEXPORTFORMAT")
+    open_tag(out, "SVEXPORTFORMAT")
+    text_tag(out, "IMPORTDATA.REQUEST.XMLTAGS", request_xml_tags)
+    close_tag(out, "SVEXPORTFORMAT")
+    close_tag(out, "STATICVARIABLES")
+    close_tag(out, "REQUESTDESC")
+    open_tag(out, "REQUESTDATA")
+    open_tag(out, "TALLYMESSAGE")
+
+@contextmanager
+def tally_xml_file(file_name, report_name="All Masters", request_xml_tags="ACCOUNTS"):
+    """
+    Opens an XML file in OUTPUT_XML_DIR for a generator to write its records into, inside the Tally envelope.
+    Records go to disk as they are written, so memory stays flat however many vouchers there are.
+    The file is written under a .tmp name and only replaces the previous one once the generator finishes,
+    so a run that stops part-way never leaves a truncated XML behind.
+    """
     file_path = os.path.join(OUTPUT_XML_DIR, file_name)
-    tree = etree.ElementTree(envelope)
+    tmp_path = file_path + '.tmp'
+    try:
+        os.makedirs(OUTPUT_XML_DIR, exist_ok=True)
+        out = open(tmp_path, 'w', encoding='utf-8', newline='\n')
+    except OSError as e:
+        print(f"❌ Error writing XML to {file_path}: {e}")
+        with open(os.devnull, 'w', encoding='utf-8') as out: # The generator still runs; its records are discarded
+            yield out
+        return
     try:
-        # Use a more Tally-friendly XML declaration and pretty_print for readability
-        tree.write(file_path, pretty_print=True, encoding='utf-8', xml_declaration=True, standalone=True)
+        with out:
+            create_tally_envelope(out, report_name, request_xml_tags)
+            yield out
+            out.write(ENVELOPE_TAIL)
+        os.replace(tmp_path, file_path)
         print(f"✅ Generated Tally XML: {file_path}")
-    except Exception as e:
+    except OSError as e:
         print(f"❌ Error writing XML to {file_path}: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def iter_row_dicts(df):
+    """
+    Yields (index, row) pairs like DataFrame.iterrows(), but each row is a plain dict of column -> value.
+    Rows are read from itertuples() instead of being built into a Series each, which is much cheaper,
+    and the dict still supports row['Column'] as the generators use it.
+    """
+    columns = df.columns.tolist()
+    for index, values in zip(df.index, df.itertuples(index=False, name=None)):
+        yield index, dict(zip(columns, values))
+
+def iter_groups(df, key):
+    """
+    Yields (key value, rows) for each group of rows sharing `key`, in sorted key order with blank keys
+    dropped, like iterating df.groupby(key); rows is a list of row dicts as iter_row_dicts gives them.
+    The frame is stable-sorted once and cut at the boundaries where the key changes, instead of
+    building a sub-DataFrame for every group. Row dicts are only built for the group being yielded.
+    """
+    df = df[df[key].notna()].sort_values(key, kind='stable')
+    if df.empty:
+        return
+    codes = pd.factorize(df[key])[0]
+    offsets = np.r_[0, np.flatnonzero(np.diff(codes)) + 1, len(codes)]
+    keys = df[key].to_numpy()
+    row_dicts = iter_row_dicts(df)
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        yield keys[start], [row for _, row in islice(row_dicts, end - start)]
 
 def safe_str(value):
     """Converts a value to string, handling NaN/None gracefully."""
@@ -91,10 +268,147 @@ def format_tally_date(date_str):
         return ""
 
 def format_tally_amount(amount):
-    """Formats a numeric amount for Tally, handling NaN."""
+    """
+    Formats a numeric amount for Tally to 2 decimal places, handling NaN.
+    The amount is rounded half up as a decimal, from the shortest text that gives back the float
+    (the value as written in Zoho), so 2.675 becomes 2.68 rather than the binary float's 2.67.
+    """
     if pd.isna(amount):
         return "0.00"
-    return f"{amount:.2f}" # Format to 2 decimal places
+    amount = float(amount)
+    if not math.isfinite(amount):
+        return f"{amount:.2f}"
+    return str(Decimal(repr(amount)).quantize(TALLY_AMOUNT_QUANTUM, rounding=ROUND_HALF_UP))
+
+def safe_str_column(series):
+    """Vectorized safe_str: the whole column as stripped strings, with NaN/None as blanks."""
+    return series.astype(object).where(series.notna(), '').astype(str).str.strip()
+
+def escape_column(series):
+    """XML-escapes a column of strings, escaping each distinct value once and mapping the rows to the results."""
+    return series.map({value: escape(value) for value in series.unique().tolist()})
+
+def format_tally_amounts(amounts):
+    """
+    format_tally_amount over a float array at once, in integer cents: the amounts are scaled by 100 and rounded
+    half up by NumPy, and the cents written out as text. Only amounts within float error of a half cent, too
+    large for exact cents, or not finite go through format_tally_amount itself. Returns an object array of str.
+    """
+    with np.errstate(invalid='ignore'):
+        scaled = np.abs(amounts) * 100
+        exact = (np.abs(scaled - np.floor(scaled) - 0.5) > scaled * 1e-12 + 1e-9) & (scaled < 1e15)
+    whole, frac = np.divmod(np.floor(np.where(exact, scaled, 0) + 0.5).astype(np.int64), 100)
+    text = np.char.add(np.char.add(np.where(np.signbit(amounts), '-', ''), whole.astype(str)),
+                       np.char.add(np.where(frac < 10, '.0', '.'), frac.astype(str))).astype(object)
+    text[~exact] = [format_tally_amount(amount) for amount in amounts[~exact]]
+    return text
+
+def format_tally_amount_column(series):
+    """
+    Vectorized format_tally_amount: the distinct amounts are formatted together and mapped back over the column,
+    as amounts repeat heavily across rows. Zeros are set by sign afterwards, since 0.0 and -0.0 share a lookup key.
+    """
+    amounts = series.astype(float)
+    distinct = amounts.dropna().unique()
+    formatted = amounts.map(dict(zip(distinct, format_tally_amounts(distinct))))
+    formatted = formatted.mask(amounts == 0, np.where(np.signbit(amounts), "-0.00", "0.00"))
+    return formatted.fillna("0.00")
+
+def format_tally_date_column(series):
+    """
+    Vectorized format_tally_date: each distinct date is converted once and mapped back over the column,
+    as a few hundred dates cover thousands of rows. Blank dates give blanks.
+    """
+    return series.map({date_str: format_tally_date(date_str) for date_str in series.dropna().unique()}).fillna("")
+
+def prepare_rows(df, text_columns=(), amount_columns=(), credit_columns=(), date_columns=(),
+                 state_code_columns=(), ledger_columns=(), defaults=None):
+    """
+    Returns a copy of df with the per-row string work done a whole column at a time, before the row loop.
+    Columns named in `defaults` that df lacks are first added holding their default value, so the loop can
+    index every column it reads directly.
+    Text columns are replaced by their safe_str values; each amount column gains its format_tally_amount text
+    as '<column> (Tally)', each credit column its negated text as '<column> (Tally Credit)', each date
+    column its format_tally_date text as '<column> (Tally)', and each state code column the code before
+    the '-' of its text (e.g. '27' from '27-Maharashtra') as '<column> (Tally)'. Each ledger column gains its
+    safe_str text XML-escaped by escape_column as '<column> (XML)', for escaped_tag, since the same few
+    ledger names repeat on every line item.
+    Other columns missing from df are skipped.
+    """
+    if defaults:
+        df = df.assign(**{col: value for col, value in defaults.items() if col not in df.columns})
+    present = frozenset(df.columns)
+    prepared = {col: safe_str_column(df[col]) for col in text_columns if col in present}
+    prepared.update({f"{col} (XML)": escape_column(prepared[col] if col in prepared else safe_str_column(df[col]))
+                     for col in ledger_columns if col in present})
+    prepared.update({f"{col} (Tally)": format_tally_date_column(df[col])
+                     for col in date_columns if col in present})
+    prepared.update({f"{col} (Tally)": safe_str_column(df[col]).str.split('-', n=1).str[0].str.strip()
+                     for col in state_code_columns if col in present})
+    prepared.update({f"{col} (Tally)": format_tally_amount_column(df[col])
+                     for col in amount_columns if col in present})
+    prepared.update({f"{col} (Tally Credit)": format_tally_amount_column(-df[col].astype(float))
+                     for col in credit_columns if col in present})
+    return df.assign(**prepared)
+
+def add_gst_entry_flags(df):
+    """
+    Returns a copy of df with the GST ledger entries each line item posts, decided for all rows at once.
+    'IGST (Post)' is set when the IGST rate is positive and an IGST amount is given; otherwise
+    'CGST (Post)'/'SGST (Post)' are set when a CGST or SGST rate is positive, a CGST or SGST amount
+    is given, and that tax's own amount is positive. Missing columns count as zero rates and no amounts.
+    """
+    no_rows = pd.Series(False, index=df.index)
+    def rate_positive(col):
+        return df[col] > 0 if col in df.columns else no_rows
+    def amount_given(col):
+        return safe_str_column(df[col]) != '' if col in df.columns else no_rows
+    posts_igst = rate_positive('IGST Rate %') & amount_given('IGST')
+    posts_split = (~posts_igst & (rate_positive('CGST Rate %') | rate_positive('SGST Rate %'))
+                   & (amount_given('CGST') | amount_given('SGST')))
+    return df.assign(**{'IGST (Post)': posts_igst,
+                        'CGST (Post)': posts_split & rate_positive('CGST'),
+                        'SGST (Post)': posts_split & rate_positive('SGST')})
+
+def add_round_off_flags(df, column):
+    """
+    Returns a copy of df with its round-off entry decided for all rows at once: '<column> (Post)' is set
+    when the amount is neither zero nor NaN, and '<column> (Deemed Positive)' holds the ISDEEMEDPOSITIVE
+    text for it, 'Yes' for a positive amount and 'No' otherwise.
+    """
+    amounts = df[column]
+    return df.assign(**{f"{column} (Post)": amounts.ne(0) & amounts.notna(),
+                        f"{column} (Deemed Positive)": np.where(amounts > 0, 'Yes', 'No')})
+
+def first_non_blank(df, columns, default=''):
+    """
+    Vectorized `a or b or default` over the safe_str values of `columns`: for each row, the first value that
+    is not blank, or `default` when all of them are. Columns missing from df count as blank.
+    """
+    result = pd.Series(default, index=df.index, dtype=object)
+    for col in reversed(columns):
+        if col in df.columns:
+            values = safe_str_column(df[col])
+            result = values.where(values != '', result)
+    return result
+
+def add_buyer_address(df, shipping_street2, billing_street2):
+    """
+    Returns a copy of df with the buyer address each voucher shows, resolved for all rows at once.
+    'Address (Tally)' and 'Street2 (Tally)' hold the shipping address lines when a shipping address is given,
+    else the billing ones; 'State (Tally)' and 'Country (Tally)' hold the shipping state and country, or the
+    billing ones when blank, with the country falling back to DEFAULT_COUNTRY.
+    """
+    has_shipping = first_non_blank(df, ['Shipping Address']) != ''
+    has_billing = first_non_blank(df, ['Billing Address']) != ''
+    street2 = first_non_blank(df, [billing_street2]).where(has_billing, '')
+    street2 = first_non_blank(df, [shipping_street2]).where(has_shipping, street2)
+    return df.assign(**{
+        'Address (Tally)': first_non_blank(df, ['Shipping Address', 'Billing Address']),
+        'Street2 (Tally)': street2,
+        'State (Tally)': first_non_blank(df, ['Shipping State', 'Billing State']),
+        'Country (Tally)': first_non_blank(df, ['Shipping Country', 'Billing Country'], DEFAULT_COUNTRY),
+    })
 
 # --- XML Generation Functions ---
 
@@ -103,80 +417,69 @@ def generate_ledgers_xml(df_coa):
     print("\n--- Generating Ledgers XML ---")
     if df_coa is None: return
 
-    envelope, tally_message = create_tally_envelope("All Masters", "ACCOUNTS")
-
-    # First, create/alter Tally Groups based on the mapped parent groups
-    # This ensures parent groups exist before ledgers are created under them
-    tally_groups_to_create = df_coa['Tally_Parent_Group'].unique().tolist()
-    for group_name in sorted(tally_groups_to_create): # Sort for consistent XML output
-        if not group_name or group_name == 'Suspense A/c': # Avoid creating blank or default Tally groups if not needed
-            continue
-
-        # Check if it's a known top-level Tally group; if not, set its parent to Primary
-        # This is a simplification; you might need a more complex hierarchy.
-        known_tally_primary_groups = [
-            'Capital Account', 'Loans (Liability)', 'Fixed Assets', 'Investments',
-            'Current Assets', 'Current Liabilities', 'Suspense A/c',
-            'Sales Accounts', 'Purchase Accounts', 'Direct Incomes', 'Direct Expenses',
-            'Indirect Incomes', 'Indirect Expenses', 'Bank Accounts', 'Cash-in-Hand',
-            'Duties & Taxes', 'Stock-in-Hand', 'Branch / Divisions', 'Reserves & Surplus',
-            'Secured Loans', 'Unsecured Loans', 'Provisions', 'Loans & Advances (Asset)'
-        ]
-        parent_group_for_new_group = "Primary" if group_name not in known_tally_primary_groups else "" # Blank parent for top-level
-
-        group_xml = etree.SubElement(tally_message, "GROUP", NAME=group_name, ACTION="CREATE")
-        etree.SubElement(group_xml, "NAME").text = group_name
-        if parent_group_for_new_group:
-            etree.SubElement(group_xml, "PARENT").text = parent_group_for_new_group
-        etree.SubElement(group_xml, "ISADDABLE").text = "Yes" # Allow adding ledgers
-        # Add a placeholder for Language name, required by Tally
-        etree.SubElement(group_xml, "LANGUAGENAME.LIST").append(
-            etree.fromstring(f"<NAME.LIST><NAME>{group_name}</NAME></NAME.LIST>")
-        )
-
-    # Now, add Ledgers
-    for index, row in df_coa.iterrows():
-        ledger_name = safe_str(row['Tally_Ledger_Name'])
-        if not ledger_name:
-            print(f"⚠️ Skipping ledger due to empty name: Row {index+2}") # +2 for header and 0-index
-            continue
-
-        parent_group = safe_str(row['Tally_Parent_Group'])
-        # Fallback to a default if mapped parent group is empty or invalid
-        if not parent_group:
-            print(f"⚠️ Ledger '{ledger_name}' has no mapped parent group. Assigning to 'Suspense A/c'.")
-            parent_group = 'Suspense A/c'
-
-        ledger_xml = etree.SubElement(tally_message, "LEDGER", NAME=ledger_name, ACTION="CREATE")
-        etree.SubElement(ledger_xml, "NAME").text = ledger_name
-        etree.SubElement(ledger_xml, "PARENT").text = parent_group
-        etree.SubElement(ledger_xml, "OPENINGBALANCE").text = format_tally_amount(row.get('Opening Balance', 0.0)) # Use Zoho's opening balance if available in COA CSV
-        etree.SubElement(ledger_xml, "CURRENCYID").text = BASE_CURRENCY_NAME # Default to base currency
-
-        # Basic properties based on Account Type from Zoho
-        if row['Account Type'] == 'Bank':
-            etree.SubElement(ledger_xml, "ISBILLWISEON").text = "No" # Banks usually not bill-wise
-            etree.SubElement(ledger_xml, "ISCASHLEDGER").text = "No"
-            etree.SubElement(ledger_xml, "ISBANKLEDGER").text = "Yes"
-        elif row['Account Type'] == 'Cash':
-            etree.SubElement(ledger_xml, "ISBILLWISEON").text = "No"
-            etree.SubElement(ledger_xml, "ISCASHLEDGER").text = "Yes"
-            etree.SubElement(ledger_xml, "ISBANKLEDGER").text = "No"
-        elif row['Tally_Parent_Group'] in ['Sundry Debtors', 'Sundry Creditors']:
-            etree.SubElement(ledger_xml, "ISBILLWISEON").text = "Yes" # Crucial for bill-wise accounting
-            etree.SubElement(ledger_xml, "ISCOSTCENTRESON").text = "No"
-
-        # Description
-        description = safe_str(row.get('Tally_Description'))
-        if description:
-            etree.SubElement(ledger_xml, "DESCRIPTION").text = description
-
-        # Required for Tally for display
-        etree.SubElement(ledger_xml, "LANGUAGENAME.LIST").append(
-            etree.fromstring(f"<NAME.LIST><NAME>{ledger_name}</NAME></NAME.LIST>")
-        )
+    with tally_xml_file("tally_ledgers.xml", "All Masters", "ACCOUNTS") as out:
+
+        # First, create/alter Tally Groups based on the mapped parent groups
+        # This ensures parent groups exist before ledgers are created under them
+        # Blank parents (whose ledgers go to 'Suspense A/c') and the default group itself are left out
+        tally_groups_to_create = set(df_coa['Tally_Parent_Group'].dropna().unique().tolist()) - {'', 'Suspense A/c'}
+        for group_name in sorted(tally_groups_to_create): # Sort for consistent XML output
+            # Check if it's a known top-level Tally group; if not, set its parent to Primary
+            # This is a simplification; you might need a more complex hierarchy.
+            parent_group_for_new_group = "Primary" if group_name not in KNOWN_TALLY_PRIMARY_GROUPS else "" # Blank parent for top-level
+
+            open_tag(out, "GROUP", NAME=group_name, ACTION="CREATE")
+            text_tag(out, "NAME", group_name)
+            if parent_group_for_new_group:
+                text_tag(out, "PARENT", parent_group_for_new_group)
+            text_tag(out, "ISADDABLE", "Yes") # Allow adding ledgers
+            # Add a placeholder for Language name, required by Tally
+            add_language_name(out, group_name)
+            close_tag(out, "GROUP")
+
+        # Now, add Ledgers
+        df_coa = prepare_rows(df_coa, text_columns=['Tally_Ledger_Name', 'Tally_Description'],
+                              amount_columns=['Opening Balance'],
+                              defaults={'Opening Balance': 0.0, 'Tally_Description': ''})
+        for index, row in iter_row_dicts(df_coa):
+            ledger_name = row['Tally_Ledger_Name']
+            if not ledger_name:
+                print(f"⚠️ Skipping ledger due to empty name: Row {index+2}") # +2 for header and 0-index
+                continue
 
-    write_xml_to_file(envelope, "tally_ledgers.xml")
+            parent_group = safe_str(row['Tally_Parent_Group'])
+            # Fallback to a default if mapped parent group is empty or invalid
+            if not parent_group:
+                print(f"⚠️ Ledger '{ledger_name}' has no mapped parent group. Assigning to 'Suspense A/c'.")
+                parent_group = 'Suspense A/c'
+
+            open_tag(out, "LEDGER", NAME=ledger_name, ACTION="CREATE")
+            text_tag(out, "NAME", ledger_name)
+            text_tag(out, "PARENT", parent_group)
+            text_tag(out, "OPENINGBALANCE", row['Opening Balance (Tally)']) # Use Zoho's opening balance if available in COA CSV
+            text_tag(out, "CURRENCYID", BASE_CURRENCY_NAME) # Default to base currency
+
+            # Basic properties based on Account Type from Zoho
+            if row['Account Type'] == 'Bank':
+                text_tag(out, "ISBILLWISEON", "No") # Banks usually not bill-wise
+                text_tag(out, "ISCASHLEDGER", "No")
+                text_tag(out, "ISBANKLEDGER", "Yes")
+            elif row['Account Type'] == 'Cash':
+                text_tag(out, "ISBILLWISEON", "No")
+                text_tag(out, "ISCASHLEDGER", "Yes")
+                text_tag(out, "ISBANKLEDGER", "No")
+            elif row['Tally_Parent_Group'] in ['Sundry Debtors', 'Sundry Creditors']:
+                text_tag(out, "ISBILLWISEON", "Yes") # Crucial for bill-wise accounting
+                text_tag(out, "ISCOSTCENTRESON", "No")
+
+            # Description
+            description = row['Tally_Description']
+            if description:
+                text_tag(out, "DESCRIPTION", description)
+
+            # Required for Tally for display
+            add_language_name(out, ledger_name)
+            close_tag(out, "LEDGER")
 
 
 def generate_contacts_vendors_xml(df_contacts, df_vendors):
@@ -184,122 +487,124 @@ def generate_contacts_vendors_xml(df_contacts, df_vendors):
     print("\n--- Generating Contacts and Vendors XML ---")
 
     # Both contacts and vendors are ledgers in Tally, so we use the same envelope
-    envelope, tally_message = create_tally_envelope("All Masters", "ACCOUNTS")
-
-    # Helper for adding address details
-    def add_address_details(parent_element, row, is_shipping=False):
-        prefix = "Shipping" if is_shipping else "Billing"
-        address1 = safe_str(row.get(f'Tally_{prefix}_Address_Line1'))
-        address2 = safe_str(row.get(f'Tally_{prefix}_Address_Line2'))
-        city = safe_str(row.get(f'{prefix} City'))
-        state = safe_str(row.get(f'Tally_{prefix}_State'))
-        country = safe_str(row.get(f'{prefix} Country')) or DEFAULT_COUNTRY
-        pincode = safe_str(row.get(f'{prefix} Code'))
-
-        if address1 or address2 or city or state or country or pincode:
-            address_list = etree.SubElement(parent_element, "ADDRESS.LIST")
-            if address1:
-                etree.SubElement(address_list, "ADDRESS").text = address1
-            if address2:
-                etree.SubElement(address_list, "ADDRESS").text = address2
-            if city:
-                etree.SubElement(parent_element, "CITY").text = city
-            if state:
-                etree.SubElement(parent_element, "STATENAME").text = state
-            if country:
-                etree.SubElement(parent_element, "COUNTRYNAME").text = country
-            if pincode:
-                etree.SubElement(parent_element, "PINCODE").text = pincode
-
-    # Process Contacts (Sundry Debtors)
-    if df_contacts is not None:
-        for index, row in df_contacts.iterrows():
-            party_name = safe_str(row['Tally_Party_Name'])
-            if not party_name:
-                print(f"⚠️ Skipping contact due to empty name: Row {index+2}")
-                continue
-
-            ledger_xml = etree.SubElement(tally_message, "LEDGER", NAME=party_name, ACTION="CREATE")
-            etree.SubElement(ledger_xml, "NAME").text = party_name
-            etree.SubElement(ledger_xml, "PARENT").text = "Sundry Debtors" # Fixed parent group for customers
-            etree.SubElement(ledger_xml, "ISBILLWISEON").text = "Yes" # Crucial for bill-wise accounting
-            etree.SubElement(ledger_xml, "OPENINGBALANCE").text = format_tally_amount(row.get('Opening Balance', 0.0))
-
-            add_address_details(ledger_xml, row, is_shipping=False) # Billing address for ledger
-            # Shipping address can be added via secondary address field if Tally supports or in voucher level.
-            # For simplicity, main ledger address uses billing.
-
-            phone = safe_str(row.get('Tally_Phone'))
-            mobile = safe_str(row.get('Tally_Mobile'))
-            email = safe_str(row.get('Tally_Email'))
-
-            if phone: etree.SubElement(ledger_xml, "PHONENUMBER").text = phone
-            if mobile: etree.SubElement(ledger_xml, "MOBILENUMBER").text = mobile
-            if email: etree.SubElement(ledger_xml, "EMAIL").text = email
-
-            gstin = safe_str(row.get('Tally_GSTIN'))
-            gst_treatment = safe_str(row.get('GST Treatment')) # e.g., 'Regular', 'Consumer', 'Unregistered'
-            place_of_supply_code = safe_str(row.get('Tally_Place_of_Supply_Code'))
-
-            if gstin:
-                etree.SubElement(ledger_xml, "HASGSTIN").text = "Yes"
-                etree.SubElement(ledger_xml, "GSTREGISTRATIONTYPE").text = gst_treatment if gst_treatment in ['Regular', 'Consumer', 'Unregistered', 'Composition', 'SEZ'] else "Regular"
-                etree.SubElement(ledger_xml, "GSTIN").text = gstin
-                if place_of_supply_code:
-                    etree.SubElement(ledger_xml, "PLACEOFSUPPLY").text = place_of_supply_code.split('-')[0].strip() # Assuming format '07-Maharashtra'
-
-            etree.SubElement(ledger_xml, "LANGUAGENAME.LIST").append(
-                etree.fromstring(f"<NAME.LIST><NAME>{party_name}</NAME></NAME.LIST>")
-            )
-
-    # Process Vendors (Sundry Creditors)
-    if df_vendors is not None:
-        for index, row in df_vendors.iterrows():
-            party_name = safe_str(row['Tally_Party_Name'])
-            if not party_name:
-                print(f"⚠️ Skipping vendor due to empty name: Row {index+2}")
-                continue
-
-            ledger_xml = etree.SubElement(tally_message, "LEDGER", NAME=party_name, ACTION="CREATE")
-            etree.SubElement(ledger_xml, "NAME").text = party_name
-            etree.SubElement(ledger_xml, "PARENT").text = "Sundry Creditors" # Fixed parent group for vendors
-            etree.SubElement(ledger_xml, "ISBILLWISEON").text = "Yes"
-            etree.SubElement(ledger_xml, "OPENINGBALANCE").text = format_tally_amount(row.get('Opening Balance', 0.0))
-
-            add_address_details(ledger_xml, row, is_shipping=False)
-
-            phone = safe_str(row.get('Tally_Phone'))
-            mobile = safe_str(row.get('Tally_Mobile'))
-            email = safe_str(row.get('Tally_Email'))
-
-            if phone: etree.SubElement(ledger_xml, "PHONENUMBER").text = phone
-            if mobile: etree.SubElement(ledger_xml, "MOBILENUMBER").text = mobile
-            if email: etree.SubElement(ledger_xml, "EMAIL").text = email
-
-            gstin = safe_str(row.get('Tally_GSTIN'))
-            gst_treatment = safe_str(row.get('GST Treatment'))
-
-            if gstin:
-                etree.SubElement(ledger_xml, "HASGSTIN").text = "Yes"
-                etree.SubElement(ledger_xml, "GSTREGISTRATIONTYPE").text = gst_treatment if gst_treatment in ['Regular', 'Consumer', 'Unregistered', 'Composition', 'SEZ'] else "Regular"
-                etree.SubElement(ledger_xml, "GSTIN").text = gstin
-
-            # Bank details for vendors (optional, but good to include if available)
-            bank_acc_no = safe_str(row.get('Tally_Bank_Account_No'))
-            bank_name = safe_str(row.get('Tally_Bank_Name'))
-            ifsc_code = safe_str(row.get('Tally_IFSC_Code'))
-            if bank_acc_no and bank_name:
-                bank_details = etree.SubElement(ledger_xml, "BANKDETAILS.LIST")
-                etree.SubElement(bank_details, "BANKACCOUNTNO").text = bank_acc_no
-                etree.SubElement(bank_details, "BANKNAME").text = bank_name
-                if ifsc_code:
-                    etree.SubElement(bank_details, "IFSCCODE").text = ifsc_code
-
-            etree.SubElement(ledger_xml, "LANGUAGENAME.LIST").append(
-                etree.fromstring(f"<NAME.LIST><NAME>{party_name}</NAME></NAME.LIST>")
-            )
-
-    write_xml_to_file(envelope, "tally_contacts_vendors.xml")
+    with tally_xml_file("tally_contacts_vendors.xml", "All Masters", "ACCOUNTS") as out:
+
+        # Helper for adding address details
+        def add_address_details(out, row, is_shipping=False):
+            prefix = "Shipping" if is_shipping else "Billing"
+            address1 = row[f'Tally_{prefix}_Address_Line1']
+            address2 = row[f'Tally_{prefix}_Address_Line2']
+            city = row[f'{prefix} City']
+            state = row[f'Tally_{prefix}_State']
+            country = row[f'{prefix} Country'] or DEFAULT_COUNTRY
+            pincode = row[f'{prefix} Code']
+
+            if address1 or address2 or city or state or country or pincode:
+                open_tag(out, "ADDRESS.LIST")
+                if address1:
+                    text_tag(out, "ADDRESS", address1)
+                if address2:
+                    text_tag(out, "ADDRESS", address2)
+                close_tag(out, "ADDRESS.LIST")
+                if city:
+                    text_tag(out, "CITY", city)
+                if state:
+                    text_tag(out, "STATENAME", state)
+                if country:
+                    text_tag(out, "COUNTRYNAME", country)
+                if pincode:
+                    text_tag(out, "PINCODE", pincode)
+
+        # Columns read through safe_str in the loops below, converted up front
+        party_text_columns = [
+            'Tally_Party_Name', 'Tally_Billing_Address_Line1', 'Tally_Billing_Address_Line2', 'Billing City',
+            'Tally_Billing_State', 'Billing Country', 'Billing Code', 'Tally_Phone', 'Tally_Mobile', 'Tally_Email',
+            'Tally_GSTIN', 'GST Treatment', 'Tally_Place_of_Supply_Code',
+            'Tally_Bank_Account_No', 'Tally_Bank_Name', 'Tally_IFSC_Code'
+        ]
+        # Optional party columns are blank when the CSV lacks them
+        party_defaults = {'Opening Balance': 0.0, **dict.fromkeys(party_text_columns[1:], '')}
+
+        # Process Contacts (Sundry Debtors)
+        if df_contacts is not None:
+            df_contacts = prepare_rows(df_contacts, text_columns=party_text_columns, amount_columns=['Opening Balance'],
+                                       state_code_columns=['Tally_Place_of_Supply_Code'], defaults=party_defaults)
+            for index, row in iter_row_dicts(df_contacts):
+                party_name = row['Tally_Party_Name']
+                if not party_name:
+                    print(f"⚠️ Skipping contact due to empty name: Row {index+2}")
+                    continue
+
+                open_tag(out, "LEDGER", NAME=party_name, ACTION="CREATE")
+                text_tag(out, "NAME", party_name)
+                text_tag(out, "PARENT", "Sundry Debtors") # Fixed parent group for customers
+                text_tag(out, "ISBILLWISEON", "Yes") # Crucial for bill-wise accounting
+                text_tag(out, "OPENINGBALANCE", row['Opening Balance (Tally)'])
+
+                add_address_details(out, row, is_shipping=False) # Billing address for ledger
+                # Shipping address can be added via secondary address field if Tally supports or in voucher level.
+                # For simplicity, main ledger address uses billing.
+
+                for tag, col in PARTY_CONTACT_FIELDS:
+                    if row[col]: text_tag(out, tag, row[col])
+
+                gstin = row['Tally_GSTIN']
+                gst_treatment = row['GST Treatment'] # e.g., 'Regular', 'Consumer', 'Unregistered'
+                place_of_supply_code = row['Tally_Place_of_Supply_Code']
+
+                if gstin:
+                    text_tag(out, "HASGSTIN", "Yes")
+                    text_tag(out, "GSTREGISTRATIONTYPE", gst_treatment if gst_treatment in TALLY_GST_REGISTRATION_TYPES else "Regular")
+                    text_tag(out, "GSTIN", gstin)
+                    if place_of_supply_code:
+                        text_tag(out, "PLACEOFSUPPLY", row['Tally_Place_of_Supply_Code (Tally)']) # Assuming format '07-Maharashtra'
+
+                add_language_name(out, party_name)
+                close_tag(out, "LEDGER")
+
+        # Process Vendors (Sundry Creditors)
+        if df_vendors is not None:
+            df_vendors = prepare_rows(df_vendors, text_columns=party_text_columns, amount_columns=['Opening Balance'],
+                                      defaults=party_defaults)
+            for index, row in iter_row_dicts(df_vendors):
+                party_name = row['Tally_Party_Name']
+                if not party_name:
+                    print(f"⚠️ Skipping vendor due to empty name: Row {index+2}")
+                    continue
+
+                open_tag(out, "LEDGER", NAME=party_name, ACTION="CREATE")
+                text_tag(out, "NAME", party_name)
+                text_tag(out, "PARENT", "Sundry Creditors") # Fixed parent group for vendors
+                text_tag(out, "ISBILLWISEON", "Yes")
+                text_tag(out, "OPENINGBALANCE", row['Opening Balance (Tally)'])
+
+                add_address_details(out, row, is_shipping=False)
+
+                for tag, col in PARTY_CONTACT_FIELDS:
+                    if row[col]: text_tag(out, tag, row[col])
+
+                gstin = row['Tally_GSTIN']
+                gst_treatment = row['GST Treatment']
+
+                if gstin:
+                    text_tag(out, "HASGSTIN", "Yes")
+                    text_tag(out, "GSTREGISTRATIONTYPE", gst_treatment if gst_treatment in TALLY_GST_REGISTRATION_TYPES else "Regular")
+                    text_tag(out, "GSTIN", gstin)
+
+                # Bank details for vendors (optional, but good to include if available)
+                bank_acc_no = row['Tally_Bank_Account_No']
+                bank_name = row['Tally_Bank_Name']
+                ifsc_code = row['Tally_IFSC_Code']
+                if bank_acc_no and bank_name:
+                    open_tag(out, "BANKDETAILS.LIST")
+                    text_tag(out, "BANKACCOUNTNO", bank_acc_no)
+                    text_tag(out, "BANKNAME", bank_name)
+                    if ifsc_code:
+                        text_tag(out, "IFSCCODE", ifsc_code)
+                    close_tag(out, "BANKDETAILS.LIST")
+
+                add_language_name(out, party_name)
+                close_tag(out, "LEDGER")
 
 
 def generate_sales_vouchers_xml(df_invoices):
@@ -307,128 +612,139 @@ def generate_sales_vouchers_xml(df_invoices):
     print("\n--- Generating Sales Vouchers XML ---")
     if df_invoices is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    # Tally needs one VOUCHER element per invoice.
-    # Group by 'Invoice ID' to handle multiple line items per invoice.
-    # The 'Item Name', 'Quantity', 'Item Price', etc. are assumed to be on individual rows
-    # within the group, or the main row itself if there's only one item.
-    df_invoices['Total'] = pd.to_numeric(df_invoices['Total'], errors='coerce').fillna(0) # Ensure Total is numeric
-
-    grouped_invoices = df_invoices.groupby('Invoice ID')
-
-    for invoice_id, group in grouped_invoices:
-        # Take the first row for header details (assuming consistent header info across item rows)
-        header = group.iloc[0]
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=safe_str(header['Invoice ID']),
-                                   VCHTYPE="Sales",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(header['Invoice Date'])
-        etree.SubElement(voucher, "GUID").text = f"SAL-{safe_str(header['Invoice ID'])}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Sales"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(header['Invoice Number'])
-        etree.SubElement(voucher, "PARTYLEDGERNAME").text = safe_str(header['Customer Name'])
-        etree.SubElement(voucher, "CSTFORMISSUETYPE").text = "" # If C-Form/F-Form etc. used
-        etree.SubElement(voucher, "CSTFORMRECVTYPE").text = ""
-        etree.SubElement(voucher, "BASICBUYERNAME").text = safe_str(header['Customer Name'])
-        etree.SubElement(voucher, "PERSISTEDVIEW").text = "Accounting Voucher" # Standard view for non-inventory
-        etree.SubElement(voucher, "PLACEOFSUPPLY").text = safe_str(header.get('Place of Supply(With State Code)', '')).split('-')[0].strip() # E.g., '27' for Maharashtra
-
-        # Buyer details for GST
-        buyer_details = etree.SubElement(voucher, "BUYERDETAILS.LIST")
-        etree.SubElement(buyer_details, "CONSNAME").text = safe_str(header['Customer Name'])
-        # Concatenate address lines for Tally if multiple.
-        cons_address_list = etree.SubElement(buyer_details, "ADDRESS.LIST")
-        if safe_str(header.get('Shipping Address')):
-            etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Shipping Address'))
-            if safe_str(header.get('Shipping Street2')):
-                etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Shipping Street2'))
-        elif safe_str(header.get('Billing Address')):
-            etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Billing Address'))
-            if safe_str(header.get('Billing Street2')):
-                etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Billing Street2'))
+    with tally_xml_file("tally_sales_vouchers.xml", "Vouchers", "VOUCHERS") as out:
+
+        # Tally needs one VOUCHER element per invoice.
+        # Group by 'Invoice ID' to handle multiple line items per invoice.
+        # The 'Item Name', 'Quantity', 'Item Price', etc. are assumed to be on individual rows
+        # within the group, or the main row itself if there's only one item.
+        df_invoices['Total'] = pd.to_numeric(df_invoices['Total'], errors='coerce').fillna(0) # Ensure Total is numeric
+        df_invoices = prepare_rows(
+            df_invoices,
+            text_columns=['Invoice Number', 'Customer Name', 'Place of Supply(With State Code)',
+                          'GST Identification Number (GSTIN)', 'GST Treatment', 'Notes', 'Item Name', 'Account',
+                          'Tally_Output_IGST_Ledger', 'Tally_Output_CGST_Ledger', 'Tally_Output_SGST_Ledger',
+                          'Tally_Round_Off_Ledger'],
+            amount_columns=['Item Total', 'IGST', 'CGST', 'SGST', 'Round Off'],
+            credit_columns=['Total'],
+            date_columns=['Invoice Date'],
+            state_code_columns=['Place of Supply(With State Code)'],
+            ledger_columns=['Account', 'Tally_Output_IGST_Ledger', 'Tally_Output_CGST_Ledger', 'Tally_Output_SGST_Ledger',
+                            'Tally_Round_Off_Ledger'],
+            defaults={'Place of Supply(With State Code)': '', 'GST Identification Number (GSTIN)': '',
+                      'GST Treatment': 'Regular', 'Notes': '', 'Item Name': '', 'Account': 'Sales Account',
+                      'Tally_Output_IGST_Ledger': 'Output IGST', 'Tally_Output_CGST_Ledger': 'Output CGST',
+                      'Tally_Output_SGST_Ledger': 'Output SGST', 'Round Off': 0.0, 'Tally_Round_Off_Ledger': 'Round Off'})
+        df_invoices = add_gst_entry_flags(df_invoices)
+        df_invoices = add_round_off_flags(df_invoices, 'Round Off')
+        df_invoices = add_buyer_address(df_invoices, 'Shipping Street2', 'Billing Street2')
+
+        for invoice_id, rows in iter_groups(df_invoices, 'Invoice ID'):
+            # Take the first row for header details (assuming consistent header info across item rows)
+            header = rows[0]
+
+            open_tag(out, "VOUCHER", REMOTEID=safe_str(header['Invoice ID']), VCHTYPE="Sales", ACTION="CREATE")
+
+            text_tag(out, "DATE", header['Invoice Date (Tally)'])
+            text_tag(out, "GUID", f"SAL-{safe_str(header['Invoice ID'])}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Sales")
+            text_tag(out, "VOUCHERNUMBER", header['Invoice Number'])
+            text_tag(out, "PARTYLEDGERNAME", header['Customer Name'])
+            text_tag(out, "CSTFORMISSUETYPE", "") # If C-Form/F-Form etc. used
+            text_tag(out, "CSTFORMRECVTYPE", "")
+            text_tag(out, "BASICBUYERNAME", header['Customer Name'])
+            text_tag(out, "PERSISTEDVIEW", "Accounting Voucher") # Standard view for non-inventory
+            text_tag(out, "PLACEOFSUPPLY", header['Place of Supply(With State Code) (Tally)']) # E.g., '27' for Maharashtra
+
+            # Buyer details for GST
+            open_tag(out, "BUYERDETAILS.LIST")
+            text_tag(out, "CONSNAME", header['Customer Name'])
+            # Concatenate address lines for Tally if multiple.
+            open_tag(out, "ADDRESS.LIST")
+            if header['Address (Tally)']:
+                text_tag(out, "ADDRESS", header['Address (Tally)'])
+            if header['Street2 (Tally)']:
+                text_tag(out, "ADDRESS", header['Street2 (Tally)'])
+            close_tag(out, "ADDRESS.LIST")
         
-        etree.SubElement(buyer_details, "STATENAME").text = safe_str(header.get('Shipping State', '') or header.get('Billing State', '') or '')
-        etree.SubElement(buyer_details, "COUNTRYNAME").text = safe_str(header.get('Shipping Country', '') or header.get('Billing Country', '') or DEFAULT_COUNTRY)
+            text_tag(out, "STATENAME", header['State (Tally)'])
+            text_tag(out, "COUNTRYNAME", header['Country (Tally)'])
         
-        gstin = safe_str(header.get('GST Identification Number (GSTIN)'))
-        if gstin:
-            etree.SubElement(buyer_details, "GSTREGISTRATIONTYPE").text = safe_str(header.get('GST Treatment', 'Regular'))
-            etree.SubElement(buyer_details, "GSTIN").text = gstin
+            gstin = header['GST Identification Number (GSTIN)']
+            if gstin:
+                text_tag(out, "GSTREGISTRATIONTYPE", header['GST Treatment'])
+                text_tag(out, "GSTIN", gstin)
+            close_tag(out, "BUYERDETAILS.LIST")
         
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(header['Invoice Date'])
-        etree.SubElement(voucher, "NARRATION").text = safe_str(header.get('Notes', ''))
+            text_tag(out, "EFFECTIVEDATE", header['Invoice Date (Tally)'])
+            text_tag(out, "NARRATION", header['Notes'])
         
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
 
-        # Credit the Party Ledger (Customer)
-        party_ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(party_ledger_entry, "LEDGERNAME").text = safe_str(header['Customer Name'])
-        etree.SubElement(party_ledger_entry, "ISDEEMEDPOSITIVE").text = "No" # Credit
-        etree.SubElement(party_ledger_entry, "AMOUNT").text = format_tally_amount(-header['Total']) # Total invoice amount, as credit
+            # Credit the Party Ledger (Customer)
+            open_tag(out, "ALLLEDGERENTRIES")
+            text_tag(out, "LEDGERNAME", header['Customer Name'])
+            text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+            text_tag(out, "AMOUNT", header['Total (Tally Credit)']) # Total invoice amount, as credit
         
-        # Bill-wise details
-        bill_allocation_list = etree.SubElement(party_ledger_entry, "BILLALLOCATIONS.LIST")
-        bill_allocation = etree.SubElement(bill_allocation_list, "BILLALLOCATIONS")
-        etree.SubElement(bill_allocation, "NAME").text = safe_str(header['Invoice Number'])
-        etree.SubElement(bill_allocation, "BILLTYPE").text = "New Ref"
-        etree.SubElement(bill_allocation, "AMOUNT").text = format_tally_amount(-header['Total'])
-
-        # Process each line item (if any) and associated GST
-        # IMPORTANT: This assumes each relevant row in the group represents an item line.
-        # If 'Item Name' is empty for the header row but present for subsequent rows,
-        # adjust logic in 02_clean_map.py to ensure item data is distinct.
-        for idx, item_row in group.iterrows():
-            item_name = safe_str(item_row.get('Item Name'))
-            if not item_name: # Skip if no item name, assuming it's a header-only row in the group
-                continue
-
-            # Debit Sales/Revenue Ledger
-            sales_ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-            etree.SubElement(sales_ledger_entry, "LEDGERNAME").text = safe_str(item_row.get('Account', 'Sales Account')) # Use mapped sales ledger
-            etree.SubElement(sales_ledger_entry, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-            etree.SubElement(sales_ledger_entry, "AMOUNT").text = format_tally_amount(item_row['Item Total']) # Amount before tax for the line item
-
-            # GST Details (Debit for Output GST)
-            # This is a simplified GST application.
-            # You might need more sophisticated logic based on 'GST Treatment' or 'Place of Supply'.
-            cgst_rate = item_row.get('CGST Rate %', 0.0)
-            sgst_rate = item_row.get('SGST Rate %', 0.0)
-            igst_rate = item_row.get('IGST Rate %', 0.0)
-
-            if igst_rate > 0 and safe_str(item_row.get('IGST')):
-                igst_amount = item_row['IGST']
-                gst_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                etree.SubElement(gst_entry, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_IGST_Ledger', 'Output IGST')) # From 02_clean_map
-                etree.SubElement(gst_entry, "ISDEEMEDPOSITIVE").text = "Yes"
-                etree.SubElement(gst_entry, "AMOUNT").text = format_tally_amount(igst_amount)
-            elif (cgst_rate > 0 or sgst_rate > 0) and (safe_str(item_row.get('CGST')) or safe_str(item_row.get('SGST'))):
-                cgst_amount = item_row.get('CGST', 0.0)
-                sgst_amount = item_row.get('SGST', 0.0)
-
-                if cgst_amount > 0:
-                    gst_entry_cgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_cgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_CGST_Ledger', 'Output CGST'))
-                    etree.SubElement(gst_entry_cgst, "ISDEEMEDPOSITIVE").text = "Yes"
-                    etree.SubElement(gst_entry_cgst, "AMOUNT").text = format_tally_amount(cgst_amount)
-                if sgst_amount > 0:
-                    gst_entry_sgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_sgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_SGST_Ledger', 'Output SGST'))
-                    etree.SubElement(gst_entry_sgst, "ISDEEMEDPOSITIVE").text = "Yes"
-                    etree.SubElement(gst_entry_sgst, "AMOUNT").text = format_tally_amount(sgst_amount)
-
-        # Round Off Adjustment
-        round_off_amount = header.get('Round Off', 0.0)
-        if round_off_amount != 0 and not math.isnan(round_off_amount): # Check for both 0 and NaN
-            round_off_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-            etree.SubElement(round_off_entry, "LEDGERNAME").text = safe_str(header.get('Tally_Round_Off_Ledger', 'Round Off')) # From 02_clean_map
-            etree.SubElement(round_off_entry, "ISDEEMEDPOSITIVE").text = "Yes" if round_off_amount > 0 else "No"
-            etree.SubElement(round_off_entry, "AMOUNT").text = format_tally_amount(round_off_amount)
-
-    write_xml_to_file(envelope, "tally_sales_vouchers.xml")
+            # Bill-wise details
+            open_tag(out, "BILLALLOCATIONS.LIST")
+            open_tag(out, "BILLALLOCATIONS")
+            text_tag(out, "NAME", header['Invoice Number'])
+            text_tag(out, "BILLTYPE", "New Ref")
+            text_tag(out, "AMOUNT", header['Total (Tally Credit)'])
+            close_tag(out, "BILLALLOCATIONS")
+            close_tag(out, "BILLALLOCATIONS.LIST")
+            close_tag(out, "ALLLEDGERENTRIES")
+
+            # Process each line item (if any) and associated GST
+            # IMPORTANT: This assumes each relevant row in the group represents an item line.
+            # If 'Item Name' is empty for the header row but present for subsequent rows,
+            # adjust logic in 02_clean_map.py to ensure item data is distinct.
+            for item_row in rows:
+                item_name = item_row['Item Name']
+                if not item_name: # Skip if no item name, assuming it's a header-only row in the group
+                    continue
+
+                # Debit Sales/Revenue Ledger
+                open_tag(out, "ALLLEDGERENTRIES")
+                escaped_tag(out, "LEDGERNAME", item_row['Account (XML)']) # Use mapped sales ledger
+                text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+                text_tag(out, "AMOUNT", item_row['Item Total (Tally)']) # Amount before tax for the line item
+                close_tag(out, "ALLLEDGERENTRIES")
+
+                # GST Details (Debit for Output GST)
+                # This is a simplified GST application.
+                # You might need more sophisticated logic based on 'GST Treatment' or 'Place of Supply'.
+                if item_row['IGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_IGST_Ledger (XML)']) # From 02_clean_map
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['IGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['CGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_CGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['CGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['SGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_SGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['SGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+
+            # Round Off Adjustment
+            if header['Round Off (Post)']: # Neither 0 nor NaN
+                open_tag(out, "ALLLEDGERENTRIES")
+                escaped_tag(out, "LEDGERNAME", header['Tally_Round_Off_Ledger (XML)']) # From 02_clean_map
+                text_tag(out, "ISDEEMEDPOSITIVE", header['Round Off (Deemed Positive)'])
+                text_tag(out, "AMOUNT", header['Round Off (Tally)'])
+                close_tag(out, "ALLLEDGERENTRIES")
+
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
 
 
 def generate_customer_payments_xml(df_payments):
@@ -436,53 +752,64 @@ def generate_customer_payments_xml(df_payments):
     print("\n--- Generating Customer Payments (Receipt Vouchers) XML ---")
     if df_payments is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    for index, row in df_payments.iterrows():
-        payment_id = safe_str(row['CustomerPayment ID'])
-        if not payment_id:
-            print(f"⚠️ Skipping customer payment due to empty ID: Row {index+2}")
-            continue
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=payment_id,
-                                   VCHTYPE="Receipt",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(row['Date'])
-        etree.SubElement(voucher, "GUID").text = f"RCP-{payment_id}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Receipt"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(row['Payment Number'])
-        etree.SubElement(voucher, "NARRATION").text = safe_str(row.get('Description', 'Customer Payment'))
-        etree.SubElement(voucher, "BASICBASECURRENTBAL").text = format_tally_amount(row['Amount']) # Total amount of payment
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(row['Date'])
-
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
-
-        # Debit Bank/Cash Account
-        debit_bank_cash = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(debit_bank_cash, "LEDGERNAME").text = safe_str(row.get('Tally_Deposit_Ledger', 'Cash-in-Hand')) # From 02_clean_map
-        etree.SubElement(debit_bank_cash, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-        etree.SubElement(debit_bank_cash, "AMOUNT").text = format_tally_amount(row['Amount'])
-
-        # Credit Customer Ledger
-        credit_customer = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(credit_customer, "LEDGERNAME").text = safe_str(row['Customer Name'])
-        etree.SubElement(credit_customer, "ISDEEMEDPOSITIVE").text = "No" # Credit
-        etree.SubElement(credit_customer, "AMOUNT").text = format_tally_amount(-row['Amount'])
-
-        # Bill-wise allocation for the customer payment
-        invoice_number = safe_str(row.get('Invoice Number'))
-        amount_applied = row.get('Amount Applied to Invoice', 0.0)
-
-        if invoice_number and amount_applied != 0:
-            bill_allocation = etree.SubElement(credit_customer, "BILLALLOCATIONS.LIST")
-            bill_details = etree.SubElement(bill_allocation, "BILLALLOCATIONS")
-            etree.SubElement(bill_details, "NAME").text = invoice_number
-            etree.SubElement(bill_details, "BILLTYPE").text = "Agst Ref" # Against reference
-            etree.SubElement(bill_details, "AMOUNT").text = format_tally_amount(-amount_applied) # Amount applied to specific invoice (as credit)
+    with tally_xml_file("tally_receipt_vouchers.xml", "Vouchers", "VOUCHERS") as out:
+
+        df_payments = prepare_rows(
+            df_payments,
+            text_columns=['CustomerPayment ID', 'Payment Number', 'Description', 'Tally_Deposit_Ledger',
+                          'Customer Name', 'Invoice Number'],
+            amount_columns=['Amount'],
+            credit_columns=['Amount', 'Amount Applied to Invoice'],
+            date_columns=['Date'],
+            ledger_columns=['Tally_Deposit_Ledger'],
+            defaults={'Description': 'Customer Payment', 'Tally_Deposit_Ledger': 'Cash-in-Hand', 'Invoice Number': '',
+                      'Amount Applied to Invoice': 0.0})
+        for index, row in iter_row_dicts(df_payments):
+            payment_id = row['CustomerPayment ID']
+            if not payment_id:
+                print(f"⚠️ Skipping customer payment due to empty ID: Row {index+2}")
+                continue
 
-    write_xml_to_file(envelope, "tally_receipt_vouchers.xml")
+            open_tag(out, "VOUCHER", REMOTEID=payment_id, VCHTYPE="Receipt", ACTION="CREATE")
+
+            text_tag(out, "DATE", row['Date (Tally)'])
+            text_tag(out, "GUID", f"RCP-{payment_id}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Receipt")
+            text_tag(out, "VOUCHERNUMBER", row['Payment Number'])
+            text_tag(out, "NARRATION", row['Description'])
+            text_tag(out, "BASICBASECURRENTBAL", row['Amount (Tally)']) # Total amount of payment
+            text_tag(out, "EFFECTIVEDATE", row['Date (Tally)'])
+
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
+
+            # Debit Bank/Cash Account
+            open_tag(out, "ALLLEDGERENTRIES")
+            escaped_tag(out, "LEDGERNAME", row['Tally_Deposit_Ledger (XML)']) # From 02_clean_map
+            text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+            text_tag(out, "AMOUNT", row['Amount (Tally)'])
+            close_tag(out, "ALLLEDGERENTRIES")
+
+            # Credit Customer Ledger
+            open_tag(out, "ALLLEDGERENTRIES")
+            text_tag(out, "LEDGERNAME", row['Customer Name'])
+            text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+            text_tag(out, "AMOUNT", row['Amount (Tally Credit)'])
+
+            # Bill-wise allocation for the customer payment
+            invoice_number = row['Invoice Number']
+            amount_applied = row['Amount Applied to Invoice']
+
+            if invoice_number and amount_applied != 0:
+                open_tag(out, "BILLALLOCATIONS.LIST")
+                open_tag(out, "BILLALLOCATIONS")
+                text_tag(out, "NAME", invoice_number)
+                text_tag(out, "BILLTYPE", "Agst Ref") # Against reference
+                text_tag(out, "AMOUNT", row['Amount Applied to Invoice (Tally Credit)']) # Amount applied to specific invoice (as credit)
+                close_tag(out, "BILLALLOCATIONS")
+                close_tag(out, "BILLALLOCATIONS.LIST")
+            close_tag(out, "ALLLEDGERENTRIES")
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
 
 
 def generate_vendor_payments_xml(df_payments):
@@ -490,52 +817,63 @@ def generate_vendor_payments_xml(df_payments):
     print("\n--- Generating Vendor Payments (Payment Vouchers) XML ---")
     if df_payments is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    for index, row in df_payments.iterrows():
-        payment_id = safe_str(row['VendorPayment ID'])
-        if not payment_id:
-            print(f"⚠️ Skipping vendor payment due to empty ID: Row {index+2}")
-            continue
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=payment_id,
-                                   VCHTYPE="Payment",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(row['Date'])
-        etree.SubElement(voucher, "GUID").text = f"PAY-{payment_id}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Payment"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(row['Payment Number'])
-        etree.SubElement(voucher, "NARRATION").text = safe_str(row.get('Description', 'Vendor Payment'))
-        etree.SubElement(voucher, "BASICBASECURRENTBAL").text = format_tally_amount(row['Amount']) # Total amount of payment
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(row['Date'])
-
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
-
-        # Debit Vendor Ledger
-        debit_vendor = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(debit_vendor, "LEDGERNAME").text = safe_str(row['Vendor Name'])
-        etree.SubElement(debit_vendor, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-        etree.SubElement(debit_vendor, "AMOUNT").text = format_tally_amount(row['Amount'])
-
-        # Bill-wise allocation for the vendor payment
-        bill_number = safe_str(row.get('Bill Number'))
-        bill_amount_applied = row.get('Bill Amount', 0.0) # Amount applied to specific bill
-        if bill_number and bill_amount_applied != 0:
-            bill_allocation = etree.SubElement(debit_vendor, "BILLALLOCATIONS.LIST")
-            bill_details = etree.SubElement(bill_allocation, "BILLALLOCATIONS")
-            etree.SubElement(bill_details, "NAME").text = bill_number
-            etree.SubElement(bill_details, "BILLTYPE").text = "Agst Ref" # Against reference
-            etree.SubElement(bill_details, "AMOUNT").text = format_tally_amount(bill_amount_applied) # Amount applied to specific bill (as debit)
-
-        # Credit Bank/Cash Account
-        credit_bank_cash = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(credit_bank_cash, "LEDGERNAME").text = safe_str(row.get('Tally_Paid_Through_Ledger', 'Cash-in-Hand')) # From 02_clean_map
-        etree.SubElement(credit_bank_cash, "ISDEEMEDPOSITIVE").text = "No" # Credit
-        etree.SubElement(credit_bank_cash, "AMOUNT").text = format_tally_amount(-row['Amount'])
-
-    write_xml_to_file(envelope, "tally_payment_vouchers.xml")
+    with tally_xml_file("tally_payment_vouchers.xml", "Vouchers", "VOUCHERS") as out:
+
+        df_payments = prepare_rows(
+            df_payments,
+            text_columns=['VendorPayment ID', 'Payment Number', 'Description', 'Vendor Name', 'Bill Number',
+                          'Tally_Paid_Through_Ledger'],
+            amount_columns=['Amount', 'Bill Amount'],
+            credit_columns=['Amount'],
+            date_columns=['Date'],
+            ledger_columns=['Tally_Paid_Through_Ledger'],
+            defaults={'Description': 'Vendor Payment', 'Bill Number': '', 'Bill Amount': 0.0,
+                      'Tally_Paid_Through_Ledger': 'Cash-in-Hand'})
+        for index, row in iter_row_dicts(df_payments):
+            payment_id = row['VendorPayment ID']
+            if not payment_id:
+                print(f"⚠️ Skipping vendor payment due to empty ID: Row {index+2}")
+                continue
+
+            open_tag(out, "VOUCHER", REMOTEID=payment_id, VCHTYPE="Payment", ACTION="CREATE")
+
+            text_tag(out, "DATE", row['Date (Tally)'])
+            text_tag(out, "GUID", f"PAY-{payment_id}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Payment")
+            text_tag(out, "VOUCHERNUMBER", row['Payment Number'])
+            text_tag(out, "NARRATION", row['Description'])
+            text_tag(out, "BASICBASECURRENTBAL", row['Amount (Tally)']) # Total amount of payment
+            text_tag(out, "EFFECTIVEDATE", row['Date (Tally)'])
+
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
+
+            # Debit Vendor Ledger
+            open_tag(out, "ALLLEDGERENTRIES")
+            text_tag(out, "LEDGERNAME", row['Vendor Name'])
+            text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+            text_tag(out, "AMOUNT", row['Amount (Tally)'])
+
+            # Bill-wise allocation for the vendor payment
+            bill_number = row['Bill Number']
+            bill_amount_applied = row['Bill Amount'] # Amount applied to specific bill
+            if bill_number and bill_amount_applied != 0:
+                open_tag(out, "BILLALLOCATIONS.LIST")
+                open_tag(out, "BILLALLOCATIONS")
+                text_tag(out, "NAME", bill_number)
+                text_tag(out, "BILLTYPE", "Agst Ref") # Against reference
+                text_tag(out, "AMOUNT", row['Bill Amount (Tally)']) # Amount applied to specific bill (as debit)
+                close_tag(out, "BILLALLOCATIONS")
+                close_tag(out, "BILLALLOCATIONS.LIST")
+            close_tag(out, "ALLLEDGERENTRIES")
+
+            # Credit Bank/Cash Account
+            open_tag(out, "ALLLEDGERENTRIES")
+            escaped_tag(out, "LEDGERNAME", row['Tally_Paid_Through_Ledger (XML)']) # From 02_clean_map
+            text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+            text_tag(out, "AMOUNT", row['Amount (Tally Credit)'])
+            close_tag(out, "ALLLEDGERENTRIES")
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
 
 
 def generate_credit_notes_xml(df_credit_notes):
@@ -543,115 +881,125 @@ def generate_credit_notes_xml(df_credit_notes):
     print("\n--- Generating Credit Notes XML ---")
     if df_credit_notes is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    # Group by 'CreditNotes ID' to handle multiple line items per credit note
-    df_credit_notes['Total'] = pd.to_numeric(df_credit_notes['Total'], errors='coerce').fillna(0)
-    grouped_credit_notes = df_credit_notes.groupby('CreditNotes ID')
-
-    for credit_note_id, group in grouped_credit_notes:
-        header = group.iloc[0]
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=safe_str(header['CreditNotes ID']),
-                                   VCHTYPE="Credit Note",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(header['Credit Note Date'])
-        etree.SubElement(voucher, "GUID").text = f"CRN-{safe_str(header['CreditNotes ID'])}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Credit Note"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(header['Credit Note Number'])
-        etree.SubElement(voucher, "PARTYLEDGERNAME").text = safe_str(header['Customer Name'])
-        etree.SubElement(voucher, "NARRATION").text = safe_str(header.get('Reason', 'Credit Note issued'))
-        etree.SubElement(voucher, "BASICBUYERNAME").text = safe_str(header['Customer Name']) # For GST
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(header['Credit Note Date'])
-        etree.SubElement(voucher, "ISORIGINAL").text = "Yes" # Indicates it's a new entry
-
-        # Buyer/Consignee details for GST
-        buyer_details = etree.SubElement(voucher, "BUYERDETAILS.LIST")
-        etree.SubElement(buyer_details, "CONSNAME").text = safe_str(header['Customer Name'])
-        cons_address_list = etree.SubElement(buyer_details, "ADDRESS.LIST")
-        if safe_str(header.get('Shipping Address')):
-            etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Shipping Address'))
-            if safe_str(header.get('Shipping Street 2')):
-                etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Shipping Street 2'))
-        elif safe_str(header.get('Billing Address')):
-            etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Billing Address'))
-            if safe_str(header.get('Billing Street 2')):
-                etree.SubElement(cons_address_list, "ADDRESS").text = safe_str(header.get('Billing Street 2'))
-
-        etree.SubElement(buyer_details, "STATENAME").text = safe_str(header.get('Shipping State', '') or header.get('Billing State', '') or '')
-        etree.SubElement(buyer_details, "COUNTRYNAME").text = safe_str(header.get('Shipping Country', '') or header.get('Billing Country', '') or DEFAULT_COUNTRY)
-
-        gstin = safe_str(header.get('GST Identification Number (GSTIN)'))
-        if gstin:
-            etree.SubElement(buyer_details, "GSTREGISTRATIONTYPE").text = safe_str(header.get('GST Treatment', 'Regular'))
-            etree.SubElement(buyer_details, "GSTIN").text = gstin
+    with tally_xml_file("tally_credit_notes.xml", "Vouchers", "VOUCHERS") as out:
+
+        # Group by 'CreditNotes ID' to handle multiple line items per credit note
+        df_credit_notes['Total'] = pd.to_numeric(df_credit_notes['Total'], errors='coerce').fillna(0)
+        df_credit_notes = prepare_rows(
+            df_credit_notes,
+            text_columns=['Credit Note Number', 'Customer Name', 'Reason', 'GST Identification Number (GSTIN)',
+                          'GST Treatment', 'Associated Invoice Number', 'Item Name', 'Tally_Sales_Return_Ledger',
+                          'Tally_Output_IGST_Ledger', 'Tally_Output_CGST_Ledger', 'Tally_Output_SGST_Ledger'],
+            amount_columns=['Item Total'],
+            credit_columns=['Total', 'IGST', 'CGST', 'SGST'],
+            date_columns=['Credit Note Date', 'Associated Invoice Date'],
+            ledger_columns=['Tally_Sales_Return_Ledger', 'Tally_Output_IGST_Ledger', 'Tally_Output_CGST_Ledger',
+                            'Tally_Output_SGST_Ledger'],
+            defaults={'Reason': 'Credit Note issued', 'GST Identification Number (GSTIN)': '', 'GST Treatment': 'Regular',
+                      'Associated Invoice Number': '', 'Associated Invoice Date': '', 'Item Name': '',
+                      'Tally_Sales_Return_Ledger': 'Sales Returns', 'Tally_Output_IGST_Ledger': 'Output IGST',
+                      'Tally_Output_CGST_Ledger': 'Output CGST', 'Tally_Output_SGST_Ledger': 'Output SGST'})
+        df_credit_notes = add_gst_entry_flags(df_credit_notes)
+        df_credit_notes = add_buyer_address(df_credit_notes, 'Shipping Street 2', 'Billing Street 2')
+
+        for credit_note_id, rows in iter_groups(df_credit_notes, 'CreditNotes ID'):
+            header = rows[0]
+
+            open_tag(out, "VOUCHER", REMOTEID=safe_str(header['CreditNotes ID']), VCHTYPE="Credit Note", ACTION="CREATE")
+
+            text_tag(out, "DATE", header['Credit Note Date (Tally)'])
+            text_tag(out, "GUID", f"CRN-{safe_str(header['CreditNotes ID'])}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Credit Note")
+            text_tag(out, "VOUCHERNUMBER", header['Credit Note Number'])
+            text_tag(out, "PARTYLEDGERNAME", header['Customer Name'])
+            text_tag(out, "NARRATION", header['Reason'])
+            text_tag(out, "BASICBUYERNAME", header['Customer Name']) # For GST
+            text_tag(out, "EFFECTIVEDATE", header['Credit Note Date (Tally)'])
+            text_tag(out, "ISORIGINAL", "Yes") # Indicates it's a new entry
+
+            # Buyer/Consignee details for GST
+            open_tag(out, "BUYERDETAILS.LIST")
+            text_tag(out, "CONSNAME", header['Customer Name'])
+            open_tag(out, "ADDRESS.LIST")
+            if header['Address (Tally)']:
+                text_tag(out, "ADDRESS", header['Address (Tally)'])
+            if header['Street2 (Tally)']:
+                text_tag(out, "ADDRESS", header['Street2 (Tally)'])
+            close_tag(out, "ADDRESS.LIST")
+
+            text_tag(out, "STATENAME", header['State (Tally)'])
+            text_tag(out, "COUNTRYNAME", header['Country (Tally)'])
+
+            gstin = header['GST Identification Number (GSTIN)']
+            if gstin:
+                text_tag(out, "GSTREGISTRATIONTYPE", header['GST Treatment'])
+                text_tag(out, "GSTIN", gstin)
+            close_tag(out, "BUYERDETAILS.LIST")
         
-        # Original Sales/Invoice details for GST Credit Note
-        # This is where you link the credit note to the original invoice for Tally's GST reports.
-        if safe_str(header.get('Associated Invoice Number')):
-            original_invoice_details = etree.SubElement(voucher, "ORIGINALINVOICEDETAILS.LIST")
-            orig_inv_item = etree.SubElement(original_invoice_details, "ORIGINALINVOICEDETAILS")
-            etree.SubElement(orig_inv_item, "DATE").text = format_tally_date(header.get('Associated Invoice Date', ''))
-            etree.SubElement(orig_inv_item, "REFNUM").text = safe_str(header.get('Associated Invoice Number'))
-
-
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
-
-        # Debit Sales Returns / Revenue (or the original Sales Ledger)
-        for idx, item_row in group.iterrows():
-            item_name = safe_str(item_row.get('Item Name'))
-            if not item_name:
-                continue
-
-            debit_sales_return = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-            etree.SubElement(debit_sales_return, "LEDGERNAME").text = safe_str(item_row.get('Tally_Sales_Return_Ledger', 'Sales Returns')) # Use mapped Sales Returns ledger
-            etree.SubElement(debit_sales_return, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-            etree.SubElement(debit_sales_return, "AMOUNT").text = format_tally_amount(item_row['Item Total']) # Amount of item
-
-            # Reverse GST (Credit for Output GST)
-            cgst_rate = item_row.get('CGST Rate %', 0.0)
-            sgst_rate = item_row.get('SGST Rate %', 0.0)
-            igst_rate = item_row.get('IGST Rate %', 0.0)
-
-            if igst_rate > 0 and safe_str(item_row.get('IGST')):
-                igst_amount = item_row['IGST']
-                gst_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                etree.SubElement(gst_entry, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_IGST_Ledger', 'Output IGST'))
-                etree.SubElement(gst_entry, "ISDEEMEDPOSITIVE").text = "No" # Reverse effect
-                etree.SubElement(gst_entry, "AMOUNT").text = format_tally_amount(-igst_amount)
-            elif (cgst_rate > 0 or sgst_rate > 0) and (safe_str(item_row.get('CGST')) or safe_str(item_row.get('SGST'))):
-                cgst_amount = item_row.get('CGST', 0.0)
-                sgst_amount = item_row.get('SGST', 0.0)
-
-                if cgst_amount > 0:
-                    gst_entry_cgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_cgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_CGST_Ledger', 'Output CGST'))
-                    etree.SubElement(gst_entry_cgst, "ISDEEMEDPOSITIVE").text = "No"
-                    etree.SubElement(gst_entry_cgst, "AMOUNT").text = format_tally_amount(-cgst_amount)
-                if sgst_amount > 0:
-                    gst_entry_sgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_sgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Output_SGST_Ledger', 'Output SGST'))
-                    etree.SubElement(gst_entry_sgst, "ISDEEMEDPOSITIVE").text = "No"
-                    etree.SubElement(gst_entry_sgst, "AMOUNT").text = format_tally_amount(-sgst_amount)
+            # Original Sales/Invoice details for GST Credit Note
+            # This is where you link the credit note to the original invoice for Tally's GST reports.
+            if header['Associated Invoice Number']:
+                open_tag(out, "ORIGINALINVOICEDETAILS.LIST")
+                open_tag(out, "ORIGINALINVOICEDETAILS")
+                text_tag(out, "DATE", header['Associated Invoice Date (Tally)'])
+                text_tag(out, "REFNUM", header['Associated Invoice Number'])
+                close_tag(out, "ORIGINALINVOICEDETAILS")
+                close_tag(out, "ORIGINALINVOICEDETAILS.LIST")
+
+
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
+
+            # Debit Sales Returns / Revenue (or the original Sales Ledger)
+            for item_row in rows:
+                item_name = item_row['Item Name']
+                if not item_name:
+                    continue
+
+                open_tag(out, "ALLLEDGERENTRIES")
+                escaped_tag(out, "LEDGERNAME", item_row['Tally_Sales_Return_Ledger (XML)']) # Use mapped Sales Returns ledger
+                text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+                text_tag(out, "AMOUNT", item_row['Item Total (Tally)']) # Amount of item
+                close_tag(out, "ALLLEDGERENTRIES")
+
+                # Reverse GST (Credit for Output GST)
+                if item_row['IGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_IGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "No") # Reverse effect
+                    text_tag(out, "AMOUNT", item_row['IGST (Tally Credit)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['CGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_CGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "No")
+                    text_tag(out, "AMOUNT", item_row['CGST (Tally Credit)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['SGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Output_SGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "No")
+                    text_tag(out, "AMOUNT", item_row['SGST (Tally Credit)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
         
-        # Credit Customer Ledger
-        credit_customer = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(credit_customer, "LEDGERNAME").text = safe_str(header['Customer Name'])
-        etree.SubElement(credit_customer, "ISDEEMEDPOSITIVE").text = "No" # Credit
-        etree.SubElement(credit_customer, "AMOUNT").text = format_tally_amount(-header['Total']) # Total credit note amount
-
-        # Against Invoice Reference (if applicable)
-        associated_invoice_number = safe_str(header.get('Associated Invoice Number'))
-        if associated_invoice_number:
-            bill_allocation = etree.SubElement(credit_customer, "BILLALLOCATIONS.LIST")
-            bill_details = etree.SubElement(bill_allocation, "BILLALLOCATIONS")
-            etree.SubElement(bill_details, "NAME").text = associated_invoice_number
-            etree.SubElement(bill_details, "BILLTYPE").text = "Agst Ref"
-            etree.SubElement(bill_details, "AMOUNT").text = format_tally_amount(-header['Total'])
-
-    write_xml_to_file(envelope, "tally_credit_notes.xml")
+            # Credit Customer Ledger
+            open_tag(out, "ALLLEDGERENTRIES")
+            text_tag(out, "LEDGERNAME", header['Customer Name'])
+            text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+            text_tag(out, "AMOUNT", header['Total (Tally Credit)']) # Total credit note amount
+
+            # Against Invoice Reference (if applicable)
+            associated_invoice_number = header['Associated Invoice Number']
+            if associated_invoice_number:
+                open_tag(out, "BILLALLOCATIONS.LIST")
+                open_tag(out, "BILLALLOCATIONS")
+                text_tag(out, "NAME", associated_invoice_number)
+                text_tag(out, "BILLTYPE", "Agst Ref")
+                text_tag(out, "AMOUNT", header['Total (Tally Credit)'])
+                close_tag(out, "BILLALLOCATIONS")
+                close_tag(out, "BILLALLOCATIONS.LIST")
+            close_tag(out, "ALLLEDGERENTRIES")
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
 
 
 def generate_journal_vouchers_xml(df_journals):
@@ -659,193 +1007,223 @@ def generate_journal_vouchers_xml(df_journals):
     print("\n--- Generating Journal Vouchers XML ---")
     if df_journals is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    # Group by 'Journal Number' as a single journal voucher in Tally can have multiple debit/credit entries.
-    grouped_journals = df_journals.groupby('Journal Number')
-
-    for journal_num, group in grouped_journals:
-        # Take the first row as the header for date, narration etc.
-        header = group.iloc[0]
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=safe_str(journal_num),
-                                   VCHTYPE="Journal",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(header['Journal Date'])
-        etree.SubElement(voucher, "GUID").text = f"JRN-{safe_str(journal_num)}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Journal"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(journal_num)
-        etree.SubElement(voucher, "NARRATION").text = safe_str(header.get('Notes', 'Journal Entry'))
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(header['Journal Date'])
-
-
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
-
-        # Iterate through each line in the grouped journal
-        for idx, entry_row in group.iterrows():
-            ledger_name = safe_str(entry_row['Account'])
-            debit_amount = entry_row['Debit']
-            credit_amount = entry_row['Credit']
-
-            if debit_amount > 0:
-                ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                etree.SubElement(ledger_entry, "LEDGERNAME").text = ledger_name
-                etree.SubElement(ledger_entry, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-                etree.SubElement(ledger_entry, "AMOUNT").text = format_tally_amount(debit_amount)
-            elif credit_amount > 0:
-                ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                etree.SubElement(ledger_entry, "LEDGERNAME").text = ledger_name
-                etree.SubElement(ledger_entry, "ISDEEMEDPOSITIVE").text = "No" # Credit
-                etree.SubElement(ledger_entry, "AMOUNT").text = format_tally_amount(-credit_amount) # Tally expects negative for Credit
-
-        # A quick check to ensure total debit equals total credit for the journal entry
-        total_debit = group['Debit'].sum()
-        total_credit = group['Credit'].sum()
-        if abs(total_debit - total_credit) > 0.01: # Allow for minor floating point differences
+    with tally_xml_file("tally_journal_vouchers.xml", "Vouchers", "VOUCHERS") as out:
+
+        df_journals = prepare_rows(df_journals, text_columns=['Notes', 'Account'],
+                                   amount_columns=['Debit'], credit_columns=['Credit'], date_columns=['Journal Date'],
+                                   ledger_columns=['Account'],
+                                   defaults={'Notes': 'Journal Entry'})
+
+        # Group by 'Journal Number' as a single journal voucher in Tally can have multiple debit/credit entries.
+        for journal_num, rows in iter_groups(df_journals, 'Journal Number'):
+            # Take the first row as the header for date, narration etc.
+            header = rows[0]
+
+            open_tag(out, "VOUCHER", REMOTEID=safe_str(journal_num), VCHTYPE="Journal", ACTION="CREATE")
+
+            text_tag(out, "DATE", header['Journal Date (Tally)'])
+            text_tag(out, "GUID", f"JRN-{safe_str(journal_num)}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Journal")
+            text_tag(out, "VOUCHERNUMBER", safe_str(journal_num))
+            text_tag(out, "NARRATION", header['Notes'])
+            text_tag(out, "EFFECTIVEDATE", header['Journal Date (Tally)'])
+
+
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
+
+            # Iterate through each line in the grouped journal
+            for entry_row in rows:
+                ledger_name = entry_row['Account (XML)']
+                debit_amount = entry_row['Debit']
+                credit_amount = entry_row['Credit']
+
+                if debit_amount > 0:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", ledger_name)
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+                    text_tag(out, "AMOUNT", entry_row['Debit (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                elif credit_amount > 0:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", ledger_name)
+                    text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+                    text_tag(out, "AMOUNT", entry_row['Credit (Tally Credit)']) # Tally expects negative for Credit
+                    close_tag(out, "ALLLEDGERENTRIES")
+
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
+
+        # A quick check to ensure total debit equals total credit for each journal entry, summed for all journals at once
+        balances = df_journals.groupby('Journal Number')[['Debit', 'Credit']].sum()
+        imbalanced = balances[(balances['Debit'] - balances['Credit']).abs() > 0.01] # Allow for minor floating point differences
+        for journal_num, total_debit, total_credit in imbalanced.itertuples(name=None):
             print(f"❌ Warning: Journal '{journal_num}' has imbalanced debit/credit. Debit: {total_debit}, Credit: {total_credit}")
 
 
-    write_xml_to_file(envelope, "tally_journal_vouchers.xml")
-
-
 def generate_purchase_vouchers_xml(df_bills):
     """Generates Tally XML for Purchase Vouchers from Bills."""
     print("\n--- Generating Purchase Vouchers XML ---")
     if df_bills is None: return
 
-    envelope, tally_message = create_tally_envelope("Vouchers", "VOUCHERS")
-
-    # Group by 'Bill ID' to handle multiple line items per bill.
-    df_bills['Total'] = pd.to_numeric(df_bills['Total'], errors='coerce').fillna(0)
-    grouped_bills = df_bills.groupby('Bill ID')
-
-    for bill_id, group in grouped_bills:
-        header = group.iloc[0]
-
-        voucher = etree.SubElement(tally_message, "VOUCHER",
-                                   REMOTEID=safe_str(header['Bill ID']),
-                                   VCHTYPE="Purchase",
-                                   ACTION="CREATE")
-
-        etree.SubElement(voucher, "DATE").text = format_tally_date(header['Bill Date'])
-        etree.SubElement(voucher, "GUID").text = f"PUR-{safe_str(header['Bill ID'])}" # Unique GUID
-        etree.SubElement(voucher, "VOUCHERTYPENAME").text = "Purchase"
-        etree.SubElement(voucher, "VOUCHERNUMBER").text = safe_str(header['Bill Number'])
-        etree.SubElement(voucher, "PARTYLEDGERNAME").text = safe_str(header['Vendor Name'])
-        etree.SubElement(voucher, "BASICBUYERNAME").text = "" # Not applicable for purchase
-        etree.SubElement(voucher, "BASICSELLERNAME").text = safe_str(header['Vendor Name'])
-        etree.SubElement(voucher, "PERSISTEDVIEW").text = "Accounting Voucher"
-        etree.SubElement(voucher, "EFFECTIVEDATE").text = format_tally_date(header['Bill Date'])
-        etree.SubElement(voucher, "NARRATION").text = safe_str(header.get('Vendor Notes', ''))
+    with tally_xml_file("tally_purchase_vouchers.xml", "Vouchers", "VOUCHERS") as out:
+
+        # Group by 'Bill ID' to handle multiple line items per bill.
+        df_bills['Total'] = pd.to_numeric(df_bills['Total'], errors='coerce').fillna(0)
+        df_bills = prepare_rows(
+            df_bills,
+            text_columns=['Bill Number', 'Vendor Name', 'Vendor Notes', 'GST Identification Number (GSTIN)',
+                          'GST Treatment', 'Item Name', 'Account', 'Tally_Input_IGST_Ledger', 'Tally_Input_CGST_Ledger',
+                          'Tally_Input_SGST_Ledger', 'Tally_Round_Off_Ledger'],
+            amount_columns=['Item Total', 'IGST', 'CGST', 'SGST', 'Adjustment'],
+            credit_columns=['Total'],
+            date_columns=['Bill Date'],
+            ledger_columns=['Account', 'Tally_Input_IGST_Ledger', 'Tally_Input_CGST_Ledger', 'Tally_Input_SGST_Ledger',
+                            'Tally_Round_Off_Ledger'],
+            defaults={'Vendor Notes': '', 'GST Identification Number (GSTIN)': '', 'GST Treatment': 'Regular',
+                      'Item Name': '', 'Account': 'Purchase Account', 'Tally_Input_IGST_Ledger': 'Input IGST',
+                      'Tally_Input_CGST_Ledger': 'Input CGST', 'Tally_Input_SGST_Ledger': 'Input SGST',
+                      'Adjustment': 0.0, 'Tally_Round_Off_Ledger': 'Round Off'})
+        df_bills = add_gst_entry_flags(df_bills)
+        df_bills = add_round_off_flags(df_bills, 'Adjustment')
+
+        for bill_id, rows in iter_groups(df_bills, 'Bill ID'):
+            header = rows[0]
+
+            open_tag(out, "VOUCHER", REMOTEID=safe_str(header['Bill ID']), VCHTYPE="Purchase", ACTION="CREATE")
+
+            text_tag(out, "DATE", header['Bill Date (Tally)'])
+            text_tag(out, "GUID", f"PUR-{safe_str(header['Bill ID'])}") # Unique GUID
+            text_tag(out, "VOUCHERTYPENAME", "Purchase")
+            text_tag(out, "VOUCHERNUMBER", header['Bill Number'])
+            text_tag(out, "PARTYLEDGERNAME", header['Vendor Name'])
+            text_tag(out, "BASICBUYERNAME", "") # Not applicable for purchase
+            text_tag(out, "BASICSELLERNAME", header['Vendor Name'])
+            text_tag(out, "PERSISTEDVIEW", "Accounting Voucher")
+            text_tag(out, "EFFECTIVEDATE", header['Bill Date (Tally)'])
+            text_tag(out, "NARRATION", header['Vendor Notes'])
         
-        # Seller details for GST
-        seller_details = etree.SubElement(voucher, "SELLERDETAILS.LIST")
-        etree.SubElement(seller_details, "CONSNAME").text = safe_str(header['Vendor Name'])
-        # You may need to fetch vendor's address from the processed_contacts/vendors.csv if not directly in bills
-        gstin = safe_str(header.get('GST Identification Number (GSTIN)'))
-        if gstin:
-            etree.SubElement(seller_details, "GSTREGISTRATIONTYPE").text = safe_str(header.get('GST Treatment', 'Regular'))
-            etree.SubElement(seller_details, "GSTIN").text = gstin
+            # Seller details for GST
+            open_tag(out, "SELLERDETAILS.LIST")
+            text_tag(out, "CONSNAME", header['Vendor Name'])
+            # You may need to fetch vendor's address from the processed_contacts/vendors.csv if not directly in bills
+            gstin = header['GST Identification Number (GSTIN)']
+            if gstin:
+                text_tag(out, "GSTREGISTRATIONTYPE", header['GST Treatment'])
+                text_tag(out, "GSTIN", gstin)
+            close_tag(out, "SELLERDETAILS.LIST")
         
 
-        all_ledger_entries = etree.SubElement(voucher, "ALLLEDGERENTRIES.LIST")
+            open_tag(out, "ALLLEDGERENTRIES.LIST")
 
-        # Credit the Party Ledger (Vendor)
-        party_ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-        etree.SubElement(party_ledger_entry, "LEDGERNAME").text = safe_str(header['Vendor Name'])
-        etree.SubElement(party_ledger_entry, "ISDEEMEDPOSITIVE").text = "No" # Credit
-        etree.SubElement(party_ledger_entry, "AMOUNT").text = format_tally_amount(-header['Total']) # Total bill amount, as credit
+            # Credit the Party Ledger (Vendor)
+            open_tag(out, "ALLLEDGERENTRIES")
+            text_tag(out, "LEDGERNAME", header['Vendor Name'])
+            text_tag(out, "ISDEEMEDPOSITIVE", "No") # Credit
+            text_tag(out, "AMOUNT", header['Total (Tally Credit)']) # Total bill amount, as credit
         
-        # Bill-wise details
-        bill_allocation_list = etree.SubElement(party_ledger_entry, "BILLALLOCATIONS.LIST")
-        bill_allocation = etree.SubElement(bill_allocation_list, "BILLALLOCATIONS")
-        etree.SubElement(bill_allocation, "NAME").text = safe_str(header['Bill Number'])
-        etree.SubElement(bill_allocation, "BILLTYPE").text = "New Ref"
-        etree.SubElement(bill_allocation, "AMOUNT").text = format_tally_amount(-header['Total'])
-
-        # Process each line item
-        for idx, item_row in group.iterrows():
-            item_name = safe_str(item_row.get('Item Name'))
-            if not item_name:
-                continue
-
-            # Debit Purchase Ledger
-            purchase_ledger_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-            etree.SubElement(purchase_ledger_entry, "LEDGERNAME").text = safe_str(item_row.get('Account', 'Purchase Account')) # Use mapped purchase ledger
-            etree.SubElement(purchase_ledger_entry, "ISDEEMEDPOSITIVE").text = "Yes" # Debit
-            etree.SubElement(purchase_ledger_entry, "AMOUNT").text = format_tally_amount(item_row['Item Total']) # Amount before tax for the line item
-
-            # GST Details (Debit for Input GST)
-            cgst_rate = item_row.get('CGST Rate %', 0.0)
-            sgst_rate = item_row.get('SGST Rate %', 0.0)
-            igst_rate = item_row.get('IGST Rate %', 0.0)
-
-            if igst_rate > 0 and safe_str(item_row.get('IGST')): # Assuming 'IGST' column for amount
-                igst_amount = item_row['IGST']
-                gst_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                etree.SubElement(gst_entry, "LEDGERNAME").text = safe_str(item_row.get('Tally_Input_IGST_Ledger', 'Input IGST')) # From 02_clean_map
-                etree.SubElement(gst_entry, "ISDEEMEDPOSITIVE").text = "Yes"
-                etree.SubElement(gst_entry, "AMOUNT").text = format_tally_amount(igst_amount)
-            elif (cgst_rate > 0 or sgst_rate > 0) and (safe_str(item_row.get('CGST')) or safe_str(item_row.get('SGST'))):
-                cgst_amount = item_row.get('CGST', 0.0)
-                sgst_amount = item_row.get('SGST', 0.0)
-
-                if cgst_amount > 0:
-                    gst_entry_cgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_cgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Input_CGST_Ledger', 'Input CGST'))
-                    etree.SubElement(gst_entry_cgst, "ISDEEMEDPOSITIVE").text = "Yes"
-                    etree.SubElement(gst_entry_cgst, "AMOUNT").text = format_tally_amount(cgst_amount)
-                if sgst_amount > 0:
-                    gst_entry_sgst = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-                    etree.SubElement(gst_entry_sgst, "LEDGERNAME").text = safe_str(item_row.get('Tally_Input_SGST_Ledger', 'Input SGST'))
-                    etree.SubElement(gst_entry_sgst, "ISDEEMEDPOSITIVE").text = "Yes"
-                    etree.SubElement(gst_entry_sgst, "AMOUNT").text = format_tally_amount(sgst_amount)
-
-        # Round Off Adjustment (using 'Adjustment' column from Bill.csv)
-        adjustment_amount = header.get('Adjustment', 0.0)
-        if adjustment_amount != 0 and not math.isnan(adjustment_amount):
-            round_off_entry = etree.SubElement(all_ledger_entries, "ALLLEDGERENTRIES")
-            etree.SubElement(round_off_entry, "LEDGERNAME").text = safe_str(header.get('Tally_Round_Off_Ledger', 'Round Off'))
-            etree.SubElement(round_off_entry, "ISDEEMEDPOSITIVE").text = "Yes" if adjustment_amount > 0 else "No"
-            etree.SubElement(round_off_entry, "AMOUNT").text = format_tally_amount(adjustment_amount)
-
-    write_xml_to_file(envelope, "tally_purchase_vouchers.xml")
+            # Bill-wise details
+            open_tag(out, "BILLALLOCATIONS.LIST")
+            open_tag(out, "BILLALLOCATIONS")
+            text_tag(out, "NAME", header['Bill Number'])
+            text_tag(out, "BILLTYPE", "New Ref")
+            text_tag(out, "AMOUNT", header['Total (Tally Credit)'])
+            close_tag(out, "BILLALLOCATIONS")
+            close_tag(out, "BILLALLOCATIONS.LIST")
+            close_tag(out, "ALLLEDGERENTRIES")
+
+            # Process each line item
+            for item_row in rows:
+                item_name = item_row['Item Name']
+                if not item_name:
+                    continue
+
+                # Debit Purchase Ledger
+                open_tag(out, "ALLLEDGERENTRIES")
+                escaped_tag(out, "LEDGERNAME", item_row['Account (XML)']) # Use mapped purchase ledger
+                text_tag(out, "ISDEEMEDPOSITIVE", "Yes") # Debit
+                text_tag(out, "AMOUNT", item_row['Item Total (Tally)']) # Amount before tax for the line item
+                close_tag(out, "ALLLEDGERENTRIES")
+
+                # GST Details (Debit for Input GST)
+                if item_row['IGST (Post)']: # Assuming 'IGST' column for amount
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Input_IGST_Ledger (XML)']) # From 02_clean_map
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['IGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['CGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Input_CGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['CGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+                if item_row['SGST (Post)']:
+                    open_tag(out, "ALLLEDGERENTRIES")
+                    escaped_tag(out, "LEDGERNAME", item_row['Tally_Input_SGST_Ledger (XML)'])
+                    text_tag(out, "ISDEEMEDPOSITIVE", "Yes")
+                    text_tag(out, "AMOUNT", item_row['SGST (Tally)'])
+                    close_tag(out, "ALLLEDGERENTRIES")
+
+            # Round Off Adjustment (using 'Adjustment' column from Bill.csv)
+            if header['Adjustment (Post)']:
+                open_tag(out, "ALLLEDGERENTRIES")
+                escaped_tag(out, "LEDGERNAME", header['Tally_Round_Off_Ledger (XML)'])
+                text_tag(out, "ISDEEMEDPOSITIVE", header['Adjustment (Deemed Positive)'])
+                text_tag(out, "AMOUNT", header['Adjustment (Tally)'])
+                close_tag(out, "ALLLEDGERENTRIES")
+
+            close_tag(out, "ALLLEDGERENTRIES.LIST")
+            close_tag(out, "VOUCHER")
 
 
 # --- Main Execution ---
+# Generators in recommended import order, each with the processed CSVs it takes
+# 1. Masters (Ledgers & Groups), then 2. Vouchers (Financial)
+XML_GENERATORS = [
+    (generate_ledgers_xml, ('cleaned_chart_of_accounts.csv',)),
+    (generate_contacts_vendors_xml, ('cleaned_contacts.csv', 'cleaned_vendors.csv')),
+    (generate_sales_vouchers_xml, ('cleaned_invoices.csv',)),
+    (generate_customer_payments_xml, ('cleaned_customer_payments.csv',)),
+    (generate_vendor_payments_xml, ('cleaned_vendor_payments.csv',)),
+    (generate_credit_notes_xml, ('cleaned_credit_notes.csv',)),
+    (generate_purchase_vouchers_xml, ('cleaned_bills.csv',)),
+    (generate_journal_vouchers_xml, ('cleaned_journals.csv',)),
+]
+
+def run_generator(generate, file_names):
+    """
+    Loads a generator's processed CSVs and runs it in a worker process, with its printed output held in memory.
+    Returns the loading and the generation output separately, so the main process can print every
+    loading message before the generation messages, as they appear in a one-at-a-time run, and whether
+    the generator succeeded. An error is caught and its traceback returned as part of the output,
+    so one failing generator does not lose the other generators' output.
+    """
+    load_log, generate_log = io.StringIO(), io.StringIO()
+    try:
+        with redirect_stdout(load_log):
+            dfs = [load_processed_csv(file_name) for file_name in file_names]
+        with redirect_stdout(generate_log):
+            generate(*dfs)
+    except Exception:
+        generate_log.write(f"❌ Error in {generate.__name__}:\n{traceback.format_exc()}")
+        return load_log.getvalue(), generate_log.getvalue(), False
+    return load_log.getvalue(), generate_log.getvalue(), True
+
 if __name__ == "__main__":
     print("--- Starting 03_generate_tally_xml.py: Generating Tally XML Files ---")
 
-    # Ensure output directory exists
-    if not os.path.exists(OUTPUT_XML_DIR):
-        os.makedirs(OUTPUT_XML_DIR)
-
-    # --- Load Processed DataFrames ---
-    # These CSVs should be present from running 02_clean_map.py
-    coa_df = load_processed_csv('cleaned_chart_of_accounts.csv')
-    contacts_df = load_processed_csv('cleaned_contacts.csv')
-    vendors_df = load_processed_csv('cleaned_vendors.csv')
-    invoices_df = load_processed_csv('cleaned_invoices.csv')
-    customer_payments_df = load_processed_csv('cleaned_customer_payments.csv')
-    vendor_payments_df = load_processed_csv('cleaned_vendor_payments.csv')
-    credit_notes_df = load_processed_csv('cleaned_credit_notes.csv')
-    journals_df = load_processed_csv('cleaned_journals.csv')
-    bills_df = load_processed_csv('cleaned_bills.csv')
-
-    # --- Generate XMLs in recommended order ---
-    # 1. Masters (Ledgers & Groups)
-    generate_ledgers_xml(coa_df)
-    generate_contacts_vendors_xml(contacts_df, vendors_df)
-
-    # 2. Vouchers (Financial)
-    generate_sales_vouchers_xml(invoices_df)
-    generate_customer_payments_xml(customer_payments_df)
-    generate_vendor_payments_xml(vendor_payments_df)
-    generate_credit_notes_xml(credit_notes_df)
-    generate_purchase_vouchers_xml(bills_df)
-    generate_journal_vouchers_xml(journals_df)
+    # --- Load Processed DataFrames and Generate XMLs ---
+    # These CSVs should be present from running 02_clean_map.py. Each generator reads its own CSVs
+    # and writes its own XML file, so they run in parallel; their output is printed here in order.
+    with ProcessPoolExecutor(max_workers=min(len(XML_GENERATORS), os.cpu_count() or 1)) as executor:
+        logs = list(executor.map(run_generator, *zip(*XML_GENERATORS)))
+    for load_log, _, _ in logs:
+        print(load_log, end='')
+    for _, generate_log, _ in logs:
+        print(generate_log, end='')
+    if not all(succeeded for _, _, succeeded in logs):
+        print("\n--- 03_generate_tally_xml.py: XML generation failed. See the errors above. ---")
+        exit(1)
 
 
     print("\n--- 03_generate_tally_xml.py: Tally XML generation complete. ---")
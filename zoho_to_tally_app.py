@@ -32,6 +32,8 @@ TALLY_COMPANY_NAME = "Plant Essentials Private Limited"
 BASE_CURRENCY_SYMBOL = "₹"
 BASE_CURRENCY_NAME = "Rupees"
 DEFAULT_COUNTRY = "India" # Assuming default country for addresses
+PRETTY_PRINT_XML = False # Indented output is easier to read but larger and slower to write; Tally doesn't need it
+XML_ZIP_COMPRESSLEVEL = 1 # Fastest deflate level: the XML shrinks several times over for download at little CPU cost
 
 # --- Global Mappings ---
 # These dictionaries will hold mappings from Zoho IDs to the canonical name used in Tally.
@@ -65,6 +67,17 @@ def format_date_column(df, column_name):
         df[column_name] = temp_date_col.dt.strftime('%Y%m%d').fillna('')
     return df
 
+def flush_records(tally_message, records):
+    """
+    Serializes the finished records (ledgers, vouchers, ...) under tally_message onto the records list
+    and removes them from the tree, so a processing loop only holds the record it is building.
+    Returns records.
+    """
+    for record in list(tally_message):
+        records.append(etree.tostring(record, encoding='UTF-8', pretty_print=PRETTY_PRINT_XML))
+        tally_message.remove(record)
+    return records
+
 # --- Data Processing Functions ---
 
 def process_chart_of_accounts(df):
@@ -99,7 +112,7 @@ def process_chart_of_accounts(df):
              balance_text = f"{abs(opening_balance)} {'Dr' if opening_balance >= 0 else 'Cr'}"
              etree.SubElement(ledger, 'OPENINGBALANCE').text = balance_text
 
-    return tally_message, None
+    return flush_records(tally_message, []), None
 
 def process_items(df):
     """Processes Item.csv to create Tally Master XML for Stock Items."""
@@ -128,7 +141,7 @@ def process_items(df):
         etree.SubElement(stock_item, 'PARENT').text = stock_group_name
         etree.SubElement(stock_item, 'BASEUNITS').text = "Nos" 
 
-    return tally_message, None
+    return flush_records(tally_message, []), None
 
 def process_contacts(df):
     """Processes Contacts.csv to create Tally Ledger Masters for Debtors."""
@@ -172,7 +185,7 @@ def process_contacts(df):
             balance_text = f"{abs(opening_balance)} {'Dr' if opening_balance >= 0 else 'Cr'}"
             etree.SubElement(ledger, 'OPENINGBALANCE').text = balance_text
 
-    return tally_message, None
+    return flush_records(tally_message, []), None
 
 def process_vendors(df):
     """Processes Vendors.csv to create Tally Ledger Masters for Creditors."""
@@ -215,7 +228,7 @@ def process_vendors(df):
             balance_text = f"{abs(opening_balance)} {'Cr' if opening_balance >= 0 else 'Dr'}"
             etree.SubElement(ledger, 'OPENINGBALANCE').text = balance_text
 
-    return tally_message, None
+    return flush_records(tally_message, []), None
 
 def create_ledger_if_not_exists(tally_message, ledger_name, parent_group, known_ledgers_set):
     """Helper to add a ledger creation block to the XML if it's new."""
@@ -232,6 +245,7 @@ def process_invoices(df):
     df_cleaned = format_date_column(df_cleaned, 'Invoice Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     create_ledger_if_not_exists(tally_message, "Sales", "Sales Accounts", ledgers_in_this_file)
 
@@ -261,7 +275,9 @@ def process_invoices(df):
         etree.SubElement(sales_ledger, 'ISDEEMEDPOSITIVE').text = "No"
         etree.SubElement(sales_ledger, 'AMOUNT').text = f"{total_amount}"
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 def process_customer_payments(df):
     """Processes Customer_Payment.csv to create Tally Receipt Vouchers."""
@@ -270,6 +286,7 @@ def process_customer_payments(df):
     df_cleaned = format_date_column(df_cleaned, 'Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     create_ledger_if_not_exists(tally_message, "Bank", "Bank Accounts", ledgers_in_this_file)
 
@@ -299,7 +316,9 @@ def process_customer_payments(df):
         etree.SubElement(bill_alloc, 'BILLTYPE').text = "Agst Ref"
         etree.SubElement(bill_alloc, 'AMOUNT').text = str(amount_received)
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 def process_bills(df):
     """Processes Bill.csv to create Tally Purchase Vouchers."""
@@ -308,6 +327,7 @@ def process_bills(df):
     df_cleaned = format_date_column(df_cleaned, 'Bill Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     create_ledger_if_not_exists(tally_message, "Purchase", "Purchase Accounts", ledgers_in_this_file)
 
@@ -336,7 +356,9 @@ def process_bills(df):
         etree.SubElement(purchase_ledger, 'ISDEEMEDPOSITIVE').text = "Yes"
         etree.SubElement(purchase_ledger, 'AMOUNT').text = f"-{total_amount}"
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 def process_vendor_payments(df):
     """Processes Vendor_Payment.csv to create Tally Payment Vouchers."""
@@ -345,6 +367,7 @@ def process_vendor_payments(df):
     df_cleaned = format_date_column(df_cleaned, 'Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     create_ledger_if_not_exists(tally_message, "Bank", "Bank Accounts", ledgers_in_this_file)
 
@@ -373,7 +396,9 @@ def process_vendor_payments(df):
         etree.SubElement(bank_ledger, 'ISDEEMEDPOSITIVE').text = "No"
         etree.SubElement(bank_ledger, 'AMOUNT').text = str(amount_paid)
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 
 def process_credit_notes(df):
@@ -383,6 +408,7 @@ def process_credit_notes(df):
     df_cleaned = format_date_column(df_cleaned, 'Credit Note Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     create_ledger_if_not_exists(tally_message, "Sales", "Sales Accounts", ledgers_in_this_file)
 
@@ -411,7 +437,9 @@ def process_credit_notes(df):
         etree.SubElement(bill_alloc, 'BILLTYPE').text = "Agst Ref"
         etree.SubElement(bill_alloc, 'AMOUNT').text = str(total_amount)
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 def process_journals(df):
     """Processes Journal.csv to create Tally Journal Vouchers."""
@@ -423,6 +451,7 @@ def process_journals(df):
     df_cleaned = format_date_column(df_cleaned, 'Journal Date')
 
     tally_message = etree.Element('TALLYMESSAGE', xmlns_UDF="TallyUDF")
+    records = []
     ledgers_in_this_file = set()
     
     for journal_id, group in df_cleaned.groupby('Journal Number'):
@@ -449,7 +478,9 @@ def process_journals(df):
                 etree.SubElement(ledger_entry, 'ISDEEMEDPOSITIVE').text = "No"
                 etree.SubElement(ledger_entry, 'AMOUNT').text = str(row['Credit'])
 
-    return tally_message, None
+        flush_records(tally_message, records) # Serialize the finished voucher so the tree never grows
+
+    return flush_records(tally_message, records), None
 
 # --- Main Application Logic (Streamlit) ---
 
@@ -523,10 +554,10 @@ if uploaded_zip is not None:
                 df = raw_dfs.get(csv_name)
                 if df is not None:
                     try:
-                        xml_tree, error_msg = process_func(df)
+                        records, error_msg = process_func(df)
                         if error_msg: st.warning(f"  - Skipped: {error_msg}")
-                        elif xml_tree is not None:
-                            processed_xmls[key] = xml_tree
+                        elif records is not None:
+                            processed_xmls[key] = records
                             st.write(f"  - ✅ Success")
                         else: st.write(f"  - ⚪️ No data to process.")
                     except Exception as e:
@@ -548,11 +579,11 @@ if uploaded_zip is not None:
         """)
 
         output_zip_path = os.path.join(temp_dir, "tally_import_files.zip")
-        with zipfile.ZipFile(output_zip_path, 'w') as zf:
+        with zipfile.ZipFile(output_zip_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=XML_ZIP_COMPRESSLEVEL) as zf:
             sorted_keys = sorted(processed_xmls.keys(), key=lambda x: list(processing_pipeline.keys()).index(x))
             
             for i, key in enumerate(sorted_keys):
-                xml_tree = processed_xmls[key]
+                records = processed_xmls[key]
                 envelope = etree.Element('ENVELOPE')
                 header = etree.SubElement(envelope, 'HEADER')
                 etree.SubElement(header, 'TALLYREQUEST').text = "Import Data"
@@ -564,12 +595,16 @@ if uploaded_zip is not None:
                 static_vars = etree.SubElement(req_desc, 'STATICVARIABLES')
                 etree.SubElement(static_vars, 'SVCURRENTCOMPANY').text = TALLY_COMPANY_NAME
                 
-                req_data = etree.SubElement(import_data, 'REQUESTDATA')
-                req_data.append(xml_tree)
+                etree.SubElement(import_data, 'REQUESTDATA')
                 
-                xml_string = etree.tostring(envelope, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+                # The records are already serialized, so they are written between the two halves of the envelope
+                xml_string = etree.tostring(envelope, pretty_print=PRETTY_PRINT_XML, xml_declaration=True, encoding='UTF-8')
+                envelope_head, envelope_tail = xml_string.split(b'<REQUESTDATA/>')
                 filename = f"{i+1:02d}_{key}.xml"
-                zf.writestr(filename, xml_string)
+                with zf.open(filename, 'w') as xml_file:
+                    xml_file.write(envelope_head + b'<REQUESTDATA><TALLYMESSAGE xmlns_UDF="TallyUDF">')
+                    xml_file.writelines(records)
+                    xml_file.write(b'</TALLYMESSAGE></REQUESTDATA>' + envelope_tail)
         
         with open(output_zip_path, "rb") as f:
             st.download_button(